@@ -0,0 +1,255 @@
+"""
+Bulk ingestion of detection results into DetectedAnomaly rows.
+
+A completed run's flagged transactions are in its results file (see detection.py),
+possibly hundreds of thousands of them. ingest_run() stores them in batches of
+AUDIT_ANOMALY_INGEST_BATCH_SIZE rows, each batch in one transaction that also
+advances the run's anomalies_ingested counter. On PostgreSQL a batch is sent with
+COPY into a temporary table and moved over with one INSERT ... SELECT, elsewhere with
+bulk_create(); either way conflicting rows are skipped, against the unique
+(detection_run, transaction_identifier_in_source) constraint.
+
+An interrupted ingestion therefore resumes where its last committed batch ended, and
+can be repeated without creating duplicates. Each batch locks the run row first, so
+concurrent ingestions of the same run take turns instead of inserting the same rows.
+
+The anomalies of a run are counted per status (counters.anomaly_scope()): ingestion
+adds the rows each batch inserted, and move_anomalies() moves a whole selection to
+another status with one UPDATE per status it leaves, whose row counts adjust the
+counters without reading the rows.
+"""
+import csv
+import io
+import json
+import logging
+import uuid
+from collections import Counter
+
+import pyarrow as pa
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import AnomalyDetectionRun, DetectedAnomaly
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10000
+# Columns of the results file before the feature values (see scoring.result_schema)
+RESULT_COLUMNS = ('row', 'transaction_id', 'anomaly_score')
+# Columns written by COPY; the others are left NULL
+COPY_FIELDS = (
+    'id', 'detection_run', 'transaction_identifier_in_source', 'anomaly_score',
+    'raw_transaction_details_preview', 'status', 'created_at', 'updated_at',
+)
+FIELD_ATTNAMES = tuple(DetectedAnomaly._meta.get_field(name).attname for name in COPY_FIELDS)
+STAGING_TABLE = 'audit_management_detectedanomaly_staging'
+# Ids per query when counting the rows bulk_create() inserted
+LOOKUP_BATCH_SIZE = 1000
+
+
+class AnomalyIngestionError(Exception):
+    """
+    The results of a run cannot be stored: the run is not completed or its results
+    file is missing.
+    """
+
+
+def get_batch_size():
+    return getattr(settings, 'AUDIT_ANOMALY_INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def read_results(run):
+    """
+    The results file of `run` as an Arrow table, memory-mapped when the storage keeps it
+    on a local filesystem.
+    """
+    name = run.ai_results_reference_id
+    if run.status != 'COMPLETED' or not name:
+        raise AnomalyIngestionError("The run has no results.")
+    try:
+        try:
+            source = pa.memory_map(default_storage.path(name), 'r')
+        except NotImplementedError:
+            with default_storage.open(name, 'rb') as file:
+                source = pa.BufferReader(file.read())
+    except FileNotFoundError:
+        raise AnomalyIngestionError("The results file of the run is missing.")
+    return pa.ipc.open_file(source).read_all()
+
+
+def anomaly_rows(run, results):
+    """
+    The values of COPY_FIELDS of a DetectedAnomaly per row of a results table. Plain
+    tuples: building model instances would take longer than COPY takes to store them.
+    """
+    columns = results.to_pydict()
+    features = [name for name in results.column_names if name not in RESULT_COLUMNS]
+    now = timezone.now()
+    rows = []
+    for index, row in enumerate(columns['row']):
+        preview = {'row': row}
+        for name in features:
+            preview[name] = columns[name][index]
+        transaction_id = columns['transaction_id'][index]
+        rows.append((
+            uuid.uuid4(), run.pk,
+            # Rows without an id are known by their row number, as in the results file
+            str(row) if transaction_id is None else transaction_id,
+            columns['anomaly_score'][index], preview, 'New', now, now,
+        ))
+    return rows
+
+
+def insert_anomalies(rows):
+    """
+    Inserts DetectedAnomaly rows (see anomaly_rows()), skipping those of a (run,
+    transaction) already stored. Returns how many were inserted.
+    """
+    if connection.vendor == 'postgresql':
+        return _copy_anomalies(rows)
+    DetectedAnomaly.objects.bulk_create(
+        [DetectedAnomaly(**dict(zip(FIELD_ATTNAMES, row))) for row in rows], ignore_conflicts=True,
+    )
+    # Skipped rows leave no trace but their new ids were not stored
+    pks = [row[0] for row in rows]
+    return sum(
+        DetectedAnomaly.objects.filter(pk__in=pks[start:start + LOOKUP_BATCH_SIZE]).count()
+        for start in range(0, len(pks), LOOKUP_BATCH_SIZE)
+    )
+
+
+def _copy_anomalies(rows):
+    # COPY cannot skip conflicting rows itself: it fills a staging table, emptied again
+    # at the end of the transaction, which INSERT ... ON CONFLICT DO NOTHING reads from
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(DetectedAnomaly._meta.get_field(name).column) for name in COPY_FIELDS)
+    table = quote(DetectedAnomaly._meta.db_table)
+    staging = quote(STAGING_TABLE)
+
+    buffer = io.StringIO()
+    # Strings are quoted, so only the unquoted empty values of None are read as NULL
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    # Rows share their timestamps and the keys of their previews, whose values are
+    # finite numbers: formatting those once per batch doubles the rows encoded per second
+    texts = {}
+    keys = template = None
+    for pk, run_id, transaction_id, score, preview, status, created_at, updated_at in rows:
+        if preview.keys() != keys:
+            keys = preview.keys()
+            template = '{' + ', '.join(f'{json.dumps(key)}: %r' for key in keys) + '}'
+        for value in (created_at, updated_at):
+            if value not in texts:
+                texts[value] = value.isoformat()
+        writer.writerow([
+            str(pk), str(run_id), transaction_id, score, template % tuple(preview.values()), status,
+            texts[created_at], texts[updated_at],
+        ])
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) '
+            'ON COMMIT DELETE ROWS'
+        )
+        sql = f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)'
+        if hasattr(cursor.cursor, 'copy_expert'):
+            cursor.cursor.copy_expert(sql, buffer)  # psycopg2
+        else:
+            with cursor.cursor.copy(sql) as copy:  # psycopg 3
+                copy.write(buffer.getvalue())
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} '
+            f'ON CONFLICT ({quote("detection_run_id")}, {quote("transaction_identifier_in_source")}) DO NOTHING'
+        )
+        inserted = cursor.rowcount
+        # Several batches can share a transaction (e.g. in tests)
+        cursor.execute(f'TRUNCATE {staging}')
+    return inserted
+
+
+def ingest_run(run, batch_size=None):
+    """
+    Stores the flagged transactions of a completed run as DetectedAnomaly rows, from
+    where an earlier ingestion stopped. Returns how many rows of the results file were
+    processed now. Raises AnomalyIngestionError.
+    """
+    results = read_results(run)
+    batch_size = batch_size or get_batch_size()
+    processed = 0
+    while True:
+        with transaction.atomic():
+            try:
+                offset, finished = (
+                    AnomalyDetectionRun.objects.select_for_update()
+                    .values_list('anomalies_ingested', 'anomalies_ingested_at')
+                    .get(pk=run.pk)
+                )
+            except AnomalyDetectionRun.DoesNotExist:
+                raise AnomalyIngestionError("The run has been deleted.")
+            if finished is not None:
+                break
+            batch = results.slice(offset, batch_size)
+            if not batch.num_rows:
+                run.anomalies_ingested_at = timezone.now()
+                AnomalyDetectionRun.objects.filter(pk=run.pk).update(anomalies_ingested_at=run.anomalies_ingested_at)
+                break
+            inserted = insert_anomalies(anomaly_rows(run, batch))
+            counters.apply_deltas(Counter({(counters.anomaly_scope(run.pk), 'New'): inserted}))
+            run.anomalies_ingested = offset + batch.num_rows
+            AnomalyDetectionRun.objects.filter(pk=run.pk).update(anomalies_ingested=run.anomalies_ingested)
+            processed += batch.num_rows
+    return processed
+
+
+def pending_runs():
+    return (
+        AnomalyDetectionRun.objects.filter(status='COMPLETED', anomalies_ingested_at__isnull=True)
+        .exclude(ai_results_reference_id=None)
+        .order_by('completed_at')
+    )
+
+
+def run_pending_ingestions(batch_size=None):
+    """
+    Ingests (or finishes ingesting) the results of every completed run whose results
+    are not all stored. Returns how many runs were ingested; failures are logged.
+    """
+    count = 0
+    for run in pending_runs():
+        try:
+            ingest_run(run, batch_size)
+        except AnomalyIngestionError as exc:
+            logger.warning("Cannot ingest the anomalies of detection run %s: %s", run.pk, exc)
+        else:
+            count += 1
+    return count
+
+
+def move_anomalies(run_id, queryset, status, from_statuses=None):
+    """
+    Moves the anomalies of `queryset`, all of detection run `run_id`, to `status` and
+    adjusts the run's counters. There is one UPDATE per status they can be in, from
+    `from_statuses` (every other status if None): the number of rows each one updated
+    is the number that left that status. Returns {status left: anomalies moved}.
+    """
+    scope = counters.anomaly_scope(run_id)
+    moved = {}
+    now = timezone.now()
+    with transaction.atomic():
+        for previous in from_statuses or [choice for choice, _ in DetectedAnomaly.STATUS_CHOICES]:
+            if previous == status:
+                continue
+            count = queryset.filter(status=previous).update(status=status, updated_at=now)
+            if count:
+                moved[previous] = count
+        deltas = Counter()
+        for previous, count in moved.items():
+            deltas[(scope, previous)] -= count
+            deltas[(scope, status)] += count
+        counters.apply_deltas(deltas)
+    return moved
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class AuditManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'audit_management'
+
+    def ready(self):
+        # Connect signal receivers
+        from . import authentication, changes, counters, datasets, detection, events, search, storage, versions  # noqa: F401
+        post_migrate.connect(search.install_sqlite_search, sender=self)
+
+        # Time the queries of instrumented requests, on connections opened before now too
+        from .instrumentation import install_query_recorder
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(sender=type(connection), connection=connection)
@@ -0,0 +1,265 @@
+"""
+Async variants of the read-heavy endpoints, served under /api/audit/async/.
+
+Under an ASGI server (e.g. `uvicorn audit_system.asgi:application`) these views await the
+database through Django's async ORM instead of holding a worker thread for the whole
+request, so one process can keep many dashboard and list requests in flight. Under WSGI
+they still work; Django runs them in an event loop per request.
+
+DRF's APIView is synchronous, so AsyncAPIView re-implements dispatch() as a coroutine.
+Authentication, permissions and throttling (which may query the database) run through
+sync_to_async; rendering and exception handling are reused from DRF unchanged.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import events
+from .counters import aget_status_summary
+from .fieldsets import FlexFieldsViewMixin
+from .models import AuditProject, AuditTask, ReportJob
+from .views import AuditProjectViewSet, AuditTaskViewSet, ReportJobViewSet, overdue_tasks
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines (`async def get(...)`).
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if handler == self.http_method_not_allowed:
+                response = handler(request, *args, **kwargs)
+            else:
+                response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        # Metadata may check object permissions against the database
+        return await sync_to_async(super().options)(request, *args, **kwargs)
+
+
+class AsyncGenericAPIView(AsyncAPIView, generics.GenericAPIView):
+    """
+    GenericAPIView with async object lookup and pagination.
+    """
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        apaginate = getattr(self.paginator, 'apaginate_queryset', None)
+        if apaginate is not None:
+            return await apaginate(queryset, self.request, view=self)
+        return await sync_to_async(self.paginator.paginate_queryset)(queryset, self.request, view=self)
+
+
+class AsyncListModelMixin:
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data)
+
+
+class AsyncRetrieveModelMixin:
+    async def retrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+
+class AsyncHelloView(AsyncAPIView):
+    """
+    Async HelloView.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    async def get(self, request):
+        return Response({
+            'message': f'Hello, {request.user.username}! You are authenticated.',
+            'user_id': request.user.id,
+            'user_email': request.user.email,
+        })
+
+
+class AsyncDashboardSummaryView(AsyncAPIView):
+    """
+    Async DashboardSummaryView: same response, two awaited queries.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, *args, **kwargs):
+        status_summary = await aget_status_summary(AuditProject, AuditTask)
+        return Response({
+            "project_status_summary": status_summary[AuditProject],
+            "task_status_summary": status_summary[AuditTask],
+            "overdue_tasks_count": await overdue_tasks().acount(),
+        })
+
+
+# List/retrieve share the queryset and serializer of the ViewSets, so both paths
+# always return the same data.
+
+class AsyncAuditProjectListView(FlexFieldsViewMixin, AsyncListModelMixin, AsyncGenericAPIView):
+    queryset = AuditProjectViewSet.queryset
+    serializer_class = AuditProjectViewSet.serializer_class
+    permission_classes = AuditProjectViewSet.permission_classes
+    filter_backends = AuditProjectViewSet.filter_backends
+
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request, *args, **kwargs)
+
+
+class AsyncAuditProjectDetailView(FlexFieldsViewMixin, AsyncRetrieveModelMixin, AsyncGenericAPIView):
+    queryset = AuditProjectViewSet.queryset
+    serializer_class = AuditProjectViewSet.serializer_class
+    permission_classes = AuditProjectViewSet.permission_classes
+
+    async def get(self, request, *args, **kwargs):
+        return await self.retrieve(request, *args, **kwargs)
+
+
+class AsyncAuditTaskListView(FlexFieldsViewMixin, AsyncListModelMixin, AsyncGenericAPIView):
+    queryset = AuditTaskViewSet.queryset
+    serializer_class = AuditTaskViewSet.serializer_class
+    permission_classes = AuditTaskViewSet.permission_classes
+    filter_backends = AuditTaskViewSet.filter_backends
+
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request, *args, **kwargs)
+
+
+class AsyncAuditTaskDetailView(FlexFieldsViewMixin, AsyncRetrieveModelMixin, AsyncGenericAPIView):
+    queryset = AuditTaskViewSet.queryset
+    serializer_class = AuditTaskViewSet.serializer_class
+    permission_classes = AuditTaskViewSet.permission_classes
+
+    async def get(self, request, *args, **kwargs):
+        return await self.retrieve(request, *args, **kwargs)
+
+
+class AsyncReportJobWaitView(AsyncGenericAPIView):
+    """
+    Long-poll for a report job: responds as soon as the job has finished, or after
+    `?timeout=` seconds (capped by AUDIT_REPORT_LONG_POLL_MAX) with its current state.
+    Waiting costs no worker thread here, only a timer on the event loop.
+    """
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobViewSet.serializer_class
+    permission_classes = ReportJobViewSet.permission_classes
+    poll_interval = 0.5
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            timeout = float(request.query_params.get('timeout', 25))
+        except ValueError:
+            timeout = 0
+        timeout = max(0, min(timeout, getattr(settings, 'AUDIT_REPORT_LONG_POLL_MAX', 30)))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        job = await self.aget_object()
+        while not job.is_finished and loop.time() < deadline:
+            await asyncio.sleep(min(self.poll_interval, deadline - loop.time()))
+            job = await self.aget_object()
+        return Response(self.get_serializer(job).data)
+
+
+class EventStreamView(AsyncAPIView):
+    """
+    Server-sent events with the status changes of tasks and projects (see events.py),
+    for the dashboard and task boards instead of polling.
+
+    ?projects=1,2 subscribes to the task and project status changes of those projects,
+    ?dashboard=1 to the dashboard status counters (sent once on connecting, then on every
+    change). A `resync` event means events were dropped: reload the current state. The
+    stream ends after AUDIT_EVENTS_MAX_DURATION seconds and EventSource reconnects;
+    changes made in between can be caught up on with the changes feed.
+
+    Needs the ASGI server: each open stream is a coroutine, not a worker thread.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, events.EventStreamRenderer]
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request._request, ASGIRequest):
+            return Response(
+                {'detail': 'Event streams are only served by the ASGI application (audit_system.asgi).'},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        try:
+            projects = {int(pk) for pk in request.query_params.get('projects', '').split(',') if pk.strip()}
+        except ValueError:
+            raise ValidationError({'projects': ['Expected a comma-separated list of project ids.']})
+        channels = {events.project_channel(pk) for pk in projects}
+        dashboard = request.query_params.get('dashboard') in ('1', 'true')
+        if dashboard:
+            channels.add(events.DASHBOARD_CHANNEL)
+        if not channels:
+            raise ValidationError({'detail': 'Subscribe to ?projects= and/or ?dashboard=1.'})
+
+        # Subscribe before reading the counters, so no change falls in between
+        subscription = events.get_broker().subscribe(channels)
+        try:
+            initial = [events.dashboard_event(await aget_status_summary(AuditProject, AuditTask))] if dashboard else []
+        except BaseException:
+            subscription.close()
+            raise
+        response = StreamingHttpResponse(self.stream(subscription, initial), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+    async def stream(self, subscription, initial):
+        keepalive = getattr(settings, 'AUDIT_EVENTS_KEEPALIVE', 15)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + getattr(settings, 'AUDIT_EVENTS_MAX_DURATION', 300)
+        try:
+            yield 'retry: 2000\n\n'
+            for event in initial:
+                yield event.encode()
+            while (remaining := deadline - loop.time()) > 0:
+                event = await subscription.get(timeout=min(keepalive, remaining))
+                # A comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n' if event is None else event.encode()
+        finally:
+            subscription.close()
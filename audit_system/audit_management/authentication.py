@@ -0,0 +1,186 @@
+"""
+JWT authentication without a database round trip per request.
+
+simplejwt's JWTAuthentication loads the User row for every request. AuditJWTAuthentication
+makes the same checks against a per-process cache of users (with their permissions
+preloaded), and with settings.AUDIT_JWT_STATELESS_READS it does not look the user up at
+all for reads: request.user is then an AuditTokenUser built from the token's claims.
+
+Cached users are dropped when they are saved or deleted, or when their groups or
+permissions change, in the process making the change; other processes notice within
+settings.AUDIT_AUTH_CACHE_TTL seconds. Stateless reads trust the token until it expires,
+so keep ACCESS_TOKEN_LIFETIME short when enabling them.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+DEFAULT_AUTH_CACHE_TTL = 60
+DEFAULT_AUTH_CACHE_SIZE = 10000
+
+
+class UserCache:
+    """
+    Thread-safe, size-bounded TTL cache of users by id, for one process. Ids are keyed
+    as strings, the way simplejwt stores them in tokens.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a lookup that raced with one is not stored
+        self._generation = 0
+
+    def get(self, user_id, load):
+        ttl = getattr(settings, 'AUDIT_AUTH_CACHE_TTL', DEFAULT_AUTH_CACHE_TTL)
+        if ttl <= 0:
+            return load(user_id)
+        user = self.peek(user_id)
+        if user is not None:
+            return user
+        generation = self._generation
+        user = load(user_id)
+        key = str(user_id)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + ttl, user)
+                self._entries.move_to_end(key)
+                while len(self._entries) > getattr(settings, 'AUDIT_AUTH_CACHE_SIZE', DEFAULT_AUTH_CACHE_SIZE):
+                    self._entries.popitem(last=False)
+        return user
+
+    def peek(self, user_id):
+        """
+        The cached user, or None if not cached (or expired).
+        """
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def load_user(user_id):
+    """
+    The user with its permission caches filled, so has_perm() does not query either.
+    """
+    user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    if user.is_active:
+        user.get_all_permissions()
+    return user
+
+
+class AuditTokenUser(TokenUser):
+    """
+    TokenUser with the profile claims added by AuditTokenObtainPairSerializer, and its
+    id converted back from the token's string to the type of User's id.
+    """
+
+    @cached_property
+    def id(self):
+        return User._meta.get_field(api_settings.USER_ID_FIELD).to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+
+class AuditJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication with cached user lookups, and optionally stateless reads.
+    """
+    stateless = False
+
+    def authenticate(self, request):
+        # Writes always get a real User: they store it in foreign keys
+        self.stateless = getattr(settings, 'AUDIT_JWT_STATELESS_READS', False) and request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        if self.stateless:
+            # No lookup, but still turn away a user this process knows to be inactive
+            cached = user_cache.peek(user_id)
+            if cached is not None and not cached.is_active:
+                raise AuthenticationFailed("User is inactive", code='user_inactive')
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+
+        try:
+            user = user_cache.get(user_id, load_user)
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        # A copy per request: views may modify request.user
+        return copy.copy(user)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        user_cache.invalidate(instance.pk)
+    elif pk_set is None:
+        # A group or permission was cleared of all its users
+        user_cache.clear()
+    else:
+        user_cache.invalidate(*pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_all_permissions(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        user_cache.clear()
@@ -0,0 +1,373 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks run against a throwaway test database (created and destroyed the same way
+the test runner does it), so seeding large tables never touches real data.
+"""
+import asyncio
+import itertools
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+from .models import AuditProject, AuditTask, ProjectDocument
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Switches the default connection to a fresh test database for the duration of the block.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def get_benchmark_user(username='benchmark_user'):
+    user, created = User.objects.get_or_create(username=username)
+    return user
+
+
+def seed_projects(count, start=0, text_size=500, batch_size=5000):
+    """
+    Bulk-inserts `count` audit projects numbered from `start`.
+    `text_size` controls the length of the description/scope/objectives columns.
+    """
+    manager = get_benchmark_user('benchmark_pm')
+    filler = ('lorem ipsum dolor sit amet ' * (text_size // 27 + 1))[:text_size]
+    statuses = [choice for choice, label in AuditProject.STATUS_CHOICES]
+
+    for batch_start in range(start, start + count, batch_size):
+        batch_end = min(batch_start + batch_size, start + count)
+        AuditProject.objects.bulk_create([
+            AuditProject(
+                name=f'Benchmark Project {index:08d}',
+                description=filler,
+                scope=filler,
+                objectives=filler,
+                project_manager=manager if index % 2 else None,
+                status=statuses[index % len(statuses)],
+            )
+            for index in range(batch_start, batch_end)
+        ])
+
+
+def seed_tasks(count, start=0, batch_size=5000):
+    """
+    Bulk-inserts `count` tasks numbered from `start`, spread over the existing projects,
+    a tenth of them overdue.
+    """
+    project_ids = list(AuditProject.objects.values_list('pk', flat=True))
+    statuses = [choice for choice, label in AuditTask.STATUS_CHOICES]
+    past = time.strftime('%Y-%m-%d', time.gmtime(time.time() - 86400))
+    for batch_start in range(start, start + count, batch_size):
+        AuditTask.objects.bulk_create([
+            AuditTask(
+                project_id=project_ids[index % len(project_ids)],
+                name=f'Benchmark Task {index:08d}',
+                status=statuses[index % len(statuses)],
+                due_date=past if index % 10 == 0 else None,
+            )
+            for index in range(batch_start, min(batch_start + batch_size, start + count))
+        ])
+
+
+def seed_documents(count, start=0, batch_size=5000):
+    """
+    Bulk-inserts `count` documents numbered from `start`, spread over the existing
+    projects and tasks. They all share one small stored file.
+    """
+    project_ids = list(AuditProject.objects.values_list('pk', flat=True))
+    task_ids = list(AuditTask.objects.values_list('pk', flat=True)) or [None]
+    uploader = get_benchmark_user()
+    stored = ProjectDocument.objects.filter(name__startswith='Benchmark Document').values_list('file', flat=True).first()
+    if stored is None:
+        document = ProjectDocument(project_id=project_ids[0], name='Benchmark Document seed', uploaded_by=uploader)
+        document.file.save('benchmark.txt', ContentFile(b'benchmark document\n' * 64), save=False)
+        document.save()
+        stored = document.file.name
+    for batch_start in range(start, start + count, batch_size):
+        ProjectDocument.objects.bulk_create([
+            ProjectDocument(
+                project_id=project_ids[index % len(project_ids)],
+                task_id=task_ids[index % len(task_ids)],
+                name=f'Benchmark Document {index:08d}',
+                file=stored,
+                uploaded_by=uploader,
+            )
+            for index in range(batch_start, min(batch_start + batch_size, start + count))
+        ])
+
+
+@contextmanager
+def simulated_db_latency(seconds):
+    """
+    Adds `seconds` of sleep to every query on every connection (including ones opened
+    by other threads during the block), standing in for the round trip to a database
+    server. The local test database otherwise answers too fast for concurrency to matter.
+    """
+    if not seconds:
+        yield
+        return
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    for conn in connections.all(initialized_only=True):
+        conn.execute_wrappers.append(delay)
+    connection_created.connect(install)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(install)
+        for conn in connections.all(initialized_only=True):
+            if delay in conn.execute_wrappers:
+                conn.execute_wrappers.remove(delay)
+
+
+@contextmanager
+def count_connections():
+    """
+    Counts database connections opened during the block. Yields a dict with `opened`.
+    """
+    result = {'opened': 0}
+
+    def opened(sender, connection, **kwargs):
+        result['opened'] += 1
+
+    connection_created.connect(opened)
+    try:
+        yield result
+    finally:
+        connection_created.disconnect(opened)
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the queries run on every connection (including ones opened by other threads)
+    during the block, up to the last row of streamed responses. Yields a dict with `queries`.
+    """
+    result = {'queries': 0}
+    # Worker threads run queries concurrently: += alone could lose counts
+    lock = threading.Lock()
+
+    def counted(execute, sql, params, many, context):
+        with lock:
+            result['queries'] += 1
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(counted)
+
+    for conn in connections.all(initialized_only=True):
+        conn.execute_wrappers.append(counted)
+    connection_created.connect(install)
+    try:
+        yield result
+    finally:
+        connection_created.disconnect(install)
+        for conn in connections.all(initialized_only=True):
+            if counted in conn.execute_wrappers:
+                conn.execute_wrappers.remove(counted)
+
+
+def run_wsgi_load(paths, total, workers, headers=None):
+    """
+    Sends `total` requests (cycling through `paths`) through Django's WSGI handler from
+    `workers` threads, like a threaded WSGI server. A path is a GET, or a
+    (method, path, data) tuple whose data is sent as JSON.
+    Returns (seconds, [(latency, status)]).
+    """
+    handler = WSGIHandler()
+    factory = RequestFactory()
+    extra = {f"HTTP_{name.upper().replace('-', '_')}": value for name, value in (headers or {}).items()}
+
+    def request(path):
+        method, path, data = ('GET', path, None) if isinstance(path, str) else path
+        if data is None:
+            environ = factory.generic(method, path, **extra).environ
+        else:
+            environ = factory.generic(method, path, json.dumps(data), 'application/json', **extra).environ
+        statuses = []
+        started = time.perf_counter()
+        body = handler(environ, lambda status, response_headers, exc_info=None: statuses.append(int(status[:3])))
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return time.perf_counter() - started, statuses[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(request, itertools.islice(itertools.cycle(paths), total)))
+    return time.perf_counter() - started, results
+
+
+def run_asgi_load(paths, total, concurrency, headers=None):
+    """
+    Sends `total` GET requests through Django's ASGI handler on one event loop, at most
+    `concurrency` in flight, like an ASGI server. Returns (seconds, [(latency, status)]).
+    """
+    handler = ASGIHandler()
+    raw_headers = [(b'host', b'testserver')] + [
+        (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in (headers or {}).items()
+    ]
+
+    async def request(path, limit):
+        async with limit:
+            sent_body = False
+            statuses = []
+
+            async def receive():
+                nonlocal sent_body
+                if not sent_body:
+                    sent_body = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects; Django cancels this when the response is done.
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            path, _, query = path.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '', 'headers': raw_headers,
+                'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+            }
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            return time.perf_counter() - started, statuses[0]
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(
+            request(path, limit) for path in itertools.islice(itertools.cycle(paths), total)
+        ))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    return time.perf_counter() - started, results
+
+
+def summarize_load(seconds, results):
+    """
+    Throughput and latency percentiles (milliseconds) of a run_*_load() result.
+    """
+    latencies = sorted(latency for latency, status in results)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(results),
+        'errors': sum(1 for latency, status in results if status >= 400),
+        'seconds': round(seconds, 3),
+        'requests_per_second': round(len(results) / seconds, 1) if seconds else None,
+        'p50_ms': round(cuts[49] * 1000, 1),
+        'p95_ms': round(cuts[94] * 1000, 1),
+        'p99_ms': round(cuts[98] * 1000, 1),
+    }
+
+
+@contextmanager
+def measure():
+    """
+    Measures wall time and peak traced Python memory of the block.
+    Yields a dict that is filled in with `seconds` and `peak_bytes` on exit.
+    """
+    result = {}
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - started
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+
+def _proc_status_bytes(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field} not in /proc/self/status")
+
+
+def rss_bytes():
+    """
+    Resident memory of this process (Linux only).
+    """
+    return _proc_status_bytes('VmRSS')
+
+
+@contextmanager
+def measure_rss():
+    """
+    Measures wall time and resident memory of the block, which unlike measure() also
+    sees memory allocated outside Python (Arrow buffers, native libraries). Yields a dict
+    filled in with `seconds`, `baseline_bytes`, `peak_bytes` and `growth_bytes` on exit.
+    Linux only; where the peak cannot be reset, it is the peak of the whole process.
+    """
+    result = {}
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')  # Resets the peak (VmHWM) to the current size
+    except OSError:
+        pass
+    baseline = rss_bytes()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - started
+        result['baseline_bytes'] = baseline
+        result['peak_bytes'] = _proc_status_bytes('VmHWM')
+        result['growth_bytes'] = max(0, result['peak_bytes'] - baseline)
+
+
+def compare_results(baseline, current, latency_tolerance=0.25, latency_slack_ms=5.0, query_tolerance=0):
+    """
+    The regressions of a benchmark_api result against an earlier one, as messages. A
+    route regresses when its p95 latency grows by more than `latency_tolerance` (a
+    fraction) plus `latency_slack_ms` (absorbing noise on fast routes), when it runs
+    more than `query_tolerance` more queries per request, or when it starts failing.
+    Routes and sizes missing from either run are not compared.
+    """
+    regressions = []
+    for size, routes in current['results'].items():
+        for name, result in routes.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if before is None:
+                continue
+            where = f'{name} at {size} rows'
+            allowed = before['p95_ms'] * (1 + latency_tolerance) + latency_slack_ms
+            if result['p95_ms'] > allowed:
+                regressions.append(f"{where}: p95 {result['p95_ms']} ms, was {before['p95_ms']} ms")
+            if result['queries'] > before['queries'] + query_tolerance:
+                regressions.append(f"{where}: {result['queries']} queries per request, was {before['queries']}")
+            if result['errors'] > before['errors']:
+                regressions.append(f"{where}: {result['errors']} failed requests, was {before['errors']}")
+    return regressions
@@ -0,0 +1,163 @@
+"""
+Change log (ChangeLogEntry) and the delta-sync feed over projects, tasks and documents.
+
+Every write appends an entry per changed row in the write's transaction, deletions
+included, through the same signals as the table versions (see signals.py). A client
+syncs with GET /api/audit/changes/, keeps the returned `next_token` and sends it back
+as `?since=` next time; it then receives only the rows changed in between, in pages,
+each with its current representation, or a tombstone for deleted rows.
+
+Entries become visible AUDIT_CHANGE_FEED_LAG seconds after they are written. Ids are
+allocated when a transaction inserts, not when it commits, so without the delay a
+client could page past an id whose transaction had not committed yet and never see it.
+
+compact_change_log drops entries superseded by a newer one for the same row (a client
+never needs both) and tombstones older than AUDIT_CHANGE_LOG_RETENTION. A token issued
+before that horizon could miss a deletion: the feed answers it with 410 Gone, and the
+client syncs again from the start.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import AuditProject, AuditTask, ChangeLogEntry, ProjectDocument
+from .signals import batch_accumulator, post_bulk_create, post_bulk_update, post_queryset_update
+
+
+DEFAULT_FEED_LAG = 5
+DEFAULT_RETENTION = datetime.timedelta(days=30)
+
+# Change feed type of each synced model
+FEED_TYPES = {
+    'project': AuditProject,
+    'task': AuditTask,
+    'document': ProjectDocument,
+}
+
+
+class StaleToken(Exception):
+    """
+    The token predates the retained tombstones; the client has to sync from the start.
+    """
+
+
+def get_feed_lag():
+    return datetime.timedelta(seconds=getattr(settings, 'AUDIT_CHANGE_FEED_LAG', DEFAULT_FEED_LAG))
+
+
+def get_retention():
+    return getattr(settings, 'AUDIT_CHANGE_LOG_RETENTION', DEFAULT_RETENTION)
+
+
+def record(model, pks, action, using=None):
+    """
+    Appends an entry per pk. Inside batched_changes() the entries of the batch are
+    inserted together at the end.
+    """
+    table = model._meta.label_lower
+    changes = [(table, pk, action) for pk in pks if pk is not None]
+    if not changes:
+        return
+    pending = batch_accumulator(('change_log', using), lambda items: _write_entries(items, using))
+    if pending is not None:
+        pending.extend(changes)
+        return
+    _write_entries(changes, using)
+
+
+def _write_entries(changes, using):
+    now = timezone.now()
+    ChangeLogEntry.objects.using(using).bulk_create([
+        ChangeLogEntry(table=table, object_id=pk, action=action, changed_at=now)
+        for table, pk, action in changes
+    ])
+
+
+def make_token(last_id, issued_at):
+    return f'{last_id}.{int(issued_at.timestamp())}'
+
+
+def parse_token(token):
+    """
+    (last entry id, issued at) of a token, or ValueError.
+    """
+    last_id, _, issued_at = token.partition('.')
+    last_id, issued_at = int(last_id), int(issued_at)
+    if last_id < 0:
+        raise ValueError(token)
+    return last_id, datetime.datetime.fromtimestamp(issued_at, tz=datetime.timezone.utc)
+
+
+def get_changes(since_id=0, since_time=None, types=None, limit=500):
+    """
+    (entries, has_more, now): up to `limit` visible entries after entry `since_id` (and
+    written at or after `since_time`), oldest first, of the given feed types.
+
+    Raises StaleToken when `since_time` is older than the retained tombstones.
+    """
+    now = timezone.now()
+    if since_time is not None and since_time < now - get_retention() + get_feed_lag():
+        raise StaleToken()
+    entries = ChangeLogEntry.objects.filter(pk__gt=since_id, changed_at__lte=now - get_feed_lag())
+    if since_time is not None and not since_id:
+        entries = entries.filter(changed_at__gte=since_time)
+    if types is not None:
+        entries = entries.filter(table__in=[FEED_TYPES[name]._meta.label_lower for name in types])
+    entries = list(entries.order_by('pk')[:limit + 1])
+    return entries[:limit], len(entries) > limit, now
+
+
+def latest_per_row(entries):
+    """
+    The last of `entries` for each row, in log order.
+    """
+    latest = {(entry.table, entry.object_id): entry for entry in entries}
+    return sorted(latest.values(), key=lambda entry: entry.pk)
+
+
+def compact(retention=None):
+    """
+    Deletes superseded entries, and tombstones older than `retention`. Returns the
+    number of entries deleted.
+    """
+    retention = get_retention() if retention is None else retention
+    newest = ChangeLogEntry.objects.values('table', 'object_id').annotate(newest=Max('pk')).values('newest')
+    superseded, _ = ChangeLogEntry.objects.exclude(pk__in=newest).delete()
+    expired, _ = ChangeLogEntry.objects.filter(action='delete', changed_at__lt=timezone.now() - retention).delete()
+    return superseded + expired
+
+
+@receiver(post_save, sender=AuditProject)
+@receiver(post_save, sender=AuditTask)
+@receiver(post_save, sender=ProjectDocument)
+def log_saved_row(sender, instance, using, **kwargs):
+    record(sender, [instance.pk], 'upsert', using)
+
+
+@receiver(post_delete, sender=AuditProject)
+@receiver(post_delete, sender=AuditTask)
+@receiver(post_delete, sender=ProjectDocument)
+def log_deleted_row(sender, instance, using, **kwargs):
+    record(sender, [instance.pk], 'delete', using)
+
+
+@receiver(post_bulk_create, sender=AuditProject)
+@receiver(post_bulk_create, sender=AuditTask)
+@receiver(post_bulk_create, sender=ProjectDocument)
+@receiver(post_bulk_update, sender=AuditProject)
+@receiver(post_bulk_update, sender=AuditTask)
+@receiver(post_bulk_update, sender=ProjectDocument)
+def log_bulk_written_rows(sender, objs, using, **kwargs):
+    # Rows skipped by ignore_conflicts have no pk
+    record(sender, [obj.pk for obj in objs], 'upsert', using)
+
+
+@receiver(post_queryset_update, sender=AuditProject)
+@receiver(post_queryset_update, sender=AuditTask)
+@receiver(post_queryset_update, sender=ProjectDocument)
+def log_updated_rows(sender, previous, using, **kwargs):
+    record(sender, list(previous), 'upsert', using)
@@ -0,0 +1,223 @@
+"""
+Incrementally maintained per-status row counts (StatusCounter).
+
+Every create, update and delete of a counted model adjusts the counters in the same
+transaction, so DashboardSummaryView reads a handful of rows instead of running
+GROUP BY scans. `reconcile_status_counters` recomputes them from the tables.
+
+Detected anomalies are counted per detection run (anomaly_scope()), by anomalies.py,
+which inserts and moves them in bulk, so the triage API reads a run's counts per state
+without counting up to millions of rows.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AnomalyDetectionRun, AuditProject, AuditTask, DetectedAnomaly, StatusCounter
+from .signals import batch_accumulator, post_bulk_create, post_bulk_update, post_queryset_update
+
+
+COUNTED_MODELS = (AuditProject, AuditTask)
+
+
+def scope_for(model):
+    return model._meta.label_lower
+
+
+def anomaly_scope(run_id):
+    """
+    Scope of the counters of a detection run's anomalies.
+    """
+    return f'{scope_for(DetectedAnomaly)}:{run_id}'
+
+
+def get_anomaly_counts(run_id, using=None):
+    """
+    {status: count} of a detection run's anomalies, omitting empty statuses.
+    """
+    counters = StatusCounter.objects.using(using).filter(scope=anomaly_scope(run_id), count__gt=0)
+    return dict(counters.order_by('status').values_list('status', 'count'))
+
+
+def get_status_summary(*models):
+    """
+    {model: [{'status': ..., 'count': ...}, ...]} ordered by status, omitting empty statuses.
+    One query for all requested models.
+    """
+    scopes, summary, rows = _status_summary_query(models)
+    for scope, status, count in rows:
+        summary[scopes[scope]].append({'status': status, 'count': count})
+    return summary
+
+
+async def aget_status_summary(*models):
+    """
+    get_status_summary() for async views.
+    """
+    scopes, summary, rows = _status_summary_query(models)
+    async for scope, status, count in rows:
+        summary[scopes[scope]].append({'status': status, 'count': count})
+    return summary
+
+
+def _status_summary_query(models):
+    scopes = {scope_for(model): model for model in models}
+    summary = {model: [] for model in models}
+    rows = (
+        StatusCounter.objects.filter(scope__in=scopes, count__gt=0)
+        .order_by('status')
+        .values_list('scope', 'status', 'count')
+    )
+    return scopes, summary, rows
+
+
+def apply_deltas(deltas, using=None):
+    """
+    Adds a Counter of {(scope, status): delta} to the stored counters.
+    Inside batched_changes() the deltas are summed and written once at the end.
+    """
+    pending = batch_accumulator(('status_counters', using), lambda items: _write_deltas(_merge(items), using))
+    if pending is not None:
+        pending.append(deltas)
+        return
+    _write_deltas(deltas, using)
+
+
+def _merge(items):
+    # Counter.update() keeps negative totals; Counter addition would drop them.
+    total = Counter()
+    for deltas in items:
+        total.update(deltas)
+    return total
+
+
+def _write_deltas(deltas, using):
+    counters = StatusCounter.objects.using(using)
+    for (scope, status), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        if counters.filter(scope=scope, status=status).update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                counters.create(scope=scope, status=status, count=delta)
+        except IntegrityError:
+            # Created concurrently since our UPDATE found nothing.
+            counters.filter(scope=scope, status=status).update(count=F('count') + delta)
+
+
+def count_statuses(model, using=None, queryset=None):
+    """
+    The true per-status counts of `model` (or of `queryset`), straight from its table.
+    """
+    if queryset is None:
+        queryset = model._base_manager.using(using)
+    rows = queryset.order_by().values('status').annotate(count=Count('pk'))
+    return {row['status']: row['count'] for row in rows}
+
+
+def recount(model, using=None, fix=True):
+    """
+    Compares the stored counters of `model` with its table and, if `fix`, corrects them.
+    Returns the drift as {status: (stored, actual)}.
+    """
+    return _recount(scope_for(model), model._base_manager.using(using), using, fix)
+
+
+def recount_anomalies(run_id, using=None, fix=True):
+    """
+    recount() for the anomalies of a detection run.
+    """
+    anomalies = DetectedAnomaly._base_manager.using(using).filter(detection_run_id=run_id)
+    return _recount(anomaly_scope(run_id), anomalies, using, fix)
+
+
+def _recount(scope, queryset, using, fix):
+    with transaction.atomic(using=using):
+        counters = StatusCounter.objects.using(using).filter(scope=scope)
+        stored = dict(counters.select_for_update().values_list('status', 'count'))
+        actual = count_statuses(queryset.model, queryset=queryset)
+        drift = {
+            status: (stored.get(status, 0), actual.get(status, 0))
+            for status in set(stored) | set(actual)
+            if stored.get(status, 0) != actual.get(status, 0)
+        }
+        if fix:
+            for status, (_, count) in drift.items():
+                StatusCounter.objects.using(using).update_or_create(
+                    scope=scope, status=status, defaults={'count': count}
+                )
+    return drift
+
+
+@receiver(post_save, sender=AuditProject)
+@receiver(post_save, sender=AuditTask)
+def count_saved_instance(sender, instance, created, using, **kwargs):
+    scope = scope_for(sender)
+    previous = getattr(instance, '_tracked_previous', None)
+    deltas = Counter()
+    if created or previous is None:
+        deltas[(scope, instance.status)] += 1
+    elif 'status' in previous and previous['status'] != instance.status:
+        deltas[(scope, previous['status'])] -= 1
+        deltas[(scope, instance.status)] += 1
+    apply_deltas(deltas, using)
+
+
+@receiver(post_delete, sender=AuditProject)
+@receiver(post_delete, sender=AuditTask)
+def count_deleted_instance(sender, instance, using, **kwargs):
+    apply_deltas(Counter({(scope_for(sender), instance.status): -1}), using)
+
+
+@receiver(post_bulk_create, sender=AuditProject)
+@receiver(post_bulk_create, sender=AuditTask)
+def count_bulk_created(sender, objs, exact, using, **kwargs):
+    if not exact:
+        recount(sender, using)
+        return
+    scope = scope_for(sender)
+    apply_deltas(Counter((scope, obj.status) for obj in objs), using)
+
+
+@receiver(post_bulk_update, sender=AuditProject)
+@receiver(post_bulk_update, sender=AuditTask)
+def count_bulk_updated(sender, objs, fields, previous, using, **kwargs):
+    if 'status' not in fields:
+        return
+    scope = scope_for(sender)
+    deltas = Counter()
+    for obj in objs:
+        old = previous.get(obj.pk)
+        if old is not None and old['status'] != obj.status:
+            deltas[(scope, old['status'])] -= 1
+            deltas[(scope, obj.status)] += 1
+    apply_deltas(deltas, using)
+
+
+@receiver(post_queryset_update, sender=AuditProject)
+@receiver(post_queryset_update, sender=AuditTask)
+def count_queryset_updated(sender, previous, values, using, **kwargs):
+    if 'status' not in values:
+        return
+    new_status = values['status']
+    if not isinstance(new_status, str):
+        # An expression (Case/When, F(), ...): the new values are only known to the database.
+        recount(sender, using)
+        return
+    scope = scope_for(sender)
+    deltas = Counter()
+    for old in previous.values():
+        if old['status'] != new_status:
+            deltas[(scope, old['status'])] -= 1
+            deltas[(scope, new_status)] += 1
+    apply_deltas(deltas, using)
+
+
+@receiver(post_delete, sender=AnomalyDetectionRun)
+def delete_anomaly_counters(sender, instance, using, **kwargs):
+    # Its anomalies are deleted with it (in bulk, without signals)
+    StatusCounter.objects.using(using).filter(scope=anomaly_scope(instance.pk)).delete()
@@ -0,0 +1,356 @@
+"""
+Ingestion of transaction datasets (TransactionDataset) into columnar Arrow files.
+
+A dataset points at an uploaded CSV document (large files arrive through resumable
+uploads). `ingest_transaction_datasets` streams that CSV through pyarrow's block
+reader, AUDIT_DATASET_BLOCK_SIZE bytes at a time, and appends each block to an Arrow
+IPC file in the default storage, so memory use depends on the block size, not the file
+size. The column types are inferred from the first block and every later block must
+convert to them. Ingestion records the columns, types and null counts
+(data_schema_info), the number of rows (record_count) and, from the first timestamp
+column, the time range of the transactions.
+
+The Arrow file is written uncompressed, in the layout Arrow keeps in memory: detection
+memory-maps it (open_dataset) and reads columns without parsing or copying them, and
+the page cache is shared by every process reading the same dataset.
+
+A worker ingesting a dataset holds a lease on it (leases.py), renewed after every
+block. A dataset whose worker died stays Uploading only until its lease runs out: then
+requeue_stale_datasets() queues it again, or marks it Error after
+AUDIT_DATASET_MAX_ATTEMPTS claims.
+"""
+import datetime
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .leases import Lease, LeaseLost
+from .models import TransactionDataset
+from .uploads import PartFile, get_upload_dir, remove_file
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+DEFAULT_LEASE = timedelta(minutes=10)
+DEFAULT_MAX_ATTEMPTS = 3
+# Datasets a worker looks at per claim attempt; others may be claiming the same ones
+CLAIM_CANDIDATES = 10
+
+
+class DatasetError(Exception):
+    """
+    The source file cannot be ingested: missing, not a CSV with a header, or with values
+    that do not match the types of their column.
+    """
+
+
+def get_block_size():
+    return getattr(settings, 'AUDIT_DATASET_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+
+
+def get_lease():
+    return getattr(settings, 'AUDIT_DATASET_LEASE', DEFAULT_LEASE)
+
+
+def data_file_name(dataset):
+    return f'transaction_datasets/{dataset.project_id}/{dataset.pk}.arrow'
+
+
+def _open_reader(file, block_size, column_types=None):
+    try:
+        return pa_csv.open_csv(
+            file,
+            read_options=pa_csv.ReadOptions(block_size=block_size),
+            convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+        )
+    except pa.ArrowInvalid as exc:
+        raise DatasetError(f"The file is not a readable CSV file: {exc}")
+
+
+def _target_schema(schema):
+    """
+    The schema of the Arrow file: the CSV's, with column names trimmed and columns that
+    were empty in the first block (type null) read as strings.
+    """
+    fields = []
+    seen = set()
+    for field in schema:
+        name = field.name.strip()
+        if not name:
+            raise DatasetError("Every column needs a name in the header row.")
+        if name in seen:
+            raise DatasetError(f"The column name {name!r} appears more than once.")
+        seen.add(name)
+        fields.append(pa.field(name, pa.string() if pa.types.is_null(field.type) else field.type))
+    return pa.schema(fields)
+
+
+def _aware(value):
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value, datetime.timezone.utc)
+    return value
+
+
+def convert_csv(file, path, block_size=None, reopen=None, on_batch=None):
+    """
+    Streams the CSV `file` into an Arrow IPC file at `path` and returns what was found:
+    {'schema', 'rows', 'null_counts', 'timestamp_column', 'time_range'}.
+
+    `reopen()` returns the CSV file from the start again; it is called when the first
+    block has columns without values, to read them as strings from the start.
+    `on_batch(rows)` is called after each block with the rows converted so far.
+    """
+    block_size = block_size or get_block_size()
+    reader = _open_reader(file, block_size)
+    schema = _target_schema(reader.schema)
+    if any(pa.types.is_null(field.type) for field in reader.schema):
+        # Types are fixed by the first block, so null (all-empty) columns would reject
+        # any value found later
+        reader = _open_reader(reopen(), block_size, {
+            source.name: target.type for source, target in zip(reader.schema, schema)
+        })
+
+    timestamp_column = next(
+        (index for index, field in enumerate(schema) if pa.types.is_timestamp(field.type)), None,
+    )
+    rows = 0
+    null_counts = [0] * len(schema)
+    earliest = latest = None
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        while True:
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                break
+            except pa.ArrowInvalid as exc:
+                raise DatasetError(f"Invalid value after row {rows}: {exc}")
+            batch = pa.RecordBatch.from_arrays(batch.columns, schema=schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            for index, column in enumerate(batch.columns):
+                null_counts[index] += column.null_count
+            if timestamp_column is not None:
+                bounds = pc.min_max(batch.column(timestamp_column))
+                low, high = bounds['min'].as_py(), bounds['max'].as_py()
+                if low is not None:
+                    earliest = low if earliest is None else min(earliest, low)
+                    latest = high if latest is None else max(latest, high)
+            if on_batch is not None:
+                on_batch(rows)
+
+    return {
+        'schema': schema,
+        'rows': rows,
+        'null_counts': null_counts,
+        'timestamp_column': None if timestamp_column is None else schema[timestamp_column].name,
+        'time_range': (_aware(earliest), _aware(latest)),
+    }
+
+
+def ingest(dataset, block_size=None, on_batch=None):
+    """
+    Converts the dataset's source document into its Arrow file and records the schema,
+    row count and time range on `dataset` (not saved). Raises DatasetError.
+    """
+    document = dataset.source_document
+    if document is None or not document.file:
+        raise DatasetError("The dataset has no source file.")
+    storage = document.file.storage
+    if not storage.exists(document.file.name):
+        raise DatasetError("The source file is missing.")
+
+    # Next to the upload part files, so the storage can move the result into place
+    directory = get_upload_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='dataset-', suffix='.arrow', dir=directory)
+    os.close(fd)
+    opened = []
+
+    def open_source():
+        file = storage.open(document.file.name, 'rb')
+        opened.append(file)
+        return file
+
+    try:
+        result = convert_csv(open_source(), path, block_size, reopen=open_source, on_batch=on_batch)
+        if not result['rows']:
+            raise DatasetError("The file contains no transactions.")
+        name = data_file_name(dataset)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        dataset.data_location_uri = default_storage.save(name, PartFile(path, name))
+    finally:
+        for file in opened:
+            file.close()
+        remove_file(path)
+
+    dataset.record_count = result['rows']
+    dataset.data_time_range_start, dataset.data_time_range_end = result['time_range']
+    dataset.data_schema_info = {
+        'format': 'arrow-ipc',
+        'columns': [
+            {'name': field.name, 'type': str(field.type), 'null_count': nulls}
+            for field, nulls in zip(result['schema'], result['null_counts'])
+        ],
+        'timestamp_column': result['timestamp_column'],
+        'source_size': document.file.size,
+        # Identifies this version of the data, e.g. for the detector cache (detection.py)
+        'ingested_at': timezone.now().isoformat(),
+    }
+
+
+def claim_dataset():
+    """
+    Takes the oldest dataset waiting for ingestion (status New -> Uploading), or returns
+    None. The UPDATE only matches while the dataset is still New, so two workers can
+    never both claim it.
+    """
+    candidates = (
+        TransactionDataset.objects.filter(status='New')
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:CLAIM_CANDIDATES]
+    )
+    for pk in list(candidates):
+        now = timezone.now()
+        claimed = TransactionDataset.objects.filter(pk=pk, status='New').update(
+            status='Uploading', lease_expires_at=now + get_lease(), ingest_attempts=F('ingest_attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return TransactionDataset.objects.select_related('source_document').get(pk=pk)
+    return None
+
+
+def is_being_ingested(dataset):
+    """
+    Whether a worker holds a live claim on `dataset`, so it must not be changed or
+    deleted. Claims whose lease ran out are as good as requeued.
+    """
+    return (
+        dataset.status == 'Uploading'
+        and dataset.lease_expires_at is not None
+        and dataset.lease_expires_at >= timezone.now()
+    )
+
+
+def requeue_stale_datasets():
+    """
+    Queues datasets whose ingesting worker stopped renewing its lease again, or marks
+    them Error after too many claims. Returns the number of datasets changed.
+    """
+    now = timezone.now()
+    max_attempts = getattr(settings, 'AUDIT_DATASET_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    # Without a lease: claimed before leases existed
+    stale = TransactionDataset.objects.filter(status='Uploading').exclude(lease_expires_at__gte=now)
+    failed = stale.filter(ingest_attempts__gte=max_attempts).update(
+        status='Error', error_message='The worker ingesting this dataset stopped responding.',
+        lease_expires_at=None, updated_at=now,
+    )
+    requeued = stale.filter(ingest_attempts__lt=max_attempts).update(
+        status='New', lease_expires_at=None, updated_at=now,
+    )
+    return failed + requeued
+
+
+def ingest_dataset(dataset):
+    """
+    Ingests a dataset and marks it Uploaded, or Error with the reason. Never raises for
+    problems with the file. The lease on a claimed dataset (claim_dataset()) is renewed
+    meanwhile; if it was lost anyway, the result is not saved.
+    """
+    lease = None
+    if dataset.status == 'Uploading' and dataset.lease_expires_at is not None:
+        lease = Lease(
+            TransactionDataset.objects.filter(pk=dataset.pk, status='Uploading'), dataset.lease_expires_at, get_lease(),
+        )
+    try:
+        ingest(dataset, on_batch=lease.renew if lease else None)
+    except LeaseLost:
+        logger.warning("Transaction dataset %s was taken away while being ingested", dataset.pk)
+        return dataset
+    except DatasetError as exc:
+        dataset.status = 'Error'
+        dataset.error_message = str(exc)
+    except Exception:
+        logger.exception("Ingesting transaction dataset %s failed", dataset.pk)
+        dataset.status = 'Error'
+        dataset.error_message = "Ingestion failed unexpectedly."
+    else:
+        dataset.status = 'Uploaded'
+        dataset.error_message = ''
+    fields = [
+        'status', 'error_message', 'data_location_uri', 'data_schema_info', 'record_count',
+        'data_time_range_start', 'data_time_range_end',
+    ]
+    dataset.lease_expires_at = None
+    if lease is None:
+        dataset.save(update_fields=fields + ['lease_expires_at', 'updated_at'])
+        return dataset
+    dataset.updated_at = timezone.now()
+    try:
+        lease.release(**{name: getattr(dataset, name) for name in fields + ['updated_at']})
+    except LeaseLost:
+        logger.warning("Transaction dataset %s was taken away while being ingested", dataset.pk)
+    return dataset
+
+
+def run_pending_ingestions():
+    """
+    Ingests the waiting datasets one by one, after queueing again those whose worker
+    died. Returns how many were processed.
+    """
+    requeue_stale_datasets()
+    count = 0
+    while (dataset := claim_dataset()) is not None:
+        ingest_dataset(dataset)
+        count += 1
+    return count
+
+
+def open_dataset(dataset):
+    """
+    The dataset's Arrow file as a pyarrow RecordBatchFileReader, memory-mapped when the
+    storage keeps it on a local filesystem. Batches read from it (get_batch(i), for i
+    in range(num_record_batches)) reference the mapped pages instead of copies.
+    """
+    if not dataset.data_location_uri:
+        raise DatasetError("The dataset has not been ingested.")
+    try:
+        source = pa.memory_map(default_storage.path(dataset.data_location_uri), 'r')
+    except NotImplementedError:
+        # Remote storage: read through the storage's file object
+        source = default_storage.open(dataset.data_location_uri, 'rb')
+    except FileNotFoundError:
+        raise DatasetError("The ingested file of the dataset is missing.")
+    return pa.ipc.open_file(source)
+
+
+def iter_batches(dataset, columns=None):
+    """
+    Yields the dataset's record batches, restricted to `columns` if given.
+    """
+    reader = open_dataset(dataset)
+    for index in range(reader.num_record_batches):
+        batch = reader.get_batch(index)
+        yield batch if columns is None else batch.select(columns)
+
+
+@receiver(post_delete, sender=TransactionDataset)
+def delete_data_file(sender, instance, **kwargs):
+    name = instance.data_location_uri
+    if name:
+        transaction.on_commit(lambda: default_storage.delete(name))
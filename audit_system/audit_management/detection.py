@@ -0,0 +1,430 @@
+"""
+Anomaly detection runs (AnomalyDetectionRun) over ingested transaction datasets.
+
+POST /detection-runs/ queues a run; `run_anomaly_detection` claims queued runs with a
+conditional UPDATE (PENDING -> PROCESSING) and executes them:
+
+1. The detector (scaler and isolation forest, see scoring.py) is fitted in one pass over
+   the memory-mapped dataset: the scaler on every row, the forest on a sample of
+   AUDIT_DETECTION_FIT_SAMPLE_SIZE rows (each tree only looks at 256 rows anyway).
+   Fitted detectors are cached per dataset and fit parameters, in this process and as
+   files in the default storage, so repeated runs and other workers skip the fit.
+2. The batches of the dataset are scored in AUDIT_DETECTION_WORKERS processes.
+3. The flagged transactions (row number, transaction id, score and features) are
+   written, as they are found, to an Arrow file named by ai_results_reference_id, and
+   the counts and timings to summary_info.
+4. Once the run is COMPLETED, the flagged transactions are stored as DetectedAnomaly
+   rows in bulk (anomalies.py); `ingest_detected_anomalies` finishes ingestions that
+   were interrupted.
+
+The dataset is Processing while runs score it, which keeps it from being queued for
+ingestion again; a run whose dataset is not (or no longer) ingested fails. The worker
+executing a run holds a lease on it (leases.py), renewed after every batch fitted or
+scored. A run whose worker died stays PROCESSING only until its lease runs out: then
+requeue_stale_runs() queues it again, or fails it after AUDIT_DETECTION_MAX_ATTEMPTS
+claims.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import anomalies, datasets, scoring
+from .leases import Lease, LeaseLost, renewing
+from .models import AnomalyDetectionRun, TransactionDataset
+from .uploads import PartFile, get_upload_dir, remove_file
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIT_SAMPLE_SIZE = 100000
+DEFAULT_MODEL_CACHE_SIZE = 8
+DEFAULT_LEASE = timedelta(minutes=10)
+DEFAULT_MAX_ATTEMPTS = 3
+# Dataset statuses a run can start from: ingested, possibly scored by other runs now
+RUNNABLE_DATASET_STATUSES = ('Uploaded', 'Analyzed', 'Processing')
+# Share of the transactions flagged at each sensitivity level (the forest's contamination)
+SENSITIVITY_CONTAMINATION = {'low': 0.01, 'medium': 0.03, 'high': 0.05}
+DEFAULT_SENSITIVITY = 'medium'
+DEFAULT_ID_COLUMN = 'TransactionID'
+NUMERIC_TYPE_PREFIXES = ('int', 'uint', 'float', 'double', 'halffloat', 'decimal')
+# Runs a worker looks at per claim attempt; others may be claiming the same ones
+CLAIM_CANDIDATES = 10
+# Parameters that change the fitted detector (the others only change the scoring)
+FIT_PARAMETERS = ('features', 'n_estimators', 'contamination', 'max_samples', 'random_state', 'fit_sample_size')
+
+
+class DetectionError(Exception):
+    """
+    A run that cannot be executed with its dataset and parameters.
+    """
+
+
+def get_workers():
+    return getattr(settings, 'AUDIT_DETECTION_WORKERS', 0) or os.cpu_count() or 1
+
+
+def get_fit_sample_size():
+    return getattr(settings, 'AUDIT_DETECTION_FIT_SAMPLE_SIZE', DEFAULT_FIT_SAMPLE_SIZE)
+
+
+def get_lease():
+    return getattr(settings, 'AUDIT_DETECTION_LEASE', DEFAULT_LEASE)
+
+
+def resolve_parameters(dataset, sensitivity_level=None, params=None):
+    """
+    The complete parameters of a run on `dataset`, from the sensitivity level and the
+    parameters given (validated by DetectionParametersSerializer). Raises DetectionError
+    when the dataset lacks a feature column.
+    """
+    params = dict(params or {})
+    columns = {column['name']: column['type'] for column in (dataset.data_schema_info or {}).get('columns', [])}
+    if not columns:
+        raise DetectionError("The dataset has not been ingested.")
+    features = list(params.get('features') or scoring.DEFAULT_FEATURES)
+    for name in features:
+        if name not in columns:
+            raise DetectionError(f"The dataset has no column {name!r}.")
+        if not columns[name].startswith(NUMERIC_TYPE_PREFIXES):
+            raise DetectionError(f"The column {name!r} is not numeric ({columns[name]}).")
+    id_column = params.get('id_column', DEFAULT_ID_COLUMN if DEFAULT_ID_COLUMN in columns else None)
+    if id_column is not None and id_column not in columns:
+        raise DetectionError(f"The dataset has no column {id_column!r}.")
+    contamination = params.get('contamination')
+    if contamination is None:
+        contamination = SENSITIVITY_CONTAMINATION[sensitivity_level or DEFAULT_SENSITIVITY]
+    return {
+        'features': features,
+        'id_column': id_column,
+        'contamination': contamination,
+        'n_estimators': params.get('n_estimators', 100),
+        'max_samples': params.get('max_samples', 'auto'),
+        'random_state': params.get('random_state', 42),
+        'fit_sample_size': params.get('fit_sample_size', get_fit_sample_size()),
+    }
+
+
+def model_key(dataset, parameters):
+    """
+    Identifies a fitted detector: the dataset as last ingested, and the fit parameters.
+    """
+    payload = json.dumps({
+        'dataset': str(dataset.pk),
+        'ingested_at': (dataset.data_schema_info or {}).get('ingested_at'),
+        **{name: parameters[name] for name in FIT_PARAMETERS},
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def model_directory(dataset_id):
+    return f'anomaly_models/{dataset_id}'
+
+
+def results_file_name(run):
+    return f'anomaly_results/{run.dataset_id}/{run.pk}.arrow'
+
+
+class DetectorCache:
+    """
+    The most recently used fitted detectors of this process, by model_key().
+    """
+
+    def __init__(self):
+        self._detectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            detector = self._detectors.get(key)
+            if detector is not None:
+                self._detectors.move_to_end(key)
+            return detector
+
+    def put(self, key, detector):
+        size = getattr(settings, 'AUDIT_DETECTION_MODEL_CACHE_SIZE', DEFAULT_MODEL_CACHE_SIZE)
+        with self._lock:
+            self._detectors[key] = detector
+            self._detectors.move_to_end(key)
+            while len(self._detectors) > size:
+                self._detectors.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._detectors.clear()
+
+
+detector_cache = DetectorCache()
+
+
+def get_detector(dataset, parameters, lease=None):
+    """
+    (detector, source): the fitted detector for `dataset` and `parameters`, from this
+    process's cache ('memory'), from the storage ('storage'), or fitted now ('fitted').
+    `lease` is renewed while fitting.
+    """
+    key = model_key(dataset, parameters)
+    detector = detector_cache.get(key)
+    if detector is not None:
+        return detector, 'memory'
+
+    name = f'{model_directory(dataset.pk)}/{key}.pickle'
+    if default_storage.exists(name):
+        # Written by this application only
+        with default_storage.open(name, 'rb') as file:
+            detector = pickle.load(file)
+        detector_cache.put(key, detector)
+        return detector, 'storage'
+
+    try:
+        batches = datasets.iter_batches(dataset, parameters['features'])
+        detector = scoring.fit_detector(
+            batches if lease is None else renewing(batches, lease),
+            parameters['features'],
+            dataset.record_count or 0,
+            fit_sample_size=parameters['fit_sample_size'],
+            n_estimators=parameters['n_estimators'],
+            contamination=parameters['contamination'],
+            max_samples=parameters['max_samples'],
+            random_state=parameters['random_state'],
+        )
+    except ValueError as exc:
+        raise DetectionError(str(exc))
+    _save_file(name, pickle.dumps(detector, protocol=pickle.HIGHEST_PROTOCOL))
+    detector_cache.put(key, detector)
+    return detector, 'fitted'
+
+
+def _save_file(name, content):
+    # Replaces any file of that name (written concurrently by another worker)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(content))
+
+
+def score_dataset(run, detector, parameters, workers=None, lease=None):
+    """
+    Scores the dataset of `run` and writes its flagged rows (see scoring.result_schema)
+    to the run's results file as they are found, renewing `lease` after each batch.
+    Returns (storage name, ScoringSummary).
+    """
+    dataset = run.dataset
+    try:
+        path = default_storage.path(dataset.data_location_uri)
+    except NotImplementedError:
+        # Worker processes need a file to map: score here
+        reader = datasets.open_dataset(dataset)
+        results = scoring.score_stream(
+            detector, (reader.get_batch(index) for index in range(reader.num_record_batches)),
+        )
+    else:
+        results = scoring.score_file(detector, path, workers or get_workers())
+
+    directory = get_upload_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, output = tempfile.mkstemp(prefix='anomalies-', suffix='.arrow', dir=directory)
+    os.close(fd)
+    name = results_file_name(run)
+    try:
+        with scoring.ArrowFileSink(output, scoring.result_schema(parameters['features'])) as sink:
+            summary = scoring.write_flagged(
+                results, sink, parameters['id_column'], parameters['features'], on_batch=lease.renew if lease else None,
+            )
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        return default_storage.save(name, PartFile(output, name)), summary
+    finally:
+        remove_file(output)
+
+
+def execute(run, workers=None, lease=None):
+    """
+    Fits (or reuses) the detector of a run, scores its dataset and stores the results on
+    `run` (not saved), renewing `lease` meanwhile. Raises DetectionError and LeaseLost.
+    """
+    dataset = run.dataset
+    parameters = resolve_parameters(dataset, run.sensitivity_level, run.parameters_used)
+    started = time.perf_counter()
+    detector, source = get_detector(dataset, parameters, lease)
+    fitted = time.perf_counter()
+    run.ai_results_reference_id, summary = score_dataset(run, detector, parameters, workers, lease)
+    finished = time.perf_counter()
+
+    run.parameters_used = parameters
+    run.summary_info = {
+        'records_total': summary.rows,
+        'records_scored': summary.scored,
+        'records_skipped': summary.rows - summary.scored,
+        'anomalies_found': summary.flagged,
+        'anomaly_rate': round(summary.flagged / summary.scored, 6) if summary.scored else 0.0,
+        'max_score': summary.max_score,
+        'model': source,
+        'fit_seconds': round(fitted - started, 3),
+        'score_seconds': round(finished - fitted, 3),
+    }
+
+
+def claim_run():
+    """
+    Takes the oldest queued run (PENDING -> PROCESSING), or returns None.
+    """
+    candidates = (
+        AnomalyDetectionRun.objects.filter(status='PENDING')
+        .order_by('requested_at')
+        .values_list('pk', flat=True)[:CLAIM_CANDIDATES]
+    )
+    for pk in list(candidates):
+        now = timezone.now()
+        claimed = AnomalyDetectionRun.objects.filter(pk=pk, status='PENDING').update(
+            status='PROCESSING', processing_started_at=now, lease_expires_at=now + get_lease(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return AnomalyDetectionRun.objects.select_related('dataset').get(pk=pk)
+    return None
+
+
+def is_running(run):
+    """
+    Whether a worker holds a live claim on `run`. Claims whose lease ran out are as
+    good as requeued.
+    """
+    return run.status == 'PROCESSING' and run.lease_expires_at is not None and run.lease_expires_at >= timezone.now()
+
+
+def settle_datasets(dataset_ids):
+    """
+    Datasets no run is scoring any more leave Processing: Analyzed if one of their runs
+    completed, Uploaded otherwise.
+    """
+    idle = (
+        TransactionDataset.objects.filter(pk__in=dataset_ids, status='Processing')
+        .exclude(detection_runs__status='PROCESSING')
+    )
+    now = timezone.now()
+    idle.filter(detection_runs__status='COMPLETED').update(status='Analyzed', updated_at=now)
+    idle.update(status='Uploaded', updated_at=now)
+
+
+def requeue_stale_runs():
+    """
+    Queues runs whose worker stopped renewing its lease again, or fails them after too
+    many claims. Returns the number of runs changed.
+    """
+    now = timezone.now()
+    max_attempts = getattr(settings, 'AUDIT_DETECTION_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    # Without a lease: claimed before leases existed
+    stale = AnomalyDetectionRun.objects.filter(status='PROCESSING').exclude(lease_expires_at__gte=now)
+    dataset_ids = list(stale.values_list('dataset_id', flat=True).distinct())
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='FAILED', error_message='The worker executing this run stopped responding.',
+        completed_at=now, lease_expires_at=None,
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status='PENDING', lease_expires_at=None)
+    settle_datasets(dataset_ids)
+    return failed + requeued
+
+
+def run_detection(run, workers=None):
+    """
+    Executes a run and marks it COMPLETED, or FAILED with the reason; the dataset is
+    Processing meanwhile and Analyzed afterwards. The anomalies of a completed run are
+    then stored. Never raises for detection errors. The lease on a claimed run
+    (claim_run()) is renewed meanwhile; if it was lost anyway, the result is not saved.
+    """
+    lease = None
+    if run.status == 'PROCESSING' and run.lease_expires_at is not None:
+        lease = Lease(
+            AnomalyDetectionRun.objects.filter(pk=run.pk, status='PROCESSING'), run.lease_expires_at, get_lease(),
+        )
+    # Not while the dataset is queued for ingestion again (it would be taken out of the
+    # queue), being ingested or failed it
+    started = TransactionDataset.objects.filter(pk=run.dataset_id, status__in=RUNNABLE_DATASET_STATUSES).update(
+        status='Processing', updated_at=timezone.now(),
+    )
+    try:
+        if not started:
+            raise DetectionError("The dataset is not ingested; it may be queued for ingestion again.")
+        execute(run, workers, lease)
+    except LeaseLost:
+        logger.warning("Anomaly detection run %s was taken away from this worker", run.pk)
+        return run
+    except (DetectionError, datasets.DatasetError) as exc:
+        run.status = 'FAILED'
+        run.error_message = str(exc)
+    except Exception:
+        logger.exception("Anomaly detection run %s failed", run.pk)
+        run.status = 'FAILED'
+        run.error_message = "Detection failed unexpectedly."
+    else:
+        run.status = 'COMPLETED'
+        run.error_message = None
+    run.completed_at = timezone.now()
+    run.lease_expires_at = None
+    fields = ['status', 'error_message', 'parameters_used', 'summary_info', 'ai_results_reference_id', 'completed_at']
+    try:
+        if lease is None:
+            run.save(update_fields=fields + ['lease_expires_at'])
+        else:
+            lease.release(**{name: getattr(run, name) for name in fields})
+    except LeaseLost:
+        logger.warning("Anomaly detection run %s was taken away from this worker", run.pk)
+        return run
+    settle_datasets([run.dataset_id])
+    if run.status == 'COMPLETED':
+        try:
+            anomalies.ingest_run(run)
+        except Exception:
+            # The run stays pending for ingest_detected_anomalies, which resumes it
+            logger.exception("Ingesting the anomalies of detection run %s failed", run.pk)
+    return run
+
+
+def run_pending_detections(workers=None):
+    """
+    Executes the queued runs one by one, after queueing again those whose worker died.
+    Returns how many were executed.
+    """
+    requeue_stale_runs()
+    count = 0
+    while (run := claim_run()) is not None:
+        run_detection(run, workers)
+        count += 1
+    return count
+
+
+@receiver(post_delete, sender=AnomalyDetectionRun)
+def delete_results_file(sender, instance, **kwargs):
+    name = instance.ai_results_reference_id
+    if name:
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+@receiver(post_delete, sender=TransactionDataset)
+def delete_fitted_models(sender, instance, **kwargs):
+    directory = model_directory(instance.pk)
+
+    def delete():
+        try:
+            _, files = default_storage.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in files:
+            default_storage.delete(f'{directory}/{name}')
+
+    transaction.on_commit(delete)
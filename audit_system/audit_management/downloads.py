@@ -0,0 +1,174 @@
+"""
+Serving stored documents: conditional requests, byte ranges and web server offload.
+
+With settings.AUDIT_DOWNLOAD_OFFLOAD set, the response only carries headers and the
+front-end server sends the file (X-Sendfile for Apache/lighttpd, X-Accel-Redirect for
+nginx, which also handles Range itself). Otherwise a FileResponse is returned: whole
+files go to the WSGI server's file_wrapper (sendfile where the server supports it),
+ranges are streamed in blocks.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .storage import digest_from_name
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+DEFAULT_ACCEL_PREFIX = '/protected-media/'
+
+
+class DownloadRenderer(BaseRenderer):
+    """
+    Lets download actions pass DRF's content negotiation for any Accept header.
+    Only error payloads are ever rendered through it; files bypass renderers.
+    """
+    media_type = '*/*'
+    format = 'download'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return JSONRenderer().render(data)
+
+
+class RangeFile:
+    """
+    A file object limited to `length` bytes from `start`. Deliberately has no
+    fileno()/tell(), so servers stream it with read() rather than sending the whole file.
+    """
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def get_etag(name, stat):
+    """
+    Content-addressed files are identified by their digest (a strong validator that
+    survives copies and restores); other files by size and modification time.
+    """
+    digest = digest_from_name(name)
+    if digest:
+        return f'"{digest}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to send the whole file
+    (no header, or several ranges), or False if the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        # Multiple or malformed ranges: a 200 with the full body is always allowed.
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(last_modified) <= date
+
+
+def serve_file(request, fieldfile, filename=None):
+    """
+    The response for downloading `fieldfile` (a FieldFile in a filesystem storage).
+    """
+    path = fieldfile.path
+    stat = os.stat(path)
+    etag = get_etag(fieldfile.name, stat)
+    last_modified = stat.st_mtime
+    filename = filename or os.path.basename(fieldfile.name)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        if not_modified.status_code == 304:
+            not_modified['ETag'] = etag
+        return not_modified
+
+    offload = getattr(settings, 'AUDIT_DOWNLOAD_OFFLOAD', '')
+    if offload:
+        response = _offload_response(offload, path)
+    else:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        if byte_range is not None and not _if_range_matches(request, etag, last_modified):
+            byte_range = None
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'))
+        else:
+            start, end = byte_range
+            response = FileResponse(RangeFile(open(path, 'rb'), start, end - start + 1), status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    content_type, encoding = mimetypes.guess_type(filename)
+    if encoding is None and content_type:
+        response['Content-Type'] = content_type
+    else:
+        # Never let a client transparently decompress a stored .gz
+        response['Content-Type'] = 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _offload_response(offload, path):
+    response = HttpResponse()
+    if offload == 'x-accel-redirect':
+        prefix = getattr(settings, 'AUDIT_DOWNLOAD_ACCEL_PREFIX', DEFAULT_ACCEL_PREFIX)
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative)
+    elif offload == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError(f"Unknown AUDIT_DOWNLOAD_OFFLOAD mode: {offload!r}")
+    return response
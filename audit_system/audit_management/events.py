@@ -0,0 +1,272 @@
+"""
+Push updates for the dashboard and task boards (server-sent events).
+
+Committed status changes of tasks and projects are published to the channel of their
+project (`project:<id>`), and the dashboard status counters to `dashboard`, through
+the broker named by settings.AUDIT_EVENT_BROKER. EventStreamView (async_views.py)
+subscribes a client to the channels it asks for and streams what is published.
+
+LocalBroker fans events out within one process, which is enough for a single ASGI
+server process. With several processes or nodes, a write must reach subscribers
+connected elsewhere: point AUDIT_EVENT_BROKER at a class with the same three methods
+(publish, has_subscribers, subscribe) backed by a shared message bus.
+
+Nothing is read or published while nobody is subscribed.
+"""
+import asyncio
+import json
+import threading
+from functools import cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .counters import get_status_summary
+from .models import AuditProject, AuditTask
+from .signals import batch_accumulator, post_bulk_create, post_bulk_update, post_queryset_update
+
+
+DEFAULT_MAX_PENDING = 100
+DASHBOARD_CHANNEL = 'dashboard'
+
+
+def project_channel(project_id):
+    return f'project:{project_id}'
+
+
+class Event:
+    """
+    A named event with a JSON-serializable payload.
+    """
+    __slots__ = ('name', 'data')
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+    def encode(self):
+        """
+        The event in the text/event-stream format.
+        """
+        return f'event: {self.name}\ndata: {json.dumps(self.data, separators=(",", ":"))}\n\n'
+
+
+# Delivered in place of the events a subscriber was too slow to receive
+OVERFLOW = Event('resync', {'detail': 'Events were dropped; reload the current state.'})
+
+
+class Subscription:
+    """
+    A subscriber's queue of events, read from the event loop that created it.
+    Publishers may call deliver() from any thread.
+    """
+
+    def __init__(self, broker, channels, max_pending):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_pending)
+        self.overflowed = False
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Rather than holding an unbounded backlog for a stalled client, drop what is
+            # queued and tell it to reload
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """
+        The next event, or None if none arrived within `timeout` seconds.
+        """
+        if self.overflowed:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = False
+            return OVERFLOW
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    In-process fan-out of events to subscriptions.
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def has_subscribers(self, channel=None):
+        """
+        Whether anyone listens on `channel` (on any channel if None). Brokers that cannot
+        tell cheaply may always answer True.
+        """
+        if channel is None:
+            return bool(self._channels)
+        return channel in self._channels
+
+    def subscribe(self, channels, max_pending=None):
+        """
+        A Subscription to `channels`. Call from the event loop that will read it.
+        """
+        if max_pending is None:
+            max_pending = getattr(settings, 'AUDIT_EVENTS_MAX_PENDING', DEFAULT_MAX_PENDING)
+        subscription = Subscription(self, channels, max_pending)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._channels.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._channels[channel]
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets EventSource requests (Accept: text/event-stream) pass DRF's content negotiation.
+    Only error payloads are rendered through it, as JSON; the stream itself is not.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+@cache
+def get_broker():
+    return import_string(getattr(settings, 'AUDIT_EVENT_BROKER', 'audit_management.events.LocalBroker'))()
+
+
+def dashboard_event(summary):
+    return Event(DASHBOARD_CHANNEL, {
+        'project_status_summary': summary[AuditProject],
+        'task_status_summary': summary[AuditTask],
+    })
+
+
+def record(model, changes, using=None):
+    """
+    Queues status events for `changes` ([(pk, previous status or None if new, project
+    id or None if unknown, deleted)]) until the write's transaction commits.
+    """
+    if not changes:
+        return
+    items = [(model, *change) for change in changes]
+    pending = batch_accumulator(('status_events', using), lambda batch: _publish_on_commit(batch, using))
+    if pending is not None:
+        pending.extend(items)
+        return
+    _publish_on_commit(items, using)
+
+
+def _publish_on_commit(items, using):
+    transaction.on_commit(lambda: publish_status_changes(items, using), using=using)
+
+
+def publish_status_changes(items, using=None):
+    """
+    Publishes the status events of committed `items` (see record()), reading the current
+    status and project of the changed rows, and the dashboard counters.
+    """
+    broker = get_broker()
+    if not broker.has_subscribers():
+        return
+
+    if broker.has_subscribers(DASHBOARD_CHANNEL):
+        broker.publish(DASHBOARD_CHANNEL, dashboard_event(get_status_summary(AuditProject, AuditTask)))
+
+    for model, name, project_field in ((AuditTask, 'task.status', 'project_id'), (AuditProject, 'project.status', 'pk')):
+        # First recorded state of each row in the transaction
+        changes = {}
+        for item_model, pk, previous, project_id, deleted in items:
+            if item_model is model:
+                first = changes.setdefault(pk, [previous, project_id, deleted])
+                first[1] = first[1] if project_id is None else project_id
+                first[2] = deleted
+        current = {
+            pk: (status, project_id)
+            for pk, status, project_id in model._base_manager.using(using).filter(
+                pk__in=[pk for pk, (_, _, deleted) in changes.items() if not deleted]
+            ).values_list('pk', 'status', project_field)
+        }
+        for pk, (previous, project_id, deleted) in changes.items():
+            status, project_id = current.get(pk, (None, project_id))
+            if status == previous or project_id is None:
+                continue
+            data = {'id': pk, 'status': status, 'previous_status': previous}
+            if model is AuditTask:
+                data['project'] = project_id
+            broker.publish(project_channel(project_id), Event(name, data))
+
+
+@receiver(post_save, sender=AuditProject)
+@receiver(post_save, sender=AuditTask)
+def record_saved_status(sender, instance, created, using, **kwargs):
+    previous = getattr(instance, '_tracked_previous', None)
+    if not created and previous is not None and previous.get('status', instance.status) == instance.status:
+        return
+    project_id = instance.pk if sender is AuditProject else instance.project_id
+    record(sender, [(instance.pk, None if created or previous is None else previous['status'], project_id, False)], using)
+
+
+@receiver(post_delete, sender=AuditProject)
+@receiver(post_delete, sender=AuditTask)
+def record_deleted_status(sender, instance, using, **kwargs):
+    project_id = instance.pk if sender is AuditProject else instance.project_id
+    record(sender, [(instance.pk, instance.status, project_id, True)], using)
+
+
+@receiver(post_bulk_create, sender=AuditProject)
+@receiver(post_bulk_create, sender=AuditTask)
+def record_bulk_created_status(sender, objs, using, **kwargs):
+    record(sender, [
+        (obj.pk, None, obj.pk if sender is AuditProject else obj.project_id, False)
+        for obj in objs if obj.pk is not None
+    ], using)
+
+
+@receiver(post_bulk_update, sender=AuditProject)
+@receiver(post_bulk_update, sender=AuditTask)
+def record_bulk_updated_status(sender, objs, fields, previous, using, **kwargs):
+    if 'status' not in fields:
+        return
+    record(sender, [
+        (obj.pk, previous[obj.pk]['status'], None, False) for obj in objs if obj.pk in previous
+    ], using)
+
+
+@receiver(post_queryset_update, sender=AuditProject)
+@receiver(post_queryset_update, sender=AuditTask)
+def record_queryset_updated_status(sender, previous, values, using, **kwargs):
+    if 'status' not in values:
+        return
+    record(sender, [(pk, old['status'], None, False) for pk, old in previous.items()], using)
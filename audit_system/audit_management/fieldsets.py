@@ -0,0 +1,204 @@
+"""
+Sparse fieldsets and relation expansion for the read endpoints.
+
+`?fields=id,status` returns only those fields, `?omit=description,scope` every field but
+those (both may be combined). Dropped fields are never built or serialized, and the
+view narrows its queryset with .only() to the columns the remaining fields read, so a
+narrow board view neither loads nor renders the long text columns.
+
+`?expand=project,assignee` replaces those related ids with a compact representation of
+the related object (the serializer's Meta.expandable_fields), and the view adds the
+select_related()/prefetch_related() they need, so expanding costs no extra query per row.
+
+Writes always use the full serializer, with plain ids.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+
+
+def _split(value):
+    return [name for name in (part.strip() for part in (value or '').split(',')) if name]
+
+
+def get_sparse_fieldset(request, available):
+    """
+    The names of `available` the request asks for, in their declared order, or None
+    when it does not restrict the fields (no parameters, or not a read).
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    requested = {param: _split(request.query_params.get(param)) for param in (FIELDS_PARAM, OMIT_PARAM)}
+    if not any(requested.values()):
+        return None
+    errors = {
+        param: [f"Unknown field(s): {', '.join(unknown)}."]
+        for param, names in requested.items()
+        if (unknown := [name for name in names if name not in available])
+    }
+    if errors:
+        raise ValidationError(errors)
+    fields, omit = requested[FIELDS_PARAM], set(requested[OMIT_PARAM])
+    return [name for name in available if (not fields or name in fields) and name not in omit]
+
+
+def get_expanded_fields(request, expandable):
+    """
+    The names of `expandable` the request asks to expand, in the order asked.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return []
+    names = list(dict.fromkeys(_split(request.query_params.get(EXPAND_PARAM))))
+    unknown = [name for name in names if name not in expandable]
+    if unknown:
+        raise ValidationError({EXPAND_PARAM: [f"Field(s) cannot be expanded: {', '.join(unknown)}."]})
+    return names
+
+
+def expand_queryset(queryset, expanded):
+    """
+    `queryset` fetching the related objects of the `expanded` relations up front: joined
+    for forward relations, one extra query each for the others.
+    """
+    joined, prefetched = [], []
+    for name in expanded:
+        field = queryset.model._meta.get_field(name)
+        (joined if field.many_to_one or field.one_to_one else prefetched).append(name)
+    if joined:
+        queryset = queryset.select_related(*joined)
+    if prefetched:
+        queryset = queryset.prefetch_related(*prefetched)
+    return queryset
+
+
+def restrict_queryset(queryset, serializer_class, field_names, expanded=()):
+    """
+    `queryset` loading only the columns needed to serialize `field_names` (and to order
+    the rows), joining only the relations those columns are read through. Unchanged if
+    a field reads something other than model fields. Forward relations in `expanded`
+    load the columns of their compact representation.
+
+    Fields whose source is not a model field path (e.g. SerializerMethodFields) list the
+    model fields they read in the serializer's Meta.sparse_sources.
+    """
+    model = queryset.model
+    sources = getattr(serializer_class.Meta, 'sparse_sources', {})
+    expandable = getattr(serializer_class.Meta, 'expandable_fields', {})
+    declared = serializer_class._declared_fields
+    paths = []
+    for name in field_names:
+        if name in expanded:
+            relation = model._meta.get_field(name)
+            if relation.many_to_one or relation.one_to_one:
+                paths.extend(f'{name}__{nested}' for nested in expandable[name].Meta.fields)
+            continue
+        if name in sources:
+            paths.extend(sources[name])
+            continue
+        field = declared.get(name)
+        source = (field.source if field is not None else None) or name
+        if source == '*':
+            return queryset
+        paths.append(source.replace('.', '__'))
+    # Keyset pagination reads the ordering values of the first and last rows
+    paths.extend(
+        field.lstrip('-') for field in queryset.query.order_by
+        if isinstance(field, str) and field.lstrip('-') != 'pk'
+    )
+
+    related = set()
+    for path in paths:
+        relations = _resolve(model, path)
+        if relations is None:
+            return queryset
+        related.update(relations)
+
+    if queryset.query.select_related:
+        queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*paths)
+
+
+def _resolve(model, path):
+    """
+    The relations `path` goes through (['a', 'a__b'] for 'a__b__c') if it ends in a
+    concrete model field, None otherwise.
+    """
+    names = path.split('__')
+    relations = []
+    for i, name in enumerate(names):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete:
+            return None
+        if i < len(names) - 1:
+            if not (field.many_to_one or field.one_to_one):
+                return None
+            relations.append('__'.join(names[:i + 1]))
+            model = field.related_model
+    return relations
+
+
+class FlexFieldsSerializerMixin:
+    """
+    ModelSerializer mixin: builds only the fields the request asks for, expanding the
+    requested relations. Applies to the top-level serializer (or each item of a
+    top-level list), not to nested serializers.
+    """
+
+    def get_field_names(self, declared_fields, info):
+        names = super().get_field_names(declared_fields, info)
+        if not self._is_top_level():
+            return names
+        keep = get_sparse_fieldset(self.context.get('request'), names)
+        return names if keep is None else keep
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_top_level():
+            return fields
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in get_expanded_fields(self.context.get('request'), expandable):
+            if name in fields:
+                fields[name] = expandable[name](read_only=True)
+        return fields
+
+    def _is_top_level(self):
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class FlexFieldsViewMixin:
+    """
+    GenericAPIView mixin: shapes the list/retrieve queryset to the requested fields and
+    expansions.
+    """
+    flex_fields_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        action = getattr(self, 'action', None)
+        if action is not None and action not in self.flex_fields_actions:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        field_names = get_sparse_fieldset(self.request, list(serializer_class.Meta.fields))
+        expanded = [
+            name for name in get_expanded_fields(self.request, getattr(serializer_class.Meta, 'expandable_fields', {}))
+            if field_names is None or name in field_names
+        ]
+        if expanded:
+            queryset = expand_queryset(queryset, expanded)
+        if field_names is not None:
+            queryset = restrict_queryset(queryset, serializer_class, field_names, expanded)
+        return queryset
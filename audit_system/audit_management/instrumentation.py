@@ -0,0 +1,291 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware measures every request: SQL queries and the time spent in
+them, serialization (serializers using InstrumentedSerializerMixin), rendering, and
+the total. Statements run several times in one request with different parameters are
+reported as duplicates, the usual sign of an N+1 query pattern.
+
+Each request is logged as one JSON line to the `audit_management.requests` logger (at
+INFO) and slow requests to `audit_management.slow_requests` (at WARNING, sampled, with
+the duplicated statements). With AUDIT_SERVER_TIMING (off by default, as it reveals
+internals to any client), responses also carry the measurements in a `Server-Timing`
+header, which browser dev tools show next to the network timings.
+Rolling percentiles per endpoint are served to staff at /api/audit/metrics/requests/.
+
+The cost is two clock reads and a dict update per query and a few per request; nothing
+is formatted unless a logger or the header needs it. Statistics are per process: with
+several workers, each reports on the requests it served.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+logger = logging.getLogger('audit_management.requests')
+slow_logger = logging.getLogger('audit_management.slow_requests')
+
+DEFAULT_SLOW_REQUEST_MS = 1000
+DEFAULT_METRICS_WINDOW = 1000
+# A statement run this many times in one request is reported as an N+1 pattern
+DUPLICATE_QUERY_THRESHOLD = 3
+
+_current = ContextVar('audit_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    What one request spent its time on. Times are in seconds.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_time = 0.0
+        self.query_count = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.statements = Counter()
+        self.serializing = False
+        self._render_started = None
+
+    def record_query(self, sql, duration):
+        self.query_count += 1
+        self.db_time += duration
+        self.statements[sql] += 1
+
+    @property
+    def duplicate_queries(self):
+        """
+        {sql: times run} of the statements run at least DUPLICATE_QUERY_THRESHOLD times.
+        """
+        return {sql: count for sql, count in self.statements.items() if count >= DUPLICATE_QUERY_THRESHOLD}
+
+    def server_timing(self):
+        entries = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ]
+        duplicates = self.duplicate_queries
+        if duplicates:
+            entries.insert(1, f'dupq;desc="{sum(duplicates.values())} duplicated queries"')
+        return ', '.join(entries)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_time * 1000, 1),
+            'db_ms': round(self.db_time * 1000, 1),
+            'queries': self.query_count,
+            'duplicate_queries': sum(self.duplicate_queries.values()),
+            'serialize_ms': round(self.serialize_time * 1000, 1),
+            'render_ms': round(self.render_time * 1000, 1),
+        }
+
+
+def current_metrics():
+    """
+    The RequestMetrics of the request being handled, or None outside of one.
+    """
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper timing every statement of an instrumented request. It is
+    installed on every connection (install_query_recorder) rather than per request, so
+    it also sees the queries async views run in worker threads.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class InstrumentedSerializerMixin:
+    """
+    Serializer mixin: counts the time spent building representations as serialization.
+    Nested serializers and the items of a list are included in their parent's time.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serialize_time += time.perf_counter() - start
+            metrics.serializing = False
+
+
+class EndpointStats:
+    """
+    The last `window` measurements of each endpoint, for one process.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, metrics):
+        samples = self._samples.get(endpoint)
+        if samples is None:
+            window = getattr(settings, 'AUDIT_METRICS_WINDOW', DEFAULT_METRICS_WINDOW)
+            with self._lock:
+                samples = self._samples.setdefault(endpoint, deque(maxlen=window))
+        samples.append((metrics.total_time, metrics.db_time, metrics.query_count, bool(metrics.duplicate_queries)))
+
+    def summary(self):
+        """
+        {endpoint: statistics} with the total time percentiles in milliseconds.
+        """
+        with self._lock:
+            endpoints = list(self._samples.items())
+        summary = {}
+        for endpoint, samples in sorted(endpoints):
+            samples = list(samples)
+            if not samples:
+                continue
+            totals = sorted(sample[0] for sample in samples)
+            summary[endpoint] = {
+                'count': len(samples),
+                'p50_ms': _percentile(totals, 50),
+                'p95_ms': _percentile(totals, 95),
+                'p99_ms': _percentile(totals, 99),
+                'max_ms': round(totals[-1] * 1000, 1),
+                'avg_db_ms': round(sum(sample[1] for sample in samples) / len(samples) * 1000, 1),
+                'avg_queries': round(sum(sample[2] for sample in samples) / len(samples), 1),
+                'duplicate_query_requests': sum(sample[3] for sample in samples),
+            }
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def _percentile(ordered, percent):
+    # Nearest-rank percentile of a sorted list of seconds, in milliseconds
+    index = max(0, -(-len(ordered) * percent // 100) - 1)
+    return round(ordered[index] * 1000, 1)
+
+
+endpoint_stats = EndpointStats()
+
+
+def endpoint_name(request):
+    """
+    `METHOD view-name` of the URL pattern `request` matched, so /projects/1/ and
+    /projects/2/ count as the same endpoint.
+    """
+    match = getattr(request, 'resolver_match', None)
+    return f'{request.method} {match.view_name if match is not None else "<unresolved>"}'
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures each request, see the module docstring. Disabled by
+    settings.AUDIT_REQUEST_METRICS = False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, 'AUDIT_REQUEST_METRICS', True):
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'AUDIT_REQUEST_METRICS', True):
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time it from here to the
+        # post-render callback
+        metrics = _current.get()
+        if metrics is not None:
+            metrics._render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self._rendered(metrics))
+        return response
+
+    @staticmethod
+    def _rendered(metrics):
+        if metrics._render_started is not None:
+            metrics.render_time += time.perf_counter() - metrics._render_started
+            metrics._render_started = None
+
+    def finish(self, request, response, metrics):
+        # Streamed bodies are produced after this point and are not included
+        metrics.total_time = time.perf_counter() - metrics.started
+        endpoint = endpoint_name(request)
+        endpoint_stats.add(endpoint, metrics)
+        if getattr(settings, 'AUDIT_SERVER_TIMING', False):
+            response['Server-Timing'] = metrics.server_timing()
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'endpoint': endpoint,
+                'path': request.path,
+                'status': response.status_code,
+                **metrics.as_dict(),
+            }))
+        slow_ms = getattr(settings, 'AUDIT_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+        if (
+            metrics.total_time * 1000 >= slow_ms
+            and random.random() < getattr(settings, 'AUDIT_SLOW_REQUEST_SAMPLE_RATE', 1.0)
+        ):
+            duplicates = sorted(metrics.duplicate_queries.items(), key=lambda item: -item[1])
+            slow_logger.warning(json.dumps({
+                'endpoint': endpoint,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'user_id': getattr(getattr(request, 'user', None), 'pk', None),
+                **metrics.as_dict(),
+                'duplicated_statements': [{'sql': sql, 'count': count} for sql, count in duplicates[:5]],
+            }))
@@ -0,0 +1,266 @@
+"""
+Background report jobs, queued in the database (ReportJob) and run by `run_report_worker`.
+
+A POST to /reports/jobs/ only records a job; a worker process claims it with a
+conditional UPDATE (status Pending -> Running), renders the report to a temporary file
+and saves it to the default storage. Workers hold a lease on the jobs they run and
+renew it while rendering; jobs whose lease runs out (a worker died) go back to the
+queue until AUDIT_REPORT_MAX_ATTEMPTS. Finished jobs and their files are deleted once
+they expire, AUDIT_REPORT_TTL after finishing.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ReportJob
+from .reports import iter_project_report_csv
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_TTL = timedelta(hours=24)
+DEFAULT_JOB_LEASE = timedelta(minutes=10)
+DEFAULT_MAX_ATTEMPTS = 3
+HEARTBEAT_SECONDS = 5
+# Pending jobs a worker looks at per claim attempt; others may be claiming the same ones
+CLAIM_CANDIDATES = 10
+
+
+class ReportKind:
+    """
+    A report that can be rendered in the background. `render(**params)` yields bytes.
+    """
+    def __init__(self, label, render, extension):
+        self.label = label
+        self.render = render
+        self.extension = extension
+
+
+REPORT_KINDS = {
+    'projects_csv': ReportKind('Audit projects (CSV)', iter_project_report_csv, 'csv'),
+}
+
+
+class LeaseLost(Exception):
+    """
+    The job was requeued or deleted while this worker was rendering it.
+    """
+
+
+def get_report_ttl():
+    return getattr(settings, 'AUDIT_REPORT_TTL', DEFAULT_REPORT_TTL)
+
+
+def get_job_lease():
+    return getattr(settings, 'AUDIT_REPORT_JOB_LEASE', DEFAULT_JOB_LEASE)
+
+
+def get_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def make_dedupe_key(kind, params):
+    payload = json.dumps({'kind': kind, 'params': params}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def submit_job(kind, params, user):
+    """
+    Queues a job, or returns the queued/running job for identical parameters.
+    Returns (job, created).
+    """
+    dedupe_key = make_dedupe_key(kind, params)
+    active = ReportJob.objects.filter(dedupe_key=dedupe_key, status__in=ReportJob.ACTIVE_STATUSES)
+    for _ in range(3):
+        job = active.first()
+        if job is not None:
+            return job, False
+        try:
+            with transaction.atomic():
+                return ReportJob.objects.create(kind=kind, params=params, dedupe_key=dedupe_key, requested_by=user), True
+        except IntegrityError:
+            # Submitted concurrently; pick that job up (unless it already finished).
+            continue
+    raise RuntimeError("Could not queue the report job")
+
+
+def claim_job(worker_id):
+    """
+    Takes the oldest pending job for `worker_id`, or returns None if the queue is empty.
+    The UPDATE only matches while the job is still Pending, so two workers can never
+    both claim it, on any database.
+    """
+    candidates = (
+        ReportJob.objects.filter(status='Pending')
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:CLAIM_CANDIDATES]
+    )
+    for pk in list(candidates):
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(pk=pk, status='Pending').update(
+            status='Running',
+            worker=worker_id,
+            started_at=now,
+            lease_expires_at=now + get_job_lease(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return ReportJob.objects.get(pk=pk)
+    return None
+
+
+def run_job(job, worker_id):
+    """
+    Renders a claimed job and stores the result. Never raises for report errors:
+    those mark the job Failed.
+    """
+    running = ReportJob.objects.filter(pk=job.pk, status='Running', worker=worker_id)
+    kind = REPORT_KINDS.get(job.kind)
+    temp = None
+    try:
+        if kind is None:
+            raise ValueError(f"Unknown report kind {job.kind!r}")
+        size = 0
+        last_beat = time.monotonic()
+        with tempfile.NamedTemporaryFile(suffix=f'.{kind.extension}', delete=False) as temp:
+            for block in kind.render(**job.params):
+                temp.write(block)
+                size += len(block)
+                if time.monotonic() - last_beat >= HEARTBEAT_SECONDS:
+                    if not running.update(lease_expires_at=timezone.now() + get_job_lease(), size=size):
+                        raise LeaseLost()
+                    last_beat = time.monotonic()
+
+        file_name = f'{job.kind}-{job.pk}.{kind.extension}'
+        with open(temp.name, 'rb') as f:
+            name = job.file.storage.save(job.file.field.generate_filename(job, file_name), File(f, name=file_name))
+        now = timezone.now()
+        finished = running.update(
+            status='Completed', file=name, size=size, finished_at=now,
+            expires_at=now + get_report_ttl(), lease_expires_at=None,
+        )
+        if not finished:
+            job.file.storage.delete(name)
+            raise LeaseLost()
+    except LeaseLost:
+        logger.warning("Report job %s was taken away from worker %s", job.pk, worker_id)
+    except Exception as exc:
+        logger.exception("Report job %s failed", job.pk)
+        now = timezone.now()
+        running.update(
+            status='Failed', error=f'{type(exc).__name__}: {exc}'[:2000], finished_at=now,
+            expires_at=now + get_report_ttl(), lease_expires_at=None,
+        )
+    finally:
+        if temp is not None:
+            try:
+                os.remove(temp.name)
+            except FileNotFoundError:
+                pass
+
+
+def requeue_stale_jobs():
+    """
+    Returns jobs whose worker stopped renewing its lease to the queue, or fails them
+    after too many attempts. Returns the number of jobs changed.
+    """
+    now = timezone.now()
+    max_attempts = getattr(settings, 'AUDIT_REPORT_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    stale = ReportJob.objects.filter(status='Running', lease_expires_at__lt=now)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='Failed', error='The worker rendering this report stopped responding.',
+        finished_at=now, expires_at=now + get_report_ttl(), lease_expires_at=None,
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status='Pending', worker='', lease_expires_at=None, size=0,
+    )
+    return failed + requeued
+
+
+def purge_expired_jobs():
+    """
+    Deletes finished jobs past their expiry together with their files.
+    """
+    purged = 0
+    expired = ReportJob.objects.filter(expires_at__lte=timezone.now()).exclude(status__in=ReportJob.ACTIVE_STATUSES)
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        purged += 1
+    return purged
+
+
+def run_pending_jobs(worker_id=None):
+    """
+    Runs queued jobs one after another in this thread until the queue is empty.
+    Returns the number of jobs run.
+    """
+    worker_id = worker_id or get_worker_id()
+    count = 0
+    while True:
+        job = claim_job(worker_id)
+        if job is None:
+            return count
+        run_job(job, worker_id)
+        count += 1
+
+
+class ReportWorker:
+    """
+    Runs jobs on a pool of threads, polling the queue, until stop() is called.
+    Rendering is mostly database and file I/O, so threads overlap well.
+    """
+    maintenance_interval = 60
+
+    def __init__(self, threads=2, poll_interval=1.0, worker_id=None):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or get_worker_id()
+        self.stopping = False
+
+    def stop(self):
+        self.stopping = True
+
+    def run(self):
+        running = set()
+        last_maintenance = 0
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='report-worker') as pool:
+            while not self.stopping:
+                if time.monotonic() - last_maintenance >= self.maintenance_interval:
+                    requeue_stale_jobs()
+                    purge_expired_jobs()
+                    last_maintenance = time.monotonic()
+
+                while len(running) < self.threads:
+                    job = claim_job(self.worker_id)
+                    if job is None:
+                        break
+                    running.add(pool.submit(self._run, job))
+
+                if running:
+                    done, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    # Idle: do not keep a connection open between polls
+                    close_old_connections()
+                    time.sleep(self.poll_interval)
+            wait(running)
+
+    def _run(self, job):
+        try:
+            run_job(job, self.worker_id)
+        finally:
+            # Each pool thread has its own connection
+            connection.close()
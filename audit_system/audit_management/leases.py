@@ -0,0 +1,65 @@
+"""
+Leases on claimed rows: datasets being ingested (datasets.py), detection runs being
+executed (detection.py) and upload sessions receiving a chunk (uploads.py).
+
+Claiming a row sets its lease_expires_at. While working, the worker calls renew(),
+which pushes the expiry forward at most every HEARTBEAT_SECONDS, and finally release()
+with the row's results. Both are conditional UPDATEs matching the expiry the worker
+last wrote, so the expiry doubles as the claim's token: once a claim whose worker died
+has been taken back (its lease ran out and the row was requeued, failed or claimed
+again), renew() and release() match nothing and raise LeaseLost.
+"""
+import time
+
+from django.utils import timezone
+
+
+HEARTBEAT_SECONDS = 5
+
+
+class LeaseLost(Exception):
+    """
+    The row was requeued, failed or deleted since this worker claimed it.
+    """
+
+
+class Lease:
+    """
+    The claim held on the row of `queryset` (filtered to its pk and claimed status)
+    until `expires_at`, renewed for `duration` at a time.
+    """
+
+    def __init__(self, queryset, expires_at, duration):
+        self.queryset = queryset
+        self.expires_at = expires_at
+        self.duration = duration
+        self._last_beat = time.monotonic()
+
+    def _held(self):
+        return self.queryset.filter(lease_expires_at=self.expires_at)
+
+    def renew(self, *args):
+        # Accepts and ignores the arguments of progress callbacks
+        if time.monotonic() - self._last_beat < HEARTBEAT_SECONDS:
+            return
+        expires_at = timezone.now() + self.duration
+        if not self._held().update(lease_expires_at=expires_at):
+            raise LeaseLost()
+        self.expires_at = expires_at
+        self._last_beat = time.monotonic()
+
+    def release(self, **values):
+        """
+        Saves `values` on the row and ends the lease. Raises LeaseLost.
+        """
+        if not self._held().update(lease_expires_at=None, **values):
+            raise LeaseLost()
+
+
+def renewing(items, lease):
+    """
+    Yields `items`, renewing `lease` before each.
+    """
+    for item in items:
+        lease.renew()
+        yield item
@@ -0,0 +1,259 @@
+import json
+import tempfile
+from typing import NamedTuple
+
+import pyarrow as pa
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from audit_management import anomalies, jobs
+from audit_management.benchmarks import (
+    benchmark_database, compare_results, count_queries, get_benchmark_user, run_asgi_load, run_wsgi_load,
+    seed_documents, seed_projects, seed_tasks, summarize_load,
+)
+from audit_management.counters import recount_anomalies
+from audit_management.models import AnomalyDetectionRun, AuditProject, AuditTask, ProjectDocument, TransactionDataset
+from audit_management.signals import batched_changes
+
+
+class Route(NamedTuple):
+    """
+    How to benchmark one URL pattern of audit_management/urls.py.
+    """
+    method: str = 'GET'
+    # Fixture (see prepare_fixtures) passed as the `pk` URL argument
+    pk: str = None
+    # Query string, or fixtures -> query string
+    query: object = ''
+    # fixtures -> JSON body
+    body: object = None
+    # Served by an async view: benchmarked through the ASGI handler
+    asgi: bool = False
+    # Cap on requests per run, for routes that read whole tables
+    max_requests: int = None
+    # Concurrent writes to the same rows would only measure lock waits (and fail on SQLite)
+    concurrent: bool = True
+
+
+# Every URL name of audit_management/urls.py (tests check that none is missing); None for
+# routes without a latency to measure
+ROUTES = {
+    'api-root': Route(),
+    'hello': Route(),
+    'dashboard-summary': Route(),
+    'request-metrics': Route(),
+    'changes': Route(),
+    'report-projects-csv': Route(max_requests=5),
+    'project-list': Route(),
+    'project-detail': Route(pk='project'),
+    'task-list': Route(),
+    'task-detail': Route(pk='task'),
+    'task-bulk': Route('PATCH', body=lambda fixtures: [
+        {'id': pk, 'description': 'Benchmarked'} for pk in fixtures['bulk_tasks']
+    ], concurrent=False),
+    'document-list': Route(),
+    'document-detail': Route(pk='document'),
+    'document-download': Route(pk='document'),
+    'upload-list': Route(),
+    'upload-detail': Route(pk='upload'),
+    # A retried finalize, the only kind that can be repeated
+    'upload-finalize': Route('POST', pk='upload', concurrent=False),
+    'report-job-list': Route(),
+    'report-job-detail': Route(pk='report_job'),
+    'report-job-download': Route(pk='report_job'),
+    'dataset-list': Route(),
+    'dataset-detail': Route(pk='dataset'),
+    # Only queues the dataset again
+    'dataset-ingest': Route('POST', pk='dataset', concurrent=False),
+    'detection-run-list': Route(),
+    'detection-run-detail': Route(pk='detection_run'),
+    'anomaly-list': Route(query=lambda fixtures: f"?run={fixtures['detection_run']}"),
+    'anomaly-detail': Route(pk='anomaly'),
+    'anomaly-counts': Route(query=lambda fixtures: f"?run={fixtures['detection_run']}"),
+    # Moves the run's New anomalies once; later requests find none left to move
+    'anomaly-bulk-status': Route(
+        'POST', query=lambda fixtures: f"?run={fixtures['detection_run']}&status=New",
+        body=lambda fixtures: {'status': 'UnderReview'}, concurrent=False,
+    ),
+    'async-hello': Route(asgi=True),
+    'async-dashboard-summary': Route(asgi=True),
+    'async-project-list': Route(asgi=True),
+    'async-project-detail': Route(pk='project', asgi=True),
+    'async-task-list': Route(asgi=True),
+    'async-task-detail': Route(pk='task', asgi=True),
+    'async-report-job-wait': Route(pk='report_job', query='?timeout=0', asgi=True),
+    'async-events': None,  # A stream that stays open
+}
+
+
+def prepare_fixtures(user):
+    """
+    The objects the detail routes are benchmarked on: rows from the middle of the tables,
+    a finalized upload, a completed report job, a transaction dataset and a detection run
+    with flagged transactions.
+    """
+    def middle(model):
+        return model.objects.order_by('pk').values_list('pk', flat=True)[model.objects.count() // 2]
+
+    project = middle(AuditProject)
+    client = APIClient()
+    client.force_authenticate(user=user)
+    content = b'benchmark upload\n' * 64
+    upload = client.post(reverse('audit_management:upload-list'), {
+        'project': project, 'name': 'Benchmark upload', 'filename': 'upload.txt', 'total_size': len(content),
+    }, format='json').data['id']
+    client.put(
+        reverse('audit_management:upload-detail', kwargs={'pk': upload}), content,
+        content_type='application/octet-stream', HTTP_CONTENT_RANGE=f'bytes 0-{len(content) - 1}/{len(content)}',
+    )
+    client.post(reverse('audit_management:upload-finalize', kwargs={'pk': upload}))
+
+    # A report over one status keeps rendering it quick at any size
+    report_job, _ = jobs.submit_job('projects_csv', {'statuses': [AuditProject.STATUS_CHOICES[-1][0]]}, user)
+    jobs.run_pending_jobs()
+
+    document = middle(ProjectDocument)
+    dataset = TransactionDataset.objects.create(
+        project_id=ProjectDocument.objects.values_list('project_id', flat=True).get(pk=document),
+        name='Benchmark dataset', source_document_id=document, uploaded_by=user,
+    )
+    detection_run = AnomalyDetectionRun.objects.create(
+        project_id=dataset.project_id, dataset=dataset, status='COMPLETED', requested_by=user,
+    )
+    flagged = 1000
+    anomalies.insert_anomalies(anomalies.anomaly_rows(detection_run, pa.table({
+        'row': pa.array(range(flagged), pa.int64()),
+        'transaction_id': [f'T{row}' for row in range(flagged)],
+        'anomaly_score': [row / flagged for row in range(flagged)],
+    })))
+    recount_anomalies(detection_run.pk)
+
+    return {
+        'project': project,
+        'task': middle(AuditTask),
+        'document': document,
+        'upload': upload,
+        'report_job': report_job.pk,
+        'dataset': dataset.pk,
+        'detection_run': detection_run.pk,
+        'anomaly': detection_run.anomalies.order_by('-anomaly_score').values_list('pk', flat=True)[flagged // 2],
+        'bulk_tasks': list(AuditTask.objects.filter(project_id=project).values_list('pk', flat=True)[:50]),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures throughput, p50/p95/p99 latency and queries per request of every audit_management "
+        "route on seeded datasets of increasing size, and optionally fails when a route regressed "
+        "against an earlier run. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help="Rows of projects, tasks and documents to measure at, in increasing order.")
+        benchmarked = [name for name, route in ROUTES.items() if route is not None]
+        parser.add_argument('--routes', nargs='+', choices=sorted(benchmarked), default=benchmarked)
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route and size.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Worker threads (WSGI) or requests in flight (ASGI).")
+        parser.add_argument('--text-size', type=int, default=200,
+                            help="Length of each project description/scope/objectives value.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', help="Results of an earlier run to compare with.")
+        parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                            help="Allowed p95 latency growth over the baseline, as a fraction.")
+        parser.add_argument('--latency-slack-ms', type=float, default=5.0,
+                            help="Allowed p95 latency growth in milliseconds on top of the fraction.")
+        parser.add_argument('--query-tolerance', type=int, default=0,
+                            help="Allowed growth in queries per request over the baseline.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        results = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'sizes': sorted(options['sizes']),
+                'requests': options['requests'],
+                'workers': options['workers'],
+            },
+            'results': {},
+        }
+        media_root = tempfile.TemporaryDirectory(prefix='audit_benchmark_')
+        overrides = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], DEBUG=False,
+            MEDIA_ROOT=media_root.name, AUDIT_UPLOAD_SESSION_DIR=f'{media_root.name}/upload_sessions',
+            AUDIT_SLOW_REQUEST_MS=10 ** 9,
+        )
+        with media_root, benchmark_database(), overrides:
+            user = get_benchmark_user()
+            user.is_staff = True  # For request-metrics
+            user.save()
+            headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+            seeded = 0
+            fixtures = None
+            for size in sorted(options['sizes']):
+                self.stderr.write(f"Seeding {size} rows per table...")
+                with transaction.atomic(), batched_changes():
+                    seed_projects(size - seeded, start=seeded, text_size=options['text_size'])
+                    seed_tasks(size - seeded, start=seeded)
+                    seed_documents(size - seeded, start=seeded)
+                seeded = size
+                if fixtures is None:
+                    fixtures = prepare_fixtures(user)
+                results['results'][str(size)] = {
+                    name: self.run_route(name, ROUTES[name], fixtures, headers, options)
+                    for name in options['routes']
+                }
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        self.report(results)
+
+        if baseline is not None:
+            regressions = compare_results(
+                baseline, results, options['latency_tolerance'], options['latency_slack_ms'], options['query_tolerance'],
+            )
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n" + '\n'.join(regressions))
+            self.stdout.write("No regressions against the baseline.")
+
+    def run_route(self, name, route, fixtures, headers, options):
+        kwargs = {'pk': fixtures[route.pk]} if route.pk else {}
+        query = route.query(fixtures) if callable(route.query) else route.query
+        path = reverse(f'audit_management:{name}', kwargs=kwargs) + query
+        request = path if route.method == 'GET' else (
+            route.method, path, route.body(fixtures) if route.body else None,
+        )
+        total = min(options['requests'], route.max_requests or options['requests'])
+        run = run_asgi_load if route.asgi else run_wsgi_load
+
+        workers = options['workers'] if route.concurrent else 1
+
+        run([request], 1, 1, headers)  # Warm up
+        with count_queries() as counted:
+            result = summarize_load(*run([request], total, workers, headers))
+        result['queries'] = round(counted['queries'] / total, 1)
+        return result
+
+    def report(self, results):
+        for size, routes in results['results'].items():
+            self.stdout.write(f"{size} rows per table")
+            for name, result in routes.items():
+                self.stdout.write(
+                    f"  {name:<24} {result['requests_per_second']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+                    f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+                    f"queries {result['queries']}  errors {result['errors']}"
+                )
@@ -0,0 +1,81 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from audit_management.benchmarks import (
+    benchmark_database, count_connections, get_benchmark_user, run_asgi_load, run_wsgi_load, seed_projects,
+    seed_tasks, simulated_db_latency, summarize_load,
+)
+
+
+ENDPOINTS = {
+    'dashboard': ('audit_management:dashboard-summary', 'audit_management:async-dashboard-summary'),
+    'projects': ('audit_management:project-list', 'audit_management:async-project-list'),
+    'tasks': ('audit_management:task-list', 'audit_management:async-task-list'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the sync views under WSGI (a fixed pool of worker threads) with the async views "
+        "under ASGI (one event loop) on concurrent dashboard and list traffic. Requests go through "
+        "Django's own WSGI/ASGI handlers in-process; runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+        parser.add_argument('--requests', type=int, default=400, help="Requests per run.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight for the ASGI run.")
+        parser.add_argument('--workers', type=int, default=8,
+                            help="Worker threads for the WSGI run (e.g. gunicorn --threads).")
+        parser.add_argument('--db-latency-ms', type=float, default=5.0,
+                            help="Simulated database round trip added to every query (0 to disable).")
+        parser.add_argument('--projects', type=int, default=2000)
+        parser.add_argument('--tasks', type=int, default=10000)
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], DEBUG=False):
+            seed_projects(options['projects'], text_size=200)
+            seed_tasks(options['tasks'])
+            token = AccessToken.for_user(get_benchmark_user())
+            headers = {'Authorization': f'Bearer {token}'}
+
+            sync_paths = [reverse(ENDPOINTS[name][0]) for name in options['endpoints']]
+            async_paths = [reverse(ENDPOINTS[name][1]) for name in options['endpoints']]
+
+            with simulated_db_latency(options['db_latency_ms'] / 1000):
+                # Warm up both paths (URL resolver, middleware, first connections)
+                run_wsgi_load(sync_paths, len(sync_paths), 1, headers)
+                run_asgi_load(async_paths, len(async_paths), 1, headers)
+
+                # Django keeps a connection per thread: WSGI worker threads reuse theirs, while
+                # ASGI runs each request's ORM calls in a fresh thread, so it connects per request.
+                with count_connections() as connected:
+                    wsgi = summarize_load(*run_wsgi_load(sync_paths, options['requests'], options['workers'], headers))
+                results.append({'mode': 'wsgi-sync', 'workers': options['workers'], **wsgi,
+                                'connections_opened': connected['opened']})
+                with count_connections() as connected:
+                    asgi = summarize_load(*run_asgi_load(async_paths, options['requests'], options['concurrency'], headers))
+                results.append({'mode': 'asgi-async', 'concurrency': options['concurrency'], **asgi,
+                                'connections_opened': connected['opened']})
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"endpoints: {', '.join(options['endpoints'])}  db latency: {options['db_latency_ms']} ms/query"
+        )
+        for result in results:
+            parallelism = f"{result.get('workers', result.get('concurrency')):>4} {'threads' if 'workers' in result else 'in flight'}"
+            self.stdout.write(
+                f"{result['mode']:<11} {parallelism:<15} {result['requests_per_second']:>8} req/s  "
+                f"p50 {result['p50_ms']:>7} ms  p95 {result['p95_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  "
+                f"errors {result['errors']}  connections {result['connections_opened']}"
+            )
@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from audit_management.benchmarks import benchmark_database, get_benchmark_user, measure, seed_projects
+from audit_management.reports import iter_project_report_csv
+from audit_management.views import AuditProjectCSVReportView
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures peak memory of the streaming project CSV report as the number of projects grows. "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000],
+                            help="Project counts to measure, in increasing order.")
+        parser.add_argument('--text-size', type=int, default=500,
+                            help="Length of each description/scope/objectives value.")
+        parser.add_argument('--no-buffered', action='store_true',
+                            help="Skip the comparison run that buffers the whole report in memory.")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        results = []
+        with benchmark_database():
+            user = get_benchmark_user()
+            view = AuditProjectCSVReportView.as_view()
+            factory = APIRequestFactory()
+            seeded = 0
+
+            for rows in sorted(options['rows']):
+                seed_projects(rows - seeded, start=seeded, text_size=options['text_size'])
+                seeded = rows
+
+                request = factory.get('/api/audit/reports/projects/csv/')
+                force_authenticate(request, user=user)
+                with measure() as streamed:
+                    response = view(request)
+                    size = sum(len(block) for block in response.streaming_content)
+                    response.close()
+                result = {
+                    'rows': rows,
+                    'bytes': size,
+                    'streaming_seconds': round(streamed['seconds'], 3),
+                    'streaming_peak_kib': streamed['peak_bytes'] // 1024,
+                }
+
+                if not options['no_buffered']:
+                    # What the pre-streaming view did: the whole report held in memory at once.
+                    with measure() as buffered:
+                        buffered_size = len(b''.join(iter_project_report_csv()))
+                    result['buffered_bytes'] = buffered_size
+                    result['buffered_seconds'] = round(buffered['seconds'], 3)
+                    result['buffered_peak_kib'] = buffered['peak_bytes'] // 1024
+
+                results.append(result)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            line = (
+                f"{result['rows']:>9} rows  {result['bytes'] / 1024 / 1024:9.1f} MiB  "
+                f"streaming: {result['streaming_peak_kib']:>8} KiB peak {result['streaming_seconds']:8.3f}s"
+            )
+            if 'buffered_peak_kib' in result:
+                line += f"  buffered: {result['buffered_peak_kib']:>8} KiB peak {result['buffered_seconds']:8.3f}s"
+            self.stdout.write(line)
@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from audit_management import scoring, synthetic
+from audit_management.benchmarks import measure_rss, rss_bytes
+
+
+MB = 1024 * 1024
+# Fewer bytes than any generated CSV row takes, to ask for enough rows to fill the input
+MIN_ROW_BYTES = 40
+# Default growth limit: each batch in flight (one being read and two queued per worker)
+# may take this many times its CSV block once converted, Arrow reading ahead on several
+# threads, on top of a fixed allowance for the libraries' own buffers
+BATCH_MEMORY_MULTIPLE = 16
+FIXED_GROWTH = 32 * MB
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows that streaming anomaly scoring runs in bounded memory: scores a synthetic transaction "
+        "CSV --input-multiple times larger than --memory-mb (by default the machine's RAM) and fails "
+        "if resident memory grows by more than --max-growth-mb, or keeps growing after the first tenth "
+        "of the input. Needs that much free disk space."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--memory-mb', type=int, default=None,
+                            help="Memory to exceed with the input (default: physical RAM).")
+        parser.add_argument('--input-multiple', type=float, default=10.0,
+                            help="Size of the input as a multiple of --memory-mb.")
+        parser.add_argument('--max-growth-mb', type=int, default=None,
+                            help="Allowed growth of resident memory while scoring (default: derived from "
+                                 "--block-size and --workers).")
+        parser.add_argument('--max-drift-mb', type=int, default=None,
+                            help="Allowed growth of resident memory from the first tenth of the input "
+                                 "to the end (default: a quarter of --max-growth-mb).")
+        parser.add_argument('--block-size', type=int, default=None,
+                            help="Bytes of CSV read at a time (default: AUDIT_DATASET_BLOCK_SIZE).")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Scoring processes (only this process's memory is measured).")
+        parser.add_argument('--directory', default=None, help="Where to write the input (default: a temporary directory).")
+        parser.add_argument('--json', action='store_true', help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        memory = (options['memory_mb'] or self.physical_memory_mb()) * MB
+        target = int(memory * options['input_multiple'])
+        block_size = options['block_size'] or settings.AUDIT_DATASET_BLOCK_SIZE
+        if options['max_growth_mb'] is not None:
+            max_growth = options['max_growth_mb'] * MB
+        else:
+            in_flight = 1 + 2 * max(options['workers'], 1)
+            max_growth = FIXED_GROWTH + BATCH_MEMORY_MULTIPLE * block_size * in_flight
+        if options['max_drift_mb'] is not None:
+            max_drift = options['max_drift_mb'] * MB
+        else:
+            max_drift = max_growth // 4
+
+        directory = tempfile.mkdtemp(prefix='audit_scoring_', dir=options['directory'])
+        try:
+            free = shutil.disk_usage(directory).free
+            if free < target * 1.2:
+                raise CommandError(f"The input needs {target // MB} MB of disk space; {free // MB} MB are free.")
+
+            # A detector fitted beforehand, as detection runs leave them
+            detector = scoring.fit_detector(
+                synthetic.generate_batches(100000, seed=1), scoring.DEFAULT_FEATURES, 100000,
+                fit_sample_size=100000, n_estimators=100, contamination=0.01, max_samples='auto', random_state=42,
+            )
+            source = os.path.join(directory, 'transactions.csv')
+            self.stderr.write(f"Writing {target // MB} MB of transactions...")
+            rows = synthetic.write_transactions(
+                source, synthetic.generate_batches(target // MIN_ROW_BYTES + 1, chunk_rows=100000), max_bytes=target,
+            )
+            size = os.path.getsize(source)
+
+            samples = []
+
+            def sample(summary):
+                samples.append((summary.rows, rss_bytes()))
+
+            self.stderr.write(f"Scoring {rows} transactions ({size // MB} MB)...")
+            features = list(scoring.DEFAULT_FEATURES)
+            with measure_rss() as measured:
+                batches = scoring.iter_csv_batches(source, ['TransactionID', *features], block_size, features)
+                with scoring.ArrowFileSink(os.path.join(directory, 'anomalies.arrow'), scoring.result_schema(features)) as sink:
+                    summary = scoring.write_flagged(
+                        scoring.score_stream(detector, batches, options['workers']),
+                        sink, 'TransactionID', features, on_batch=sample,
+                    )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        # Resident memory after the first tenth of the input against the whole: flat if bounded
+        tenth = [memory_used for scored, memory_used in samples if scored <= rows / 10] or [samples[0][1]]
+        result = {
+            'input_bytes': size,
+            'input_rows': rows,
+            'memory_bytes': memory,
+            'block_size': block_size,
+            'workers': options['workers'],
+            'flagged': summary.flagged,
+            'seconds': round(measured['seconds'], 1),
+            'rows_per_second': round(rows / measured['seconds']) if measured['seconds'] else None,
+            'baseline_rss_mb': round(measured['baseline_bytes'] / MB, 1),
+            'peak_growth_mb': round(measured['growth_bytes'] / MB, 1),
+            'max_growth_mb': round(max_growth / MB, 1),
+            'rss_after_first_tenth_mb': round(max(tenth) / MB, 1),
+            'rss_at_end_mb': round(samples[-1][1] / MB, 1) if samples else None,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.stdout.write(
+                f"Scored {rows} transactions ({size / MB:.0f} MB, {size / memory:.1f}x the memory budget) in "
+                f"{result['seconds']} s ({result['rows_per_second']}/s), flagged {summary.flagged}.\n"
+                f"Resident memory grew by at most {result['peak_growth_mb']} MB; "
+                f"{result['rss_after_first_tenth_mb']} MB after the first tenth of the input, "
+                f"{result['rss_at_end_mb']} MB at the end."
+            )
+        if measured['growth_bytes'] > max_growth:
+            raise CommandError(
+                f"Resident memory grew by {measured['growth_bytes'] // MB} MB, more than {max_growth // MB} MB."
+            )
+        if samples and samples[-1][1] - max(tenth) > max_drift:
+            raise CommandError(
+                f"Resident memory grew from {result['rss_after_first_tenth_mb']} MB after the first tenth of the "
+                f"input to {result['rss_at_end_mb']} MB at the end, more than {max_drift // MB} MB: "
+                f"it grows with the input."
+            )
+
+    @staticmethod
+    def physical_memory_mb():
+        try:
+            return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // MB
+        except (ValueError, OSError):
+            raise CommandError("Cannot tell the physical memory size; pass --memory-mb.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from audit_management.changes import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes change log entries superseded by a newer entry for the same row, and deletion "
+        "entries older than AUDIT_CHANGE_LOG_RETENTION. Run it periodically (e.g. daily from cron)."
+    )
+
+    def handle(self, *args, **options):
+        deleted = compact()
+        self.stdout.write(f"Deleted {deleted} change log entries.")
@@ -0,0 +1,83 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from audit_management.models import StoredBlob
+from audit_management.storage import BLOB_PREFIX, digest_from_name, get_document_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Garbage-collects the content-addressed document storage: recounts blob references "
+        "from the database, removes blobs nothing refers to, and removes blob files without "
+        "a StoredBlob row (left by failed uploads)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help="Leave files younger than this alone; they may belong to uploads in progress.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would change.")
+
+    def handle(self, *args, **options):
+        storage = get_document_storage()
+        dry_run = options['dry_run']
+        cutoff = time.time() - options['grace_minutes'] * 60
+
+        # 1. Reference counts from the rows that actually refer to each blob
+        actual = Counter()
+        for model, field in storage.referencing_fields():
+            names = model._base_manager.filter(**{f'{field.attname}__startswith': 'documents/'})
+            for name in names.values_list(field.attname, flat=True).iterator():
+                digest = digest_from_name(name)
+                if digest:
+                    actual[digest] += 1
+
+        fixed = 0
+        for digest, refcount in StoredBlob.objects.values_list('digest', 'refcount').iterator():
+            if refcount == actual.get(digest, 0):
+                continue
+            fixed += 1
+            if not dry_run:
+                with transaction.atomic():
+                    blob = StoredBlob.objects.select_for_update().filter(digest=digest).first()
+                    if blob is not None:
+                        # Recount under the lock; uploads may have changed it meanwhile.
+                        blob.refcount = sum(
+                            model._base_manager.filter(**{f'{field.attname}__startswith': f'documents/{digest}/'}).count()
+                            for model, field in storage.referencing_fields()
+                        )
+                        blob.save(update_fields=['refcount'])
+
+        # 2. Blobs nothing refers to
+        purged = 0
+        for digest in StoredBlob.objects.filter(refcount__lte=0).values_list('digest', flat=True).iterator():
+            if dry_run or storage.purge(digest):
+                purged += 1
+
+        # 3. Files in the blob directory without a row
+        orphans = 0
+        root = storage.path(BLOB_PREFIX)
+        known = set(StoredBlob.objects.values_list('digest', flat=True).iterator())
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                digest = file_name.split('.', 1)[0]
+                if digest in known and '.' not in file_name:
+                    continue
+                try:
+                    if os.path.getmtime(path) > cutoff:
+                        continue
+                    if not dry_run:
+                        os.remove(path)
+                except FileNotFoundError:
+                    continue
+                orphans += 1
+
+        prefix = "Would fix" if dry_run else "Fixed"
+        self.stdout.write(
+            f"{prefix} {fixed} reference count(s); "
+            f"{'would remove' if dry_run else 'removed'} {purged} unreferenced blob(s) and {orphans} orphaned file(s)."
+        )
@@ -0,0 +1,94 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audit_management import synthetic
+
+
+def security(value):
+    """
+    ID:MEAN_PRICE:STD_PRICE[:WEIGHT], e.g. SEC_A:100:5:2.
+    """
+    parts = value.split(':')
+    try:
+        if len(parts) not in (3, 4) or not parts[0]:
+            raise ValueError
+        return synthetic.Security(parts[0], *map(float, parts[1:]))
+    except ValueError:
+        raise CommandError(f"Invalid security {value!r}; expected ID:MEAN_PRICE:STD_PRICE[:WEIGHT].")
+
+
+def anomaly_type(value):
+    """
+    TYPE[:WEIGHT], e.g. price_dev:2.
+    """
+    name, _, weight = value.partition(':')
+    if name not in synthetic.ANOMALY_TYPES:
+        raise CommandError(f"Unknown anomaly type {name!r}; choose from {', '.join(synthetic.ANOMALY_TYPES)}.")
+    try:
+        return name, float(weight or 1)
+    except ValueError:
+        raise CommandError(f"Invalid weight in {value!r}.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes synthetic securities transactions to a CSV or Parquet file, with the columns of the "
+        "prototype notebook and a share of injected anomalies labelled in IsAnomaly_GroundTruth. "
+        "Rows are generated a million at a time with NumPy; the same seed gives the same file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write; Parquet if its name ends in .parquet, otherwise CSV.")
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--format', choices=synthetic.FORMATS, help="Overrides the format given by the name.")
+        parser.add_argument('--securities', nargs='+', metavar='ID:MEAN:STD[:WEIGHT]',
+                            help="Securities traded, their price distribution and share of the transactions "
+                                 "(default: the notebook's SEC_A, SEC_B and SEC_C in equal shares).")
+        parser.add_argument('--anomaly-rate', type=float, default=0.03, help="Share of anomalous transactions.")
+        parser.add_argument('--anomaly-types', nargs='+', metavar='TYPE[:WEIGHT]',
+                            help=f"Anomalies to inject and their shares, from {', '.join(synthetic.ANOMALY_TYPES)} "
+                                 "(default: all, equally).")
+        parser.add_argument('--no-labels', action='store_true', help="Leave out the IsAnomaly_GroundTruth column.")
+        parser.add_argument('--anomaly-type-column', action='store_true',
+                            help="Add an AnomalyType column naming the type of each injected anomaly.")
+        parser.add_argument('--start', type=datetime.datetime.fromisoformat, default=synthetic.DEFAULT_START,
+                            help="First trading day and opening time (default: 2023-01-01T09:00).")
+        parser.add_argument('--trading-days', type=int, default=20)
+        parser.add_argument('--clients', type=int, default=100)
+        parser.add_argument('--chunk-rows', type=int, default=synthetic.DEFAULT_CHUNK_ROWS,
+                            help="Rows generated at a time; the output depends on it as well as on the seed.")
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['chunk_rows'] < 1 or options['trading_days'] < 1 or options['clients'] < 1:
+            raise CommandError("--rows, --chunk-rows, --trading-days and --clients must be positive.")
+        output = options['output']
+        format = options['format'] or ('parquet' if output.endswith(('.parquet', '.pq')) else 'csv')
+        securities = [security(value) for value in options['securities'] or []] or synthetic.DEFAULT_SECURITIES
+        anomaly_types = dict(anomaly_type(value) for value in options['anomaly_types'] or []) or None
+
+        started = time.perf_counter()
+        try:
+            batches = synthetic.generate_batches(
+                options['rows'],
+                seed=options['seed'],
+                securities=securities,
+                anomaly_rate=options['anomaly_rate'],
+                anomaly_types=anomaly_types,
+                labels=not options['no_labels'],
+                anomaly_type_column=options['anomaly_type_column'],
+                start=options['start'],
+                trading_days=options['trading_days'],
+                clients=options['clients'],
+                chunk_rows=options['chunk_rows'],
+            )
+            rows = synthetic.write_transactions(output, batches, format)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"Wrote {rows} transactions to {output} ({format}) in {seconds:.1f} s "
+            f"({rows / seconds if seconds else 0:.0f}/s)."
+        )
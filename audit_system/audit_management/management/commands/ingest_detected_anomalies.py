@@ -0,0 +1,37 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from audit_management import anomalies
+from audit_management.models import AnomalyDetectionRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores the flagged transactions of completed detection runs as detected anomalies, resuming "
+        "ingestions that were interrupted. run_anomaly_detection does this for the runs it executes; "
+        "run this after a crash or to ingest again (already stored transactions are skipped)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', nargs='+', default=[],
+                            help="Ids of the runs to ingest, even if already ingested (default: every pending run).")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Anomalies stored per transaction (default: AUDIT_ANOMALY_INGEST_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        if not options['run']:
+            count = anomalies.run_pending_ingestions(options['batch_size'])
+            self.stdout.write(f"Ingested the anomalies of {count} detection run(s).")
+            return
+        for pk in options['run']:
+            try:
+                run = AnomalyDetectionRun.objects.get(pk=pk)
+            except (AnomalyDetectionRun.DoesNotExist, ValidationError) as exc:
+                raise CommandError(f"Detection run {pk} not found.") from exc
+            # From the start again: rows stored already are skipped by the unique constraint
+            AnomalyDetectionRun.objects.filter(pk=run.pk).update(anomalies_ingested=0, anomalies_ingested_at=None)
+            try:
+                processed = anomalies.ingest_run(run, options['batch_size'])
+            except anomalies.AnomalyIngestionError as exc:
+                raise CommandError(f"Detection run {pk}: {exc}") from exc
+            self.stdout.write(f"Detection run {pk}: {processed} flagged transaction(s) ingested.")
@@ -0,0 +1,31 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from audit_management import datasets
+from audit_management.models import TransactionDataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts the transaction datasets waiting for ingestion (status New) into columnar Arrow "
+        "files, one by one. Run it periodically (e.g. every minute from cron), or with --dataset "
+        "to ingest given datasets again whatever their status."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', nargs='+', default=[], help="Ids of the datasets to ingest.")
+
+    def handle(self, *args, **options):
+        if not options['dataset']:
+            count = datasets.run_pending_ingestions()
+            self.stdout.write(f"Ingested {count} dataset(s).")
+            return
+
+        for pk in options['dataset']:
+            try:
+                dataset = TransactionDataset.objects.select_related('source_document').get(pk=pk)
+            except (TransactionDataset.DoesNotExist, ValidationError) as exc:
+                raise CommandError(f"Dataset {pk} not found.") from exc
+            dataset = datasets.ingest_dataset(dataset)
+            detail = f"{dataset.record_count} rows" if dataset.status == 'Uploaded' else dataset.error_message
+            self.stdout.write(f"{dataset.pk}: {dataset.status} ({detail})")
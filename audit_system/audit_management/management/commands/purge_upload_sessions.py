@@ -0,0 +1,53 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from audit_management import uploads
+from audit_management.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes upload sessions past their expiry together with their part files, "
+        "and part files left behind without a session. Run it periodically (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        expired = UploadSession.objects.filter(expires_at__lte=timezone.now())
+
+        removed_sessions = 0
+        for session in expired.iterator():
+            if not dry_run:
+                path = uploads.part_path(session)  # delete() clears the pk
+                session.delete()
+                uploads.remove_file(path)
+            removed_sessions += 1
+
+        # Part files whose session row is gone (e.g. a crash between the two deletes)
+        removed_files = 0
+        directory = uploads.get_upload_dir()
+        if directory.is_dir():
+            cutoff = time.time() - uploads.get_session_ttl().total_seconds()
+            names = {entry.name: entry for entry in os.scandir(directory) if entry.name.endswith('.part')}
+            known = {
+                f'{pk}.part' for pk in
+                UploadSession.objects.filter(status='Active').values_list('pk', flat=True).iterator()
+            }
+            for name, entry in names.items():
+                if name in known or entry.stat().st_mtime > cutoff:
+                    continue
+                if not dry_run:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        continue
+                removed_files += 1
+
+        prefix = "Would remove" if dry_run else "Removed"
+        self.stdout.write(f"{prefix} {removed_sessions} expired upload session(s) and {removed_files} orphaned part file(s).")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from audit_management.counters import COUNTED_MODELS, anomaly_scope, recount, recount_anomalies, scope_for
+from audit_management.models import AnomalyDetectionRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the incrementally maintained status counters with the tables they count. "
+        "Reports drift and, with --fix, corrects it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Overwrite drifted counters with the true counts.")
+
+    def handle(self, *args, **options):
+        drifted = False
+        for model in COUNTED_MODELS:
+            drift = recount(model, fix=options['fix'])
+            for status, (stored, actual) in sorted(drift.items()):
+                drifted = True
+                self.stdout.write(f"{scope_for(model)} {status!r}: counter {stored}, table {actual}")
+        # Detected anomalies are counted per detection run
+        for run_id in list(AnomalyDetectionRun.objects.values_list('pk', flat=True)):
+            drift = recount_anomalies(run_id, fix=options['fix'])
+            for status, (stored, actual) in sorted(drift.items()):
+                drifted = True
+                self.stdout.write(f"{anomaly_scope(run_id)} {status!r}: counter {stored}, table {actual}")
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Status counters match the tables."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS("Drifted counters were corrected."))
+        else:
+            raise CommandError("Status counters have drifted; run again with --fix to correct them.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from audit_management import detection
+
+
+class Command(BaseCommand):
+    help = (
+        "Executes the queued anomaly detection runs (POST /api/audit/detection-runs/) one by one, "
+        "each scored in parallel worker processes. Run it periodically (e.g. every minute from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Scoring processes per run (default: AUDIT_DETECTION_WORKERS).")
+
+    def handle(self, *args, **options):
+        count = detection.run_pending_detections(options['workers'])
+        self.stdout.write(f"Executed {count} detection run(s).")
@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from audit_management import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued report jobs (POST /api/audit/reports/jobs/). Start one or more of these "
+        "next to the web server; they coordinate through the database. Also requeues jobs of "
+        "dead workers and deletes expired reports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help="Jobs rendered at the same time.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds between queue checks when idle.")
+        parser.add_argument('--once', action='store_true',
+                            help="Run the queued jobs one by one, then exit (e.g. from cron).")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            requeued = jobs.requeue_stale_jobs()
+            purged = jobs.purge_expired_jobs()
+            count = jobs.run_pending_jobs()
+            self.stdout.write(f"Ran {count} job(s), requeued or failed {requeued} stale job(s), purged {purged} expired job(s).")
+            return
+
+        worker = jobs.ReportWorker(threads=options['threads'], poll_interval=options['poll_interval'])
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping after the running jobs finish...")
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(f"Report worker {worker.worker_id} started with {options['threads']} thread(s).")
+        worker.run()
@@ -0,0 +1,76 @@
+import pickle
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from audit_management import datasets, detection, scoring
+from audit_management.models import AnomalyDetectionRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Scores a transaction file of any size with an already fitted detector, reading it block "
+        "by block and writing only the flagged transactions to OUTPUT (Arrow, or CSV if its name "
+        "ends in .csv). Memory use depends on --block-size, not on the size of the file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="CSV file, or Arrow file (.arrow) as written by ingestion.")
+        parser.add_argument('output', help="Results file.")
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--run', help="Id of a detection run whose detector (and parameters) to use.")
+        source.add_argument('--detector', help="A fitted detector file, from the anomaly_models storage directory.")
+        parser.add_argument('--id-column', help="Column identifying transactions (default: the run's).")
+        parser.add_argument('--threshold', type=float, default=0.0,
+                            help="Flag transactions scoring above this (0 is the detector's own cut-off).")
+        parser.add_argument('--block-size', type=int, default=None,
+                            help="Bytes of CSV read at a time (default: AUDIT_DATASET_BLOCK_SIZE).")
+        parser.add_argument('--workers', type=int, default=1, help="Scoring processes.")
+
+    def handle(self, *args, **options):
+        id_column = options['id_column']
+        if options['run']:
+            try:
+                run = AnomalyDetectionRun.objects.select_related('dataset').get(pk=options['run'])
+            except (AnomalyDetectionRun.DoesNotExist, ValidationError) as exc:
+                raise CommandError(f"Detection run {options['run']} not found.") from exc
+            try:
+                parameters = detection.resolve_parameters(run.dataset, run.sensitivity_level, run.parameters_used)
+                detector, _ = detection.get_detector(run.dataset, parameters)
+            except (detection.DetectionError, datasets.DatasetError) as exc:
+                raise CommandError(str(exc)) from exc
+            if id_column is None:
+                id_column = parameters['id_column']
+        else:
+            # Written by this application only
+            with open(options['detector'], 'rb') as file:
+                detector = pickle.load(file)
+
+        features = list(detector.features)
+        if options['input'].endswith('.arrow'):
+            reader = scoring.open_batches(options['input'])
+            batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+        else:
+            columns = list(dict.fromkeys(([id_column] if id_column else []) + features))
+            batches = scoring.iter_csv_batches(
+                options['input'], columns, options['block_size'] or settings.AUDIT_DATASET_BLOCK_SIZE, features,
+            )
+
+        sink_class = scoring.CSVFileSink if options['output'].endswith('.csv') else scoring.ArrowFileSink
+        started = time.perf_counter()
+        try:
+            with sink_class(options['output'], scoring.result_schema(features)) as sink:
+                summary = scoring.write_flagged(
+                    scoring.score_stream(detector, batches, options['workers'], options['threshold']),
+                    sink, id_column, features,
+                )
+        except (OSError, ValueError) as exc:
+            # Arrow's errors (a missing column, an unreadable value) are ValueErrors
+            raise CommandError(str(exc)) from exc
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"Scored {summary.scored} of {summary.rows} transactions in {seconds:.1f} s "
+            f"({summary.rows / seconds if seconds else 0:.0f}/s), flagged {summary.flagged}."
+        )
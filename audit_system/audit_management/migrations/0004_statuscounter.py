@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:25
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_status_counters(apps, schema_editor):
+    StatusCounter = apps.get_model('audit_management', 'StatusCounter')
+    db_alias = schema_editor.connection.alias
+    for model_name in ('auditproject', 'audittask'):
+        model = apps.get_model('audit_management', model_name)
+        rows = model.objects.using(db_alias).order_by().values('status').annotate(count=Count('pk'))
+        StatusCounter.objects.using(db_alias).bulk_create([
+            StatusCounter(scope=f'audit_management.{model_name}', status=row['status'], count=row['count'])
+            for row in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0003_projectdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=50)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Status Counter',
+                'verbose_name_plural': 'Status Counters',
+                'constraints': [models.UniqueConstraint(fields=('scope', 'status'), name='statuscounter_scope_status_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_status_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0004_statuscounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditproject',
+            index=models.Index(fields=['-created_at', '-id'], name='auditproject_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditproject',
+            index=models.Index(fields=['status'], name='auditproject_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittask',
+            index=models.Index(fields=['project', 'created_at', 'id'], name='audittask_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittask',
+            index=models.Index(fields=['status'], name='audittask_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittask',
+            index=models.Index(condition=models.Q(('status__in', ('Completed',)), _negated=True), fields=['due_date'], name='audittask_open_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectdocument',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='projectdoc_uploaded_idx'),
+        ),
+    ]
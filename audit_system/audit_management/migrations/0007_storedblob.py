@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:41
+
+import audit_management.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0006_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='projectdocument',
+            name='file',
+            field=models.FileField(db_index=True, help_text='The actual uploaded file', max_length=255, storage=audit_management.storage.get_document_storage, upload_to='project_documents/%Y/%m/%d/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('digest', models.CharField(help_text='SHA-256 of the content', max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Stored Blob',
+                'verbose_name_plural': 'Stored Blobs',
+                'indexes': [models.Index(condition=models.Q(('refcount__lte', 0)), fields=['created_at'], name='storedblob_unreferenced_idx')],
+            },
+        ),
+    ]
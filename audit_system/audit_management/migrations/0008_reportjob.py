@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:52
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0007_storedblob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(help_text='Report type, a key of jobs.REPORT_KINDS', max_length=50)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('dedupe_key', models.CharField(help_text='Hash of kind and params', max_length=64)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Pending', max_length=20)),
+                ('file', models.FileField(blank=True, max_length=255, upload_to='reports/%Y/%m/%d/')),
+                ('size', models.BigIntegerField(default=0, help_text='Bytes rendered so far')),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, help_text='Worker holding the job', max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='The file is deleted after this time', null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Report Job',
+                'verbose_name_plural': 'Report Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'Pending')), fields=['created_at'], name='reportjob_pending_idx'), models.Index(condition=models.Q(('status', 'Running')), fields=['lease_expires_at'], name='reportjob_running_idx'), models.Index(fields=['expires_at'], name='reportjob_expiry_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ('Pending', 'Running'))), fields=('dedupe_key',), name='reportjob_active_dedupe_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Full-text search indexes for PostgreSQL, see audit_management/search.py: a weighted
+# tsvector column per table, kept current by a trigger, with a GIN index. Written by hand
+# since the column is not a model field. SQLite's FTS5 tables are installed after each
+# migrate instead (search.install_sqlite_search); other databases are left alone.
+
+from django.db import migrations
+
+
+SEARCH_CONFIG = 'english'
+
+# Copy of search.SEARCH_FIELDS at the time of this migration
+SEARCH_FIELDS = {
+    'audit_management_auditproject': (('name', 'A'), ('objectives', 'B'), ('description', 'C'), ('scope', 'C')),
+    'audit_management_audittask': (('name', 'A'), ('description', 'B')),
+    'audit_management_projectdocument': (('name', 'A'), ('description', 'B')),
+}
+
+
+def _index_name(table):
+    return f"{table.removeprefix('audit_management_')}_search_idx"
+
+
+def _postgresql_vector(fields, row=''):
+    return ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({row}{column}, '')), '{weight}')"
+        for column, weight in fields
+    )
+
+
+def create_postgresql(schema_editor, table, fields):
+    columns = ', '.join(column for column, _ in fields)
+    schema_editor.execute(f'ALTER TABLE {table} ADD COLUMN search_vector tsvector')
+    schema_editor.execute(f"""
+        CREATE FUNCTION {table}_search_vector() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := {_postgresql_vector(fields, 'NEW.')};
+            RETURN NEW;
+        END
+        $$
+    """)
+    # Only writes that touch an indexed column pay for re-parsing the text
+    schema_editor.execute(
+        f'CREATE TRIGGER {table}_search_vector_trg BEFORE INSERT OR UPDATE OF {columns} ON {table} '
+        f'FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()'
+    )
+    schema_editor.execute(f'UPDATE {table} SET search_vector = {_postgresql_vector(fields)}')
+    schema_editor.execute(f'CREATE INDEX {_index_name(table)} ON {table} USING gin (search_vector)')
+
+
+def drop_postgresql(schema_editor, table, fields):
+    schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trg ON {table}')
+    schema_editor.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector()')
+    schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, fields in SEARCH_FIELDS.items():
+        create_postgresql(schema_editor, table, fields)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, fields in SEARCH_FIELDS.items():
+        drop_postgresql(schema_editor, table, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0008_reportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:23
+
+from itertools import islice
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def log_existing_rows(apps, schema_editor):
+    # The feed starts with every row that already exists, so a first sync is complete
+    ChangeLogEntry = apps.get_model('audit_management', 'ChangeLogEntry')
+    db_alias = schema_editor.connection.alias
+    now = timezone.now()
+    for model_name in ('auditproject', 'audittask', 'projectdocument'):
+        model = apps.get_model('audit_management', model_name)
+        pks = model.objects.using(db_alias).order_by('pk').values_list('pk', flat=True).iterator(chunk_size=5000)
+        while batch := list(islice(pks, 5000)):
+            ChangeLogEntry.objects.using(db_alias).bulk_create([
+                ChangeLogEntry(table=f'audit_management.{model_name}', object_id=pk, action='upsert', changed_at=now)
+                for pk in batch
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0010_tableversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('table', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('changed_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Change Log Entry',
+                'verbose_name_plural': 'Change Log Entries',
+                'indexes': [models.Index(fields=['table', 'object_id', '-id'], name='changelog_object_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:34
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0011_changelogentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionDataset',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(help_text="User-defined name, e.g. '2023 sales ledger'", max_length=255)),
+                ('source_description', models.TextField(blank=True, help_text="Where the data comes from, e.g. 'SAP export'")),
+                ('data_location_uri', models.CharField(blank=True, help_text='Storage name of the ingested Arrow file', max_length=255)),
+                ('data_schema_info', models.JSONField(blank=True, help_text='Columns and types found by ingestion', null=True)),
+                ('record_count', models.BigIntegerField(blank=True, null=True)),
+                ('data_time_range_start', models.DateTimeField(blank=True, null=True)),
+                ('data_time_range_end', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('New', 'New'), ('Uploading', 'Uploading'), ('Uploaded', 'Uploaded'), ('Processing', 'Processing'), ('Analyzed', 'Analyzed'), ('Error', 'Error')], default='New', max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_datasets', to='audit_management.auditproject')),
+                ('source_document', models.ForeignKey(blank=True, help_text='The uploaded CSV file', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='audit_management.projectdocument')),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transaction_datasets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Transaction Dataset',
+                'verbose_name_plural': 'Transaction Datasets',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'New')), fields=['created_at'], name='dataset_pending_idx')],
+            },
+        ),
+    ]
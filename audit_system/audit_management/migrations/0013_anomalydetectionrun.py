@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:39
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0012_transactiondataset'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyDetectionRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('ai_detection_run_id', models.CharField(blank=True, help_text='Id of the run in an external detection service, if one ran it', max_length=255, null=True, unique=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('sensitivity_level', models.CharField(blank=True, choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], max_length=20, null=True)),
+                ('parameters_used', models.JSONField(blank=True, null=True)),
+                ('summary_info', models.JSONField(blank=True, null=True)),
+                ('ai_results_reference_id', models.CharField(blank=True, help_text='Storage name of the results file', max_length=255, null=True)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('processing_started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detection_runs', to='audit_management.transactiondataset')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detection_runs', to='audit_management.auditproject')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='detection_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Anomaly Detection Run',
+                'verbose_name_plural': 'Anomaly Detection Runs',
+                'ordering': ['-requested_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'PENDING')), fields=['requested_at'], name='detectionrun_pending_idx')],
+            },
+        ),
+    ]
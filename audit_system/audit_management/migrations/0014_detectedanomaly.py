@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:54
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0013_anomalydetectionrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalydetectionrun',
+            name='anomalies_ingested',
+            field=models.BigIntegerField(default=0, help_text='Rows of the results file stored as DetectedAnomaly so far'),
+        ),
+        migrations.AddField(
+            model_name='anomalydetectionrun',
+            name='anomalies_ingested_at',
+            field=models.DateTimeField(blank=True, help_text='When the last row of the results file was stored', null=True),
+        ),
+        migrations.CreateModel(
+            name='DetectedAnomaly',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('transaction_identifier_in_source', models.CharField(help_text='Id of the transaction in the dataset', max_length=512)),
+                ('anomaly_score', models.FloatField(blank=True, help_text='Higher is more anomalous', null=True)),
+                ('ai_suggested_reason_codes', models.JSONField(blank=True, null=True)),
+                ('ai_explanation', models.TextField(blank=True, null=True)),
+                ('raw_transaction_details_preview', models.JSONField(blank=True, help_text='Row number and feature values of the transaction', null=True)),
+                ('status', models.CharField(choices=[('New', 'New'), ('UnderReview', 'Under Review'), ('FalsePositive', 'False Positive'), ('ActionRequired', 'Action Required'), ('Escalated', 'Escalated'), ('Closed', 'Closed')], default='New', max_length=20)),
+                ('auditor_notes', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assigned_to_auditor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assigned_anomalies', to=settings.AUTH_USER_MODEL)),
+                ('detection_run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='audit_management.anomalydetectionrun')),
+            ],
+            options={
+                'verbose_name': 'Detected Anomaly',
+                'verbose_name_plural': 'Detected Anomalies',
+                'ordering': ['-anomaly_score'],
+                'constraints': [models.UniqueConstraint(fields=('detection_run', 'transaction_identifier_in_source'), name='anomaly_run_transaction_uniq')],
+            },
+        ),
+    ]
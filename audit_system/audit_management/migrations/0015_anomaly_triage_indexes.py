@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0014_detectedanomaly'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detectedanomaly',
+            index=models.Index(fields=['detection_run', '-anomaly_score', '-id'], name='anomaly_run_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectedanomaly',
+            index=models.Index(fields=['detection_run', 'status', '-anomaly_score', '-id'], name='anomaly_run_status_score_idx'),
+        ),
+    ]
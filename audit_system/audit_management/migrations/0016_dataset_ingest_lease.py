@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0015_anomaly_triage_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactiondataset',
+            name='ingest_attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Claims since the dataset was last queued'),
+        ),
+        migrations.AddField(
+            model_name='transactiondataset',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, help_text="While Uploading: when the ingesting worker's claim runs out unless renewed", null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transactiondataset',
+            index=models.Index(condition=models.Q(('status', 'Uploading')), fields=['lease_expires_at'], name='dataset_uploading_idx'),
+        ),
+    ]
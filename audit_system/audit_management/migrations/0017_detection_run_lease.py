@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0016_dataset_ingest_lease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalydetectionrun',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Times the run was claimed by a worker'),
+        ),
+        migrations.AddField(
+            model_name='anomalydetectionrun',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, help_text="While PROCESSING: when the executing worker's claim runs out unless renewed", null=True),
+        ),
+        migrations.AddIndex(
+            model_name='anomalydetectionrun',
+            index=models.Index(condition=models.Q(('status', 'PROCESSING')), fields=['lease_expires_at'], name='detectionrun_processing_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit_management', '0017_detection_run_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, help_text='While a chunk is being received: when its claim on the part file runs out unless renewed', null=True),
+        ),
+    ]
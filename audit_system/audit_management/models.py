@@ -1,7 +1,216 @@
-from django.db import models
+import uuid
+from contextvars import ContextVar
+
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import User
 
-class AuditProject(models.Model):
+from .storage import get_document_storage
+from .signals import batched_changes, post_bulk_create, post_bulk_update, post_queryset_update
+
+
+_in_bulk_update = ContextVar('audit_in_bulk_update', default=False)
+
+# Batch size for the pk lookups TrackedQuerySet runs before bulk updates
+TRACKED_LOOKUP_BATCH_SIZE = 2000
+
+
+class TrackedQuerySet(models.QuerySet):
+    """
+    QuerySet whose bulk write paths announce their changes (see signals.py), so that
+    receivers see every create, update and delete, not only Model.save()/delete().
+    The old values of the model's `tracked_fields` are read (and locked where the
+    database supports it) before updating, in the same transaction.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        exact = not (kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'))
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            post_bulk_create.send(sender=self.model, objs=objs, exact=exact, using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            previous = {}
+            pks = [obj.pk for obj in objs] if _touches_tracked(self.model, fields) else []
+            for start in range(0, len(pks), TRACKED_LOOKUP_BATCH_SIZE):
+                batch = self.model._base_manager.using(self.db).filter(pk__in=pks[start:start + TRACKED_LOOKUP_BATCH_SIZE])
+                previous.update(_tracked_values(batch))
+            # Django implements bulk_update() with QuerySet.update(); announce it once, as a bulk update.
+            token = _in_bulk_update.set(True)
+            try:
+                rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            finally:
+                _in_bulk_update.reset(token)
+            post_bulk_update.send(sender=self.model, objs=objs, fields=fields, previous=previous, using=self.db)
+        return rows
+
+    def update(self, **kwargs):
+        if _in_bulk_update.get():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            previous = _tracked_values(self)
+            rows = super().update(**kwargs)
+            post_queryset_update.send(sender=self.model, previous=previous, values=kwargs, using=self.db)
+        return rows
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False), batched_changes():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+def _touches_tracked(model, fields):
+    tracked = {name.removesuffix('_id') for name in model.tracked_fields}
+    return any(name.removesuffix('_id') in tracked for name in fields)
+
+
+def _tracked_values(queryset):
+    """
+    {pk: {field: value}} for the model's tracked fields, locking the rows when possible.
+    """
+    fields = queryset.model.tracked_fields
+    features = connections[queryset.db].features
+    queryset = queryset.order_by()
+    if features.has_select_for_update:
+        queryset = queryset.select_for_update(**({'of': ('self',)} if features.has_select_for_update_of else {}))
+    return {pk: dict(zip(fields, values)) for pk, *values in queryset.values_list('pk', *fields)}
+
+
+class TrackedModel(models.Model):
+    """
+    Base for models whose changes are tracked (dashboard counters and friends).
+
+    save() and delete() run their signal receivers inside the write's transaction.
+    Before an update, `_tracked_previous` holds the stored values of `tracked_fields`
+    (attribute names) so post_save receivers can tell what changed.
+    """
+    tracked_fields = ()
+
+    objects = TrackedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_tracked_snapshot()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._take_tracked_snapshot()
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic(using=using, savepoint=False):
+            self._tracked_previous = self._get_tracked_previous(using, update_fields)
+            super().save(*args, **kwargs)
+        self._take_tracked_snapshot()
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using, savepoint=False), batched_changes():
+            return super().delete(*args, **kwargs)
+
+    def _take_tracked_snapshot(self):
+        self._tracked_snapshot = {
+            name: self.__dict__[name] for name in self.tracked_fields if name in self.__dict__
+        }
+
+    def _get_tracked_previous(self, using, update_fields=None):
+        """
+        Stored values of the tracked fields this save may change, or None for a new row.
+        """
+        if self.pk is None:
+            return None
+        fields = [
+            name for name in self.tracked_fields
+            if update_fields is None or name in update_fields or name.removesuffix('_id') in update_fields
+        ]
+        snapshot = getattr(self, '_tracked_snapshot', {})
+        if all(name in snapshot for name in fields):
+            return {name: snapshot[name] for name in fields}
+        # Instance built by hand or with deferred fields: read what is stored.
+        stored = _tracked_values(self.__class__._base_manager.using(using).filter(pk=self.pk))
+        if not stored:
+            return None
+        return {name: stored[self.pk][name] for name in fields}
+
+
+class StatusCounter(models.Model):
+    """
+    Number of rows per status, maintained incrementally by audit_management.counters.
+    `scope` identifies the counted set (for now, one per model: "audit_management.audittask").
+    """
+    scope = models.CharField(max_length=100)
+    status = models.CharField(max_length=50)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.scope} {self.status}: {self.count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'status'], name='statuscounter_scope_status_uniq'),
+        ]
+        verbose_name = "Status Counter"
+        verbose_name_plural = "Status Counters"
+
+
+class TableVersion(models.Model):
+    """
+    Change counter of a table, bumped by audit_management.versions in the transaction
+    of every create, update and delete. The list/detail endpoints derive their ETags
+    from it. `table` is the model label ("audit_management.audittask").
+    """
+    table = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+    class Meta:
+        verbose_name = "Table Version"
+        verbose_name_plural = "Table Versions"
+
+
+class ChangeLogEntry(models.Model):
+    """
+    One create, update or delete of a synced row, appended by audit_management.changes in
+    the transaction of every write. Ids increase with each entry; the change feed pages
+    through them. `table` is the model label, as in TableVersion.
+    """
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    table = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.action} {self.table} {self.object_id}"
+
+    class Meta:
+        verbose_name = "Change Log Entry"
+        verbose_name_plural = "Change Log Entries"
+        indexes = [
+            # Compaction finds the newest entry of each row
+            models.Index(fields=['table', 'object_id', '-id'], name='changelog_object_idx'),
+        ]
+
+
+class AuditProject(TrackedModel):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
         ('In Progress', 'In Progress'),
@@ -30,6 +239,8 @@ class AuditProject(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    tracked_fields = ('status',)
+
     def __str__(self):
         return self.name
 
@@ -37,9 +248,19 @@ class AuditProject(models.Model):
         ordering = ['-created_at'] # Optional: default ordering
         verbose_name = "Audit Project"
         verbose_name_plural = "Audit Projects"
+        indexes = [
+            # List ordering (-created_at) with the keyset pagination's id tiebreaker
+            models.Index(fields=['-created_at', '-id'], name='auditproject_created_idx'),
+            models.Index(fields=['status'], name='auditproject_status_idx'),
+        ]
 
 
-class AuditTask(models.Model):
+# AuditTask statuses after which a task can no longer be overdue. Module level because
+# the partial index in AuditTask.Meta refers to it.
+FINAL_STATUSES = ('Completed',)
+
+
+class AuditTask(TrackedModel):
     STATUS_CHOICES = [
         ('To Do', 'To Do'),
         ('In Progress', 'In Progress'),
@@ -71,6 +292,11 @@ class AuditTask(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Statuses after which a task can no longer be overdue
+    FINAL_STATUSES = FINAL_STATUSES
+
+    tracked_fields = ('status',)
+
     def __str__(self):
         return f"{self.project.name} - {self.name}"
 
@@ -78,9 +304,21 @@ class AuditTask(models.Model):
         ordering = ['project', 'created_at'] # Optional: default ordering
         verbose_name = "Audit Task"
         verbose_name_plural = "Audit Tasks"
+        indexes = [
+            # Tasks of a project in creation order (list ordering is project__name, created_at, id)
+            models.Index(fields=['project', 'created_at', 'id'], name='audittask_project_created_idx'),
+            models.Index(fields=['status'], name='audittask_status_idx'),
+            # Open tasks by due date, for the dashboard's overdue count. Partial: completed
+            # tasks, the bulk of the table over time, are left out of the index.
+            models.Index(
+                fields=['due_date'],
+                name='audittask_open_due_idx',
+                condition=~models.Q(status__in=FINAL_STATUSES),
+            ),
+        ]
 
 
-class ProjectDocument(models.Model):
+class ProjectDocument(TrackedModel):
     project = models.ForeignKey(
         AuditProject,
         on_delete=models.CASCADE,
@@ -95,7 +333,13 @@ class ProjectDocument(models.Model):
     )
     name = models.CharField(max_length=255, help_text="User-defined name for the document")
     description = models.TextField(blank=True, null=True)
-    file = models.FileField(upload_to='project_documents/%Y/%m/%d/', help_text="The actual uploaded file")
+    file = models.FileField(
+        upload_to='project_documents/%Y/%m/%d/',
+        storage=get_document_storage, # Content-addressed: identical files are stored once
+        max_length=255,
+        db_index=True, # Blob garbage collection looks documents up by file name prefix
+        help_text="The actual uploaded file"
+    )
     uploaded_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -112,3 +356,385 @@ class ProjectDocument(models.Model):
         ordering = ['-uploaded_at']
         verbose_name = "Project Document"
         verbose_name_plural = "Project Documents"
+        indexes = [
+            models.Index(fields=['-uploaded_at', '-id'], name='projectdoc_uploaded_idx'),
+        ]
+
+
+class StoredBlob(models.Model):
+    """
+    One distinct file content in the document storage (see storage.py), with the number
+    of FileField values that refer to it. Blobs whose count drops to zero are removed.
+    """
+    digest = models.CharField(max_length=64, primary_key=True, help_text="SHA-256 of the content")
+    size = models.BigIntegerField()
+    refcount = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest} ({self.refcount} references)"
+
+    class Meta:
+        verbose_name = "Stored Blob"
+        verbose_name_plural = "Stored Blobs"
+        indexes = [
+            models.Index(fields=['created_at'], name='storedblob_unreferenced_idx', condition=models.Q(refcount__lte=0)),
+        ]
+
+
+class UploadSession(models.Model):
+    """
+    A resumable, chunked upload that becomes a ProjectDocument once every byte has arrived.
+    Chunks are appended to a part file on disk (see uploads.py); finalizing moves that file
+    into media storage without reading it again.
+    """
+    STATUS_CHOICES = [
+        ('Active', 'Active'),
+        ('Completed', 'Completed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(
+        AuditProject,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    task = models.ForeignKey(
+        AuditTask,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions',
+        null=True,
+        blank=True
+    )
+    name = models.CharField(max_length=255, help_text="Name of the document to create")
+    description = models.TextField(blank=True, null=True)
+    filename = models.CharField(max_length=255, help_text="Original file name")
+    total_size = models.BigIntegerField(help_text="Size of the complete file in bytes")
+    received_bytes = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Active')
+    document = models.ForeignKey(
+        ProjectDocument,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(help_text="Unfinished sessions are purged after this time")
+    lease_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="While a chunk is being received: when its claim on the part file runs out unless renewed"
+    )
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.total_size})"
+
+    @property
+    def is_complete(self):
+        return self.received_bytes >= self.total_size
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='uploadsession_expiry_idx'),
+        ]
+
+
+class ReportJob(models.Model):
+    """
+    A report rendered in the background by `run_report_worker` (see jobs.py).
+    The table is the queue: workers claim Pending jobs with a conditional UPDATE.
+    """
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+    ACTIVE_STATUSES = ('Pending', 'Running')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50, help_text="Report type, a key of jobs.REPORT_KINDS")
+    params = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=64, help_text="Hash of kind and params")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='report_jobs'
+    )
+    file = models.FileField(upload_to='reports/%Y/%m/%d/', max_length=255, blank=True)
+    size = models.BigIntegerField(default=0, help_text="Bytes rendered so far")
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker holding the job")
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="The file is deleted after this time")
+
+    def __str__(self):
+        return f"{self.kind} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status not in self.ACTIVE_STATUSES
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Report Job"
+        verbose_name_plural = "Report Jobs"
+        constraints = [
+            # Identical requests (from anyone: reports are not per user) share one job
+            # while it is queued or running
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status__in=('Pending', 'Running')),
+                name='reportjob_active_dedupe_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='reportjob_pending_idx', condition=models.Q(status='Pending')),
+            models.Index(fields=['lease_expires_at'], name='reportjob_running_idx', condition=models.Q(status='Running')),
+            models.Index(fields=['expires_at'], name='reportjob_expiry_idx'),
+        ]
+
+
+class TransactionDataset(models.Model):
+    """
+    A client's transaction data, uploaded as a CSV document, for anomaly detection.
+    Ingestion (datasets.py) converts the CSV once into a columnar Arrow file, which
+    detection reads memory-mapped instead of parsing the CSV again.
+    """
+    STATUS_CHOICES = [
+        ('New', 'New'),  # Waiting for ingestion
+        ('Uploading', 'Uploading'),  # Being ingested
+        ('Uploaded', 'Uploaded'),  # Ingested, ready for detection
+        ('Processing', 'Processing'),
+        ('Analyzed', 'Analyzed'),
+        ('Error', 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(
+        AuditProject,
+        on_delete=models.CASCADE,
+        related_name='transaction_datasets'
+    )
+    name = models.CharField(max_length=255, help_text="User-defined name, e.g. '2023 sales ledger'")
+    source_description = models.TextField(blank=True, help_text="Where the data comes from, e.g. 'SAP export'")
+    source_document = models.ForeignKey(
+        ProjectDocument,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="The uploaded CSV file"
+    )
+    data_location_uri = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Storage name of the ingested Arrow file"
+    )
+    data_schema_info = models.JSONField(null=True, blank=True, help_text="Columns and types found by ingestion")
+    record_count = models.BigIntegerField(null=True, blank=True)
+    data_time_range_start = models.DateTimeField(null=True, blank=True)
+    data_time_range_end = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='New')
+    error_message = models.TextField(blank=True)
+    ingest_attempts = models.PositiveIntegerField(default=0, help_text="Claims since the dataset was last queued")
+    lease_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="While Uploading: when the ingesting worker's claim runs out unless renewed"
+    )
+    uploaded_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='transaction_datasets'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Transaction Dataset"
+        verbose_name_plural = "Transaction Datasets"
+        indexes = [
+            models.Index(fields=['created_at'], name='dataset_pending_idx', condition=models.Q(status='New')),
+            models.Index(fields=['lease_expires_at'], name='dataset_uploading_idx', condition=models.Q(status='Uploading')),
+        ]
+
+
+class AnomalyDetectionRun(models.Model):
+    """
+    One anomaly detection pass over a TransactionDataset (see detection.py). Runs are
+    queued by the API and executed by `run_anomaly_detection`; the flagged transactions
+    are written to a results file named by ai_results_reference_id, then stored as
+    DetectedAnomaly rows (see anomalies.py).
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    ]
+    SENSITIVITY_CHOICES = [
+        ('low', 'Low'),
+        ('medium', 'Medium'),
+        ('high', 'High'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(
+        AuditProject,
+        on_delete=models.CASCADE,
+        related_name='detection_runs'
+    )
+    dataset = models.ForeignKey(
+        TransactionDataset,
+        on_delete=models.CASCADE,
+        related_name='detection_runs'
+    )
+    ai_detection_run_id = models.CharField(
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Id of the run in an external detection service, if one ran it"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    sensitivity_level = models.CharField(max_length=20, choices=SENSITIVITY_CHOICES, null=True, blank=True)
+    parameters_used = models.JSONField(null=True, blank=True)
+    summary_info = models.JSONField(null=True, blank=True)
+    ai_results_reference_id = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        help_text="Storage name of the results file"
+    )
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='detection_runs'
+    )
+    requested_at = models.DateTimeField(auto_now_add=True)
+    processing_started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+    anomalies_ingested = models.BigIntegerField(
+        default=0,
+        help_text="Rows of the results file stored as DetectedAnomaly so far"
+    )
+    anomalies_ingested_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the last row of the results file was stored"
+    )
+    attempts = models.PositiveIntegerField(default=0, help_text="Times the run was claimed by a worker")
+    lease_expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="While PROCESSING: when the executing worker's claim runs out unless renewed"
+    )
+
+    def __str__(self):
+        return f"{self.dataset_id} ({self.status})"
+
+    class Meta:
+        ordering = ['-requested_at']
+        verbose_name = "Anomaly Detection Run"
+        verbose_name_plural = "Anomaly Detection Runs"
+        indexes = [
+            models.Index(fields=['requested_at'], name='detectionrun_pending_idx', condition=models.Q(status='PENDING')),
+            models.Index(
+                fields=['lease_expires_at'], name='detectionrun_processing_idx', condition=models.Q(status='PROCESSING'),
+            ),
+        ]
+
+
+class DetectedAnomaly(models.Model):
+    """
+    A transaction flagged by a detection run, and the auditors' follow-up of it. Created
+    in bulk from the run's results file by anomalies.py, at most once per transaction
+    and run.
+    """
+    STATUS_CHOICES = [
+        ('New', 'New'),
+        ('UnderReview', 'Under Review'),
+        ('FalsePositive', 'False Positive'),
+        ('ActionRequired', 'Action Required'),
+        ('Escalated', 'Escalated'),
+        ('Closed', 'Closed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    detection_run = models.ForeignKey(
+        AnomalyDetectionRun,
+        on_delete=models.CASCADE,
+        related_name='anomalies'
+    )
+    transaction_identifier_in_source = models.CharField(
+        max_length=512,
+        help_text="Id of the transaction in the dataset"
+    )
+    anomaly_score = models.FloatField(null=True, blank=True, help_text="Higher is more anomalous")
+    ai_suggested_reason_codes = models.JSONField(null=True, blank=True)
+    ai_explanation = models.TextField(null=True, blank=True)
+    raw_transaction_details_preview = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Row number and feature values of the transaction"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='New')
+    auditor_notes = models.TextField(blank=True, null=True)
+    assigned_to_auditor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='assigned_anomalies'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.transaction_identifier_in_source} ({self.status})"
+
+    class Meta:
+        ordering = ['-anomaly_score']
+        verbose_name = "Detected Anomaly"
+        verbose_name_plural = "Detected Anomalies"
+        constraints = [
+            # Ingestion inserts with ON CONFLICT DO NOTHING against it, so it can be
+            # repeated or resumed
+            models.UniqueConstraint(
+                fields=['detection_run', 'transaction_identifier_in_source'],
+                name='anomaly_run_transaction_uniq',
+            ),
+        ]
+        indexes = [
+            # Triage pages through a run's anomalies by score (then id, the keyset
+            # tiebreaker), optionally of one status: the top k are the first k entries
+            models.Index(fields=['detection_run', '-anomaly_score', '-id'], name='anomaly_run_score_idx'),
+            models.Index(fields=['detection_run', 'status', '-anomaly_score', '-id'], name='anomaly_run_status_score_idx'),
+        ]
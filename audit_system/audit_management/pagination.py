@@ -0,0 +1,238 @@
+"""
+Keyset (cursor) pagination for the audit API.
+
+DRF's CursorPagination only keys on the first ordering field and falls back to an
+offset for ties. The paginator below keys on every field of the queryset's ordering
+plus a primary key tiebreaker, so each page is a single index range scan no matter
+how deep the client has paged.
+"""
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+DEFAULT_MAX_PAGE_SIZE = 500
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder truncates datetimes to milliseconds, which would make a cursor
+    compare unequal to the row it was taken from. Keep full precision.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor pagination over the queryset's own ordering.
+
+    Every ordering field must be non-null. A primary key tiebreaker (in the direction of
+    the last ordering field) is appended when the ordering does not already end with one.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    # None means: use REST_FRAMEWORK['PAGE_SIZE'] / settings.AUDIT_MAX_PAGE_SIZE.
+    page_size = None
+    max_page_size = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset, cursor, reverse = self.get_page_queryset(queryset, request)
+        return self.set_page(list(page_queryset), cursor, reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset() for async views, fetching the page with the async ORM.
+        """
+        page_queryset, cursor, reverse = self.get_page_queryset(queryset, request)
+        return self.set_page([obj async for obj in page_queryset], cursor, reverse)
+
+    def get_page_queryset(self, queryset, request):
+        """
+        The (unevaluated) queryset of the requested page plus one row, the decoded
+        cursor and whether we are paging backwards.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        ordering = [_flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self.build_keyset_filter(queryset.model, ordering, cursor['values']))
+        return queryset[:self.page_size + 1], cursor, reverse
+
+    def set_page(self, results, cursor, reverse):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Going forward there is a previous page whenever we came from a cursor;
+        # going backward there is always a next page (the one we came from).
+        self.has_next = has_more if not reverse else True
+        self.has_previous = bool(cursor) if not reverse else has_more
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        page_size = self.page_size or api_settings.PAGE_SIZE or 50
+        max_page_size = self.max_page_size or getattr(settings, 'AUDIT_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+        requested = request.query_params.get(self.page_size_query_param)
+        if requested:
+            try:
+                requested = int(requested)
+            except ValueError:
+                requested = 0
+            if requested > 0:
+                page_size = requested
+        return min(page_size, max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        The queryset's ordering (or the model's default ordering) plus a pk tiebreaker.
+        """
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        ordering = [
+            _normalize_relation(queryset.model, field)
+            for field in ordering if isinstance(field, str) and field != '?'
+        ]
+        if not ordering:
+            return ['pk']
+        if ordering[-1].lstrip('-') not in ('pk', queryset.model._meta.pk.name):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Paged past the end (e.g. the last rows were deleted): go back to the first page.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        values = [_get_ordering_value(instance, field.lstrip('-')) for field in self.ordering]
+        payload = json.dumps({'v': values, 'r': int(reverse)}, cls=CursorJSONEncoder, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values, reverse = payload['v'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return {'values': values, 'reverse': reverse}
+
+    def build_keyset_filter(self, model, ordering, raw_values):
+        """
+        Rows strictly after the cursor in `ordering`:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        The redundant leading `a >= x` lets the planner turn it into an index range scan.
+        """
+        fields = [field.lstrip('-') for field in ordering]
+        try:
+            values = [_to_python(model, field, value) for field, value in zip(fields, raw_values)]
+        except DjangoValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+        keyset = Q()
+        equal = {}
+        for field, value, order in zip(fields, values, ordering):
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            keyset |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+
+        lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{fields[0]}__{lookup}': values[0]}) & keyset
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _normalize_relation(model, field):
+    """
+    Ordering by a foreign key itself (e.g. Meta.ordering = ['project']) would sort by the
+    related model's ordering; key on the stored id instead so the cursor is a plain value.
+    """
+    name = field.lstrip('-')
+    try:
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return field
+    if model_field.many_to_one or model_field.one_to_one:
+        return field.replace(name, model_field.attname)
+    return field
+
+
+def _get_ordering_value(instance, path):
+    value = instance
+    for attr in path.split('__'):
+        value = getattr(value, attr)
+    return value
+
+
+def _to_python(model, path, value):
+    """
+    Converts a JSON cursor value back to the type of the ordering field.
+    Paths that are not model fields (e.g. annotations) are used as decoded.
+    """
+    if path == 'pk':
+        return model._meta.pk.to_python(value)
+    field = None
+    for name in path.split('__'):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        if field.is_relation and field.related_model is not None:
+            model = field.related_model
+    return field.to_python(value) if field is not None else value
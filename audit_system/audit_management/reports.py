@@ -0,0 +1,90 @@
+"""
+Report rendering helpers.
+
+The generators in this module never hold more than one queryset chunk and one
+output block in memory, so they can back a StreamingHttpResponse as well as a
+file written by a background job.
+"""
+import csv
+import io
+
+from django.conf import settings
+
+from .models import AuditProject
+
+
+PROJECT_REPORT_HEADER = [
+    "Project Name",
+    "Project Manager",
+    "Status",
+    "Start Date",
+    "End Date",
+    "Description",
+    "Scope",
+    "Objectives"
+]
+
+# Rows fetched per database round trip. On PostgreSQL QuerySet.iterator() uses a
+# server-side cursor, so this is also the number of rows held by the worker.
+DEFAULT_REPORT_CHUNK_SIZE = 2000
+
+# Encoded CSV is yielded in blocks of roughly this many characters. Yielding row by
+# row would make every row its own socket write (and its own gzip flush).
+DEFAULT_REPORT_BLOCK_SIZE = 64 * 1024
+
+
+def _format_date(value):
+    return value.strftime('%Y-%m-%d') if value else ""
+
+
+def iter_project_report_rows(chunk_size=None, statuses=None):
+    """
+    Yields one CSV row (a list) per audit project, ordered by name, optionally only
+    projects in `statuses`. Only the columns in the report are fetched, and no model
+    instances are built.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'AUDIT_REPORT_CHUNK_SIZE', DEFAULT_REPORT_CHUNK_SIZE)
+
+    projects = AuditProject.objects.order_by('name')
+    if statuses:
+        projects = projects.filter(status__in=statuses)
+    projects = projects.values_list(
+        'name',
+        'project_manager__username',
+        'status',
+        'start_date',
+        'end_date',
+        'description',
+        'scope',
+        'objectives',
+    )
+    for name, manager_username, status, start_date, end_date, description, scope, objectives in projects.iterator(chunk_size=chunk_size):
+        yield [
+            name,
+            manager_username or "",
+            status,
+            _format_date(start_date),
+            _format_date(end_date),
+            description or "",
+            scope or "",
+            objectives or ""
+        ]
+
+
+def iter_project_report_csv(chunk_size=None, block_size=DEFAULT_REPORT_BLOCK_SIZE, statuses=None):
+    """
+    Yields the UTF-8 encoded project CSV report (header included) in blocks.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PROJECT_REPORT_HEADER)
+
+    for row in iter_project_report_rows(chunk_size=chunk_size, statuses=statuses):
+        writer.writerow(row)
+        if buffer.tell() >= block_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue().encode('utf-8')
@@ -0,0 +1,301 @@
+"""
+Isolation-forest scoring of transactions, the engine behind detection.py and the
+score_transactions command.
+
+This module does not use Django, so scoring worker processes only import NumPy,
+pyarrow and scikit-learn. Scoring is out of core: batches are read, scored and
+dropped one at a time, and only the rows scoring above the threshold are written,
+as they are found, to a results sink (an Arrow or CSV file). Peak memory depends on
+the batch size, not on the size of the input:
+
+- score_file() scores an ingested dataset. Each worker memory-maps the Arrow file
+  itself and receives the fitted detector once, when it starts; tasks are batch
+  numbers and results the positions and scores of the flagged rows, so neither the
+  data nor the scores of normal rows cross process boundaries.
+- score_stream() scores any stream of batches, e.g. a CSV file read block by block
+  with iter_csv_batches(), keeping at most two batches per worker in flight.
+
+Scores follow the prototype notebook's model (StandardScaler, then IsolationForest on
+Amount, Quantity and Price) with the sign turned around: anomaly_score is
+-decision_function, higher is more anomalous, and rows scoring above 0 are flagged.
+"""
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+
+DEFAULT_FEATURES = ('Amount', 'Quantity', 'Price')
+
+
+def feature_matrix(batch, features):
+    """
+    (matrix, valid): the `features` columns of a record batch as a float64 array of
+    shape (rows, features), and a mask of the rows without missing values.
+    """
+    matrix = np.empty((batch.num_rows, len(features)), dtype=np.float64)
+    for index, name in enumerate(features):
+        column = batch.column(name)
+        if column.null_count:
+            column = column.cast(pa.float64()).fill_null(np.nan)
+        matrix[:, index] = column.to_numpy(zero_copy_only=False)
+    return matrix, np.isfinite(matrix).all(axis=1)
+
+
+class FittedDetector:
+    """
+    A fitted scaler and isolation forest, and the features they expect.
+    """
+
+    def __init__(self, features, scaler, model):
+        self.features = tuple(features)
+        self.scaler = scaler
+        self.model = model
+
+    def score(self, matrix):
+        """
+        Anomaly scores of the rows of a feature matrix; above 0 means anomalous.
+        """
+        return -self.model.decision_function(self.scaler.transform(matrix))
+
+    def score_batch(self, batch, threshold=0.0):
+        """
+        (positions, scores, scored) of the rows of a record batch scoring above
+        `threshold`, and the number of rows that could be scored.
+        """
+        matrix, valid = feature_matrix(batch, self.features)
+        positions = np.flatnonzero(valid)
+        if not positions.size:
+            return positions, np.empty(0), 0
+        scores = self.score(matrix[positions] if positions.size < batch.num_rows else matrix)
+        flagged = scores > threshold
+        return positions[flagged], scores[flagged], int(positions.size)
+
+
+def fit_detector(batches, features, record_count, fit_sample_size, n_estimators, contamination,
+                 max_samples, random_state):
+    """
+    Fits a FittedDetector on an iterable of record batches, in one pass: the scaler sees
+    every row (partial_fit), the forest a uniform sample of about `fit_sample_size` rows.
+    """
+    rng = np.random.default_rng(random_state)
+    keep = min(1.0, fit_sample_size / max(record_count, 1))
+    scaler = StandardScaler()
+    sample = []
+    for batch in batches:
+        matrix, valid = feature_matrix(batch, features)
+        matrix = matrix[valid]
+        if not len(matrix):
+            continue
+        scaler.partial_fit(matrix)
+        sample.append(matrix if keep >= 1.0 else matrix[rng.random(len(matrix)) < keep])
+    sample = np.concatenate(sample) if sample else np.empty((0, len(features)))
+    if len(sample) < 2:
+        raise ValueError("Fewer than two transactions have values for every feature.")
+    model = IsolationForest(
+        n_estimators=n_estimators,
+        contamination=contamination,
+        max_samples=max_samples,
+        random_state=random_state,
+    )
+    model.fit(scaler.transform(sample))
+    return FittedDetector(features, scaler, model)
+
+
+def open_batches(path):
+    return pa.ipc.open_file(pa.memory_map(path, 'r'))
+
+
+def iter_csv_batches(source, columns, block_size, float_columns=()):
+    """
+    The `columns` of a CSV file (a path or binary file) as record batches, `block_size`
+    bytes of CSV at a time; other columns are skipped without being converted.
+    `float_columns` are read as float64 whatever their first block looks like.
+    """
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(columns),
+            column_types={name: pa.float64() for name in float_columns},
+            strings_can_be_null=True,
+        ),
+    )
+    while True:
+        try:
+            yield reader.read_next_batch()
+        except StopIteration:
+            return
+
+
+def result_schema(features):
+    """
+    The columns of scoring results: row number in the source, transaction id, anomaly
+    score and the feature values.
+    """
+    return pa.schema(
+        [('row', pa.int64()), ('transaction_id', pa.string()), ('anomaly_score', pa.float64())]
+        + [(name, pa.float64()) for name in features]
+    )
+
+
+def flagged_rows(batch, positions, scores, row_offset, id_column, features):
+    """
+    The result rows (see result_schema) of the flagged `positions` of a record batch
+    that starts at row `row_offset` of its source.
+    """
+    indices = pa.array(positions)
+    rows = np.asarray(positions, dtype=np.int64) + row_offset
+    columns = [
+        pa.array(rows, pa.int64()),
+        batch.column(id_column).take(indices).cast(pa.string()) if id_column else pa.array(rows.astype(str)),
+        pa.array(scores, pa.float64()),
+    ]
+    columns += [batch.column(name).take(indices).cast(pa.float64()) for name in features]
+    return pa.RecordBatch.from_arrays(columns, schema=result_schema(features))
+
+
+class ArrowFileSink:
+    """
+    Writes result batches to an Arrow IPC file as they arrive.
+    """
+
+    def __init__(self, path, schema):
+        self._file = pa.OSFile(str(path), 'wb')
+        self._writer = pa.ipc.new_file(self._file, schema)
+
+    def write(self, batch):
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CSVFileSink(ArrowFileSink):
+    """
+    Writes result batches to a CSV file as they arrive.
+    """
+
+    def __init__(self, path, schema):
+        self._file = pa.OSFile(str(path), 'wb')
+        self._writer = pa_csv.CSVWriter(self._file, schema)
+
+
+class ScoringSummary:
+    """
+    Counts of a scoring pass.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.scored = 0
+        self.flagged = 0
+        self.max_score = None
+
+    def as_dict(self):
+        return {'rows': self.rows, 'scored': self.scored, 'flagged': self.flagged, 'max_score': self.max_score}
+
+
+def write_flagged(results, sink, id_column, features, on_batch=None):
+    """
+    Writes the flagged rows of scored batches to `sink` as they come, and returns a
+    ScoringSummary. `results` yields (batch, positions, scores, rows scored), in source
+    order; `on_batch(summary)` is called after each batch.
+    """
+    summary = ScoringSummary()
+    for batch, positions, scores, scored in results:
+        if len(positions):
+            sink.write(flagged_rows(batch, positions, scores, summary.rows, id_column, features))
+            top = float(scores.max())
+            summary.max_score = top if summary.max_score is None else max(summary.max_score, top)
+        summary.rows += batch.num_rows
+        summary.scored += scored
+        summary.flagged += len(positions)
+        if on_batch is not None:
+            on_batch(summary)
+    return summary
+
+
+# State of a scoring worker process
+_worker_detector = None
+_worker_reader = None
+_worker_threshold = 0.0
+
+
+def _init_worker(detector_pickle, path, threshold):
+    global _worker_detector, _worker_reader, _worker_threshold
+    _worker_detector = pickle.loads(detector_pickle)
+    _worker_reader = open_batches(path) if path is not None else None
+    _worker_threshold = threshold
+
+
+def _score_worker_batch(index):
+    return _worker_detector.score_batch(_worker_reader.get_batch(index), _worker_threshold)
+
+
+def _score_given_batch(batch):
+    return _worker_detector.score_batch(batch, _worker_threshold)
+
+
+def _pool(detector, workers, path=None, threshold=0.0):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(pickle.dumps(detector), path, threshold),
+    )
+
+
+def score_file(detector, path, workers=None, threshold=0.0):
+    """
+    Scores every batch of the Arrow file at `path`, in `workers` processes (the CPU
+    count if None). Yields (batch, positions, scores, rows scored) of each batch, in
+    batch order; positions and scores are those of the rows scoring above `threshold`.
+    Workers map the file themselves: only batch numbers and flagged rows are exchanged.
+    """
+    reader = open_batches(path)
+    batches = reader.num_record_batches
+    workers = min(workers or os.cpu_count() or 1, batches)
+    if workers <= 1:
+        # Not worth starting processes for
+        for index in range(batches):
+            batch = reader.get_batch(index)
+            yield (batch, *detector.score_batch(batch, threshold))
+        return
+    with _pool(detector, workers, path, threshold) as pool:
+        for index, result in enumerate(pool.map(_score_worker_batch, range(batches))):
+            yield (reader.get_batch(index), *result)
+
+
+def score_stream(detector, batches, workers=1, threshold=0.0):
+    """
+    Like score_file() for an iterable of record batches, e.g. iter_csv_batches(). With
+    several workers, batches are sent to them with at most two per worker in flight, so
+    memory use stays bounded by the batch size whatever the length of the stream.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield (batch, *detector.score_batch(batch, threshold))
+        return
+    with _pool(detector, workers, threshold=threshold) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(_score_given_batch, batch)))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield (batch, *future.result())
+        while pending:
+            batch, future = pending.popleft()
+            yield (batch, *future.result())
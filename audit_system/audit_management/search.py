@@ -0,0 +1,186 @@
+"""
+Ranked full-text search for the list endpoints (`?q=`).
+
+The index lives in the database and is kept current by triggers, so every write path
+(save(), bulk_create(), bulk_update(), update(), raw SQL) updates it:
+
+- PostgreSQL: a weighted `search_vector` tsvector column on each table with a GIN
+  index. Matching is an index scan and ranking reads the stored vector, so neither
+  re-parses the text of the matching rows.
+- SQLite: an external-content FTS5 table per table, ranked with bm25(). Installed after
+  every migrate (install_sqlite_search), since SQLite rebuilds a table, dropping its
+  triggers, for most schema changes.
+
+Other databases fall back to unranked icontains matching.
+"""
+import re
+
+from django.apps import apps
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from rest_framework.filters import BaseFilterBackend
+
+
+SEARCH_CONFIG = 'english'
+
+# Indexed columns per model with their weight, most important first. PostgreSQL's
+# triggers are generated from a copy of this in migration 0009_search: when changing
+# it, add a migration that re-creates them. SQLite picks changes up on the next migrate.
+SEARCH_FIELDS = {
+    'audit_management.auditproject': (('name', 'A'), ('objectives', 'B'), ('description', 'C'), ('scope', 'C')),
+    'audit_management.audittask': (('name', 'A'), ('description', 'B')),
+    'audit_management.projectdocument': (('name', 'A'), ('description', 'B')),
+}
+
+# bm25() column weights matching ts_rank's default weights for A/B/C/D
+BM25_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+TERM_RE = re.compile(r'\w+')
+
+
+def get_search_fields(model):
+    return SEARCH_FIELDS[model._meta.label_lower]
+
+
+def fts5_query(query):
+    """
+    An FTS5 MATCH expression requiring every word of `query`. Words are quoted, so
+    user input can never be a syntax error.
+    """
+    return ' '.join(f'"{term}"' for term in TERM_RE.findall(query))
+
+
+def search(queryset, query):
+    """
+    The rows of `queryset` matching `query`, best first, annotated with `search_rank`
+    (higher is better). The rank is a float8 so keyset cursors compare exactly.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _search_postgresql(queryset, query)
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, query)
+    return _search_unindexed(queryset, query)
+
+
+def _search_postgresql(queryset, query):
+    table = connections[queryset.db].ops.quote_name(queryset.model._meta.db_table)
+    vector = RawSQL(f'{table}.search_vector', (), output_field=SearchVectorField())
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset.alias(search_vector=vector)
+        .filter(search_vector=search_query)
+        .annotate(search_rank=Cast(SearchRank(vector, search_query), FloatField()))
+        .order_by('-search_rank')
+    )
+
+
+def _search_sqlite(queryset, query):
+    match = fts5_query(query)
+    if not match:
+        return queryset.none()
+    quote_name = connections[queryset.db].ops.quote_name
+    table = queryset.model._meta.db_table
+    fts_table = quote_name(f'{table}_fts')
+    weights = ', '.join(str(BM25_WEIGHTS[weight]) for _, weight in get_search_fields(queryset.model))
+    pk = f'{quote_name(table)}.{quote_name(queryset.model._meta.pk.column)}'
+    # bm25() is lower-is-better; negate it so both backends rank descending
+    rank = RawSQL(
+        f'SELECT -bm25({fts_table}, {weights}) FROM {fts_table} WHERE {fts_table} MATCH %s AND rowid = {pk}',
+        (match,), output_field=FloatField(),
+    )
+    matches = RawSQL(f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', (match,))
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by('-search_rank')
+
+
+def _search_unindexed(queryset, query):
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return queryset.none()
+    fields = [field for field, _ in get_search_fields(queryset.model)]
+    for term in terms:
+        queryset = queryset.filter(Q.create([(f'{field}__icontains', term) for field in fields], connector=Q.OR))
+    return queryset.annotate(search_rank=RawSQL('0.0', (), output_field=FloatField())).order_by('-search_rank')
+
+
+def install_sqlite_search(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate receiver: creates (or re-creates) the FTS5 tables and their triggers on
+    SQLite, and fills each index that was (re)created from its table.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        triggers = {row[0] for row in cursor.fetchall()}
+        for label, fields in SEARCH_FIELDS.items():
+            model = apps.get_model(label)
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            fts = f'{table}_fts'
+            columns = [model._meta.get_field(name).column for name, _ in fields]
+            if fts in tables:
+                cursor.execute(f'PRAGMA table_info({fts})')
+                if [row[1] for row in cursor.fetchall()] != columns:
+                    cursor.execute(f'DROP TABLE {fts}')
+                    tables.discard(fts)
+                elif all(f'{fts}_{event}' in triggers for event in ('insert', 'delete', 'update')):
+                    continue
+            for statement in _sqlite_index_ddl(table, model._meta.pk.column, columns):
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _sqlite_index_ddl(table, pk, columns):
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    yield (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+        f"content_rowid='{pk}', tokenize='porter unicode61')"
+    )
+    for event in ('insert', 'delete', 'update'):
+        yield f'DROP TRIGGER IF EXISTS {fts}_{event}'
+    yield (
+        f'CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts}(rowid, {names}) VALUES (new.{pk}, {new}); END'
+    )
+    yield (
+        f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.{pk}, {old}); END"
+    )
+    yield (
+        f'CREATE TRIGGER {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.{pk}, {old}); "
+        f'INSERT INTO {fts}(rowid, {names}) VALUES (new.{pk}, {new}); END'
+    )
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    `?q=` ranked full-text search. Replaces the view's ordering with relevance; the
+    keyset pagination then pages through the ranked results.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search, results ordered by relevance.',
+            'schema': {'type': 'string'},
+        }]
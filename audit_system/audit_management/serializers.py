@@ -1,9 +1,177 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import AuditProject, AuditTask, ProjectDocument # Added ProjectDocument
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.urls import reverse
+from django.utils import timezone
+from .models import AnomalyDetectionRun, AuditProject, AuditTask, DetectedAnomaly, ProjectDocument, ReportJob, TransactionDataset, UploadSession # Added ProjectDocument
+from .fieldsets import FlexFieldsSerializerMixin
+from .instrumentation import InstrumentedSerializerMixin
+from .detection import DetectionError, resolve_parameters
+from .jobs import REPORT_KINDS
+from .uploads import get_max_upload_size
 
 
-class AuditProjectSerializer(serializers.ModelSerializer):
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that, inside a BulkListSerializer, resolves pks from the
+    instances the list serializer fetched in one query, instead of one query per item.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = getattr(self.root, 'prefetched_related', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return prefetched[pk]
+        except (KeyError, TypeError):
+            self.fail('does_not_exist', pk_value=data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    List serializer for bulk writes of a ModelSerializer.
+
+    Related objects referenced by the items are fetched with one query per relation,
+    items are validated one by one (errors come back as a list aligned with the input),
+    and the writes use bulk_create()/bulk_update(). Callers provide the transaction.
+    For updates, pass the instances to update as `instance`; every item must carry an `id`.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.prefetch_related(data)
+            if self.instance is not None:
+                self.instance_map = {obj.pk: obj for obj in self.instance}
+                self.validated_instances = []
+                self.seen_pks = set()
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child.instance = None
+
+    def prefetch_related(self, data):
+        self.prefetched_related = {}
+        for name, field in self.child.fields.items():
+            if field.read_only or not isinstance(field, PrefetchedPrimaryKeyRelatedField):
+                continue
+            pk_field = field.get_queryset().model._meta.pk
+            pks = set()
+            for item in data:
+                value = item.get(name) if isinstance(item, dict) else None
+                if value in (None, '') or isinstance(value, bool):
+                    continue
+                try:
+                    pks.add(pk_field.to_python(value))
+                except (TypeError, DjangoValidationError):
+                    continue # Reported by the field during item validation
+            self.prefetched_related[name] = field.get_queryset().in_bulk(pks) if pks else {}
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+
+        pk = data.get('id') if isinstance(data, dict) else None
+        try:
+            pk = self.child.Meta.model._meta.pk.to_python(pk)
+        except (TypeError, DjangoValidationError):
+            pk = None
+        if pk is None:
+            raise serializers.ValidationError({'id': ['This field is required.']})
+        if pk not in self.instance_map:
+            raise serializers.ValidationError({'id': [f'Object with id={pk} does not exist.']})
+        if pk in self.seen_pks:
+            raise serializers.ValidationError({'id': [f'Object with id={pk} appears more than once.']})
+        self.seen_pks.add(pk)
+
+        self.child.instance = self.instance_map[pk]
+        self.child.initial_data = data
+        validated = super().run_child_validation(data)
+        self.validated_instances.append(self.child.instance)
+        return validated
+
+    # Above this many distinct changes, one bulk_update() beats an UPDATE per change
+    max_update_groups = 20
+
+    def get_batch_size(self):
+        return getattr(settings, 'AUDIT_BULK_BATCH_SIZE', 1000)
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        return model.objects.bulk_create(
+            [model(**attrs) for attrs in validated_data],
+            batch_size=self.get_batch_size(),
+        )
+
+    def update(self, instance, validated_data):
+        model = self.child.Meta.model
+        # bulk_update() skips Field.pre_save(), so auto_now fields are set here.
+        now = timezone.now()
+        auto_now = {
+            field.attname: now for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)
+        }
+
+        # Typical bulk edits give many rows the same change ("mark these 3,000 tasks Completed").
+        # Identical changes become one UPDATE ... WHERE id IN (...) each, which is far cheaper than
+        # the per-row CASE expressions bulk_update() builds; varied edits fall back to bulk_update().
+        groups = {}
+        for obj, attrs in zip(self.validated_instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+            for attr, value in auto_now.items():
+                setattr(obj, attr, value)
+            try:
+                key = frozenset(attrs.items())
+            except TypeError: # Unhashable value: no grouping
+                key = None
+            groups.setdefault(key, []).append(obj)
+
+        fields = {attr for attrs in validated_data for attr in attrs}
+        if not fields:
+            return self.validated_instances
+        if None not in groups and len(groups) <= self.max_update_groups:
+            batch_size = self.get_batch_size()
+            for key, objs in groups.items():
+                pks = [obj.pk for obj in objs]
+                for start in range(0, len(pks), batch_size):
+                    model.objects.filter(pk__in=pks[start:start + batch_size]).update(**dict(key), **auto_now)
+        else:
+            model.objects.bulk_update(
+                self.validated_instances,
+                sorted(fields) + [model._meta.get_field(attname).name for attname in auto_now],
+                batch_size=self.get_batch_size(),
+            )
+        return self.validated_instances
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    Compact user, for ?expand= of project_manager/assignee.
+    """
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
+
+
+class AuditProjectSummarySerializer(serializers.ModelSerializer):
+    """
+    Compact project, for ?expand=project on tasks.
+    """
+    class Meta:
+        model = AuditProject
+        fields = ['id', 'name', 'status']
+
+
+class AuditProjectSerializer(InstrumentedSerializerMixin, FlexFieldsSerializerMixin, serializers.ModelSerializer):
     # To make project_manager more readable in responses, you could use:
     # project_manager_username = serializers.StringRelatedField(source='project_manager.username', read_only=True)
     # project_manager = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), allow_null=True)
@@ -27,6 +195,7 @@ class AuditProjectSerializer(serializers.ModelSerializer):
             'updated_at'
         ]
         read_only_fields = ('created_at', 'updated_at') # These are set automatically
+        expandable_fields = {'project_manager': UserSummarySerializer} # ?expand=project_manager
 
     # Optional: If you want to return the username along with the ID for project_manager
     # without adding a separate field like project_manager_username, you can customize to_representation
@@ -44,7 +213,10 @@ class AuditProjectSerializer(serializers.ModelSerializer):
     #     return super().create(validated_data)
 
 
-class AuditTaskSerializer(serializers.ModelSerializer):
+class AuditTaskSerializer(InstrumentedSerializerMixin, FlexFieldsSerializerMixin, serializers.ModelSerializer):
+    # Lets the bulk endpoints resolve project/assignee ids in one query per relation
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
     # project = serializers.PrimaryKeyRelatedField(queryset=AuditProject.objects.all())
     # assignee = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), allow_null=True)
     # project_name = serializers.StringRelatedField(source='project.name', read_only=True)
@@ -66,9 +238,11 @@ class AuditTaskSerializer(serializers.ModelSerializer):
             'updated_at'
         ]
         read_only_fields = ('created_at', 'updated_at')
+        list_serializer_class = BulkListSerializer
+        expandable_fields = {'project': AuditProjectSummarySerializer, 'assignee': UserSummarySerializer}
 
 
-class ProjectDocumentSerializer(serializers.ModelSerializer):
+class ProjectDocumentSerializer(InstrumentedSerializerMixin, FlexFieldsSerializerMixin, serializers.ModelSerializer):
     # uploaded_by = serializers.PrimaryKeyRelatedField(read_only=True) # Default is fine
     uploaded_by_username = serializers.StringRelatedField(source='uploaded_by.username', read_only=True)
     file_url = serializers.SerializerMethodField()
@@ -88,9 +262,266 @@ class ProjectDocumentSerializer(serializers.ModelSerializer):
             'uploaded_at'
         ]
         read_only_fields = ('uploaded_at', 'uploaded_by') # uploaded_by is set in perform_create
+        # Model fields read by fields that are not model fields, for ?fields=/?omit=
+        sparse_sources = {'file_url': ('file',)}
 
     def get_file_url(self, obj):
+        # The authenticated download endpoint; MEDIA_URL is only served in development
         request = self.context.get('request')
         if obj.file and request:
-            return request.build_absolute_uri(obj.file.url)
+            return request.build_absolute_uri(reverse('audit_management:document-download', kwargs={'pk': obj.pk}))
+        return None
+
+
+class UploadSessionSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    # Progress of the upload; a client resumes by sending the chunk starting at received_bytes
+    complete = serializers.BooleanField(source='is_complete', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id',
+            'project',
+            'task',
+            'name',
+            'description',
+            'filename',
+            'total_size',
+            'received_bytes',
+            'complete',
+            'status',
+            'document',
+            'created_at',
+            'expires_at'
+        ]
+        read_only_fields = ('received_bytes', 'status', 'document', 'created_at', 'expires_at')
+
+    def validate_filename(self, value):
+        # Only the base name is kept; the storage decides the directory
+        value = value.replace('\\', '/').rsplit('/', 1)[-1].strip()
+        if not value or value in ('.', '..'):
+            raise serializers.ValidationError("A file name is required.")
+        return value
+
+    def validate_total_size(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Size cannot be negative.")
+        max_size = get_max_upload_size()
+        if value > max_size:
+            raise serializers.ValidationError(f"Files larger than {max_size} bytes are not accepted.")
+        return value
+
+    def validate(self, data):
+        task = data.get('task')
+        if task is not None and task.project_id != data['project'].pk:
+            raise serializers.ValidationError({'task': "Task does not belong to this project."})
+        return data
+
+
+class TransactionDatasetSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    uploaded_by_username = serializers.StringRelatedField(source='uploaded_by.username', read_only=True)
+
+    class Meta:
+        model = TransactionDataset
+        fields = [
+            'id',
+            'project',
+            'name',
+            'source_description',
+            'source_document',
+            'status',
+            'error_message',
+            'record_count',
+            'data_schema_info',
+            'data_time_range_start',
+            'data_time_range_end',
+            'data_location_uri',
+            'uploaded_by',
+            'uploaded_by_username',
+            'created_at',
+            'updated_at'
+        ]
+        # Everything else is found by ingestion
+        read_only_fields = (
+            'status', 'error_message', 'record_count', 'data_schema_info', 'data_time_range_start',
+            'data_time_range_end', 'data_location_uri', 'uploaded_by', 'created_at', 'updated_at',
+        )
+        extra_kwargs = {'source_document': {'required': True, 'allow_null': False}}
+
+    def validate(self, data):
+        if data['source_document'].project_id != data['project'].pk:
+            raise serializers.ValidationError({'source_document': "Document does not belong to this project."})
+        return data
+
+
+class DetectionParametersSerializer(serializers.Serializer):
+    features = serializers.ListField(child=serializers.CharField(max_length=255), min_length=1, max_length=20, required=False)
+    id_column = serializers.CharField(max_length=255, required=False, allow_null=True)
+    # Overrides the share of flagged transactions implied by the sensitivity level
+    contamination = serializers.FloatField(min_value=0.0001, max_value=0.5, required=False)
+    n_estimators = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    max_samples = serializers.IntegerField(min_value=2, required=False)
+    random_state = serializers.IntegerField(min_value=0, required=False)
+    fit_sample_size = serializers.IntegerField(min_value=100, max_value=10000000, required=False)
+
+
+class AnomalyDetectionRunSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = AnomalyDetectionRun
+        fields = [
+            'id',
+            'project',
+            'dataset',
+            'status',
+            'sensitivity_level',
+            'parameters_used',
+            'summary_info',
+            'error_message',
+            'requested_by',
+            'requested_at',
+            'processing_started_at',
+            'completed_at',
+            'anomalies_ingested',
+            'anomalies_ingested_at'
+        ]
+        read_only_fields = (
+            'project', 'status', 'summary_info', 'error_message', 'requested_by', 'requested_at',
+            'processing_started_at', 'completed_at', 'anomalies_ingested', 'anomalies_ingested_at',
+        )
+
+    def validate(self, data):
+        dataset = data['dataset']
+        if not dataset.data_location_uri or dataset.status in ('New', 'Uploading', 'Error'):
+            raise serializers.ValidationError({'dataset': "The dataset has not been ingested."})
+        params = data.get('parameters_used') or {}
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({'parameters_used': "Expected an object."})
+        params_serializer = DetectionParametersSerializer(data=params)
+        if not params_serializer.is_valid():
+            raise serializers.ValidationError({'parameters_used': params_serializer.errors})
+        unknown = set(params) - set(params_serializer.fields)
+        if unknown:
+            raise serializers.ValidationError({'parameters_used': f"Unknown parameters: {', '.join(sorted(unknown))}."})
+        try:
+            # The run records every parameter it will use, defaults included
+            data['parameters_used'] = resolve_parameters(
+                dataset, data.get('sensitivity_level'), params_serializer.validated_data,
+            )
+        except DetectionError as exc:
+            raise serializers.ValidationError({'parameters_used': str(exc)})
+        data['project'] = dataset.project
+        return data
+
+
+class ProjectsCSVReportParamsSerializer(serializers.Serializer):
+    statuses = serializers.ListField(
+        child=serializers.ChoiceField(choices=AuditProject.STATUS_CHOICES),
+        required=False,
+        allow_empty=False,
+    )
+
+    def validate_statuses(self, value):
+        # Same statuses in any order are the same report (and the same job)
+        return sorted(set(value))
+
+
+# Parameters each report kind accepts (see jobs.REPORT_KINDS)
+REPORT_PARAMS_SERIALIZERS = {
+    'projects_csv': ProjectsCSVReportParamsSerializer,
+}
+
+
+class ReportJobSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    kind = serializers.ChoiceField(choices=[(key, kind.label) for key, kind in REPORT_KINDS.items()])
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id',
+            'kind',
+            'params',
+            'status',
+            'size',
+            'error',
+            'download_url',
+            'created_at',
+            'started_at',
+            'finished_at',
+            'expires_at'
+        ]
+        read_only_fields = ('status', 'size', 'error', 'created_at', 'started_at', 'finished_at', 'expires_at')
+
+    def validate(self, data):
+        params = data.get('params') or {}
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({'params': "Expected an object."})
+        params_serializer = REPORT_PARAMS_SERIALIZERS[data['kind']](data=params)
+        if not params_serializer.is_valid():
+            raise serializers.ValidationError({'params': params_serializer.errors})
+        unknown = set(params) - set(params_serializer.fields)
+        if unknown:
+            raise serializers.ValidationError({'params': f"Unknown parameters: {', '.join(sorted(unknown))}."})
+        data['params'] = dict(params_serializer.validated_data)
+        return data
+
+    def get_download_url(self, obj):
+        request = self.context.get('request')
+        if obj.status == 'Completed' and obj.file and request:
+            return request.build_absolute_uri(reverse('audit_management:report-job-download', kwargs={'pk': obj.pk}))
         return None
+
+
+class AuditTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Adds the profile fields to the tokens, so stateless reads (AUDIT_JWT_STATELESS_READS)
+    can answer with them. Refreshed access tokens copy the claims of the refresh token.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.get_username()
+        token['email'] = user.email
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
+
+
+class DetectedAnomalySerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    assigned_to_auditor_username = serializers.StringRelatedField(source='assigned_to_auditor.username', read_only=True)
+
+    class Meta:
+        model = DetectedAnomaly
+        fields = [
+            'id',
+            'detection_run',
+            'transaction_identifier_in_source',
+            'anomaly_score',
+            'ai_suggested_reason_codes',
+            'ai_explanation',
+            'raw_transaction_details_preview',
+            'status',
+            'auditor_notes',
+            'assigned_to_auditor',
+            'assigned_to_auditor_username',
+            'created_at',
+            'updated_at'
+        ]
+        # Auditors only triage; the rest comes from the detection run
+        read_only_fields = (
+            'detection_run', 'transaction_identifier_in_source', 'anomaly_score', 'ai_suggested_reason_codes',
+            'ai_explanation', 'raw_transaction_details_preview', 'created_at', 'updated_at',
+        )
+
+
+class AnomalyStatusChangeSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=DetectedAnomaly.STATUS_CHOICES)
+    # Narrows the selection given by the query parameters to these anomalies
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, required=False)
+
+    def validate_ids(self, value):
+        limit = getattr(settings, 'AUDIT_BULK_MAX_ITEMS', 10000)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} ids at a time; select by filters instead.")
+        return value
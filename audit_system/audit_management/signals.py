@@ -0,0 +1,63 @@
+"""
+Signals sent by TrackedQuerySet for writes that bypass Model.save()/delete().
+
+Django only sends post_save/post_delete for single instances (and for each object a
+cascading delete collects). Bulk creates, bulk updates and QuerySet.update() are
+silent, so bookkeeping such as the dashboard counters would drift. These signals fill
+that gap. They are sent inside the write's transaction.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.dispatch import Signal
+
+
+# Sent after QuerySet.bulk_create().
+# Arguments: sender (model), objs, exact (False when conflicts may have skipped rows), using
+post_bulk_create = Signal()
+
+# Sent after QuerySet.bulk_update().
+# Arguments: sender, objs, fields, previous ({pk: {tracked field: old value}}), using
+post_bulk_update = Signal()
+
+# Sent after QuerySet.update().
+# Arguments: sender, previous ({pk: {tracked field: old value}}), values (the update kwargs), using
+post_queryset_update = Signal()
+
+
+_current_batch = ContextVar('audit_change_batch', default=None)
+
+
+@contextmanager
+def batched_changes():
+    """
+    Groups per-row bookkeeping done by signal receivers during a multi-row write
+    (a cascading delete sends post_delete once per collected object).
+    Receivers accumulate with batch_accumulator() and are flushed once when the block
+    exits without an error. Use it inside the write's transaction.
+    """
+    if _current_batch.get() is not None:
+        yield
+        return
+    batch = {}
+    token = _current_batch.set(batch)
+    try:
+        yield
+    finally:
+        _current_batch.reset(token)
+    for items, flush in batch.values():
+        flush(items)
+
+
+def batch_accumulator(key, flush):
+    """
+    Returns the list collecting items for `key` in the current batch, registering
+    `flush(items)` to run at the end of it. Returns None outside batched_changes(),
+    in which case the caller should do its work immediately.
+    """
+    batch = _current_batch.get()
+    if batch is None:
+        return None
+    if key not in batch:
+        batch[key] = ([], flush)
+    return batch[key][0]
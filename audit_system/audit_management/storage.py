@@ -0,0 +1,256 @@
+"""
+Content-addressed, deduplicating storage for project documents.
+
+Every file is stored once, as `blobs/<aa>/<bb>/<sha256>` under MEDIA_ROOT. The name saved
+in the FileField is `documents/<sha256>/<original file name>`, so documents keep their
+own file names while sharing the bytes. StoredBlob rows count the references to each
+blob; when the last one is released the blob is removed after the transaction commits.
+`gc_document_blobs` repairs counts and removes blobs no row refers to.
+
+The SHA-256 is computed while an upload is received (see the hashing upload handlers
+below), so storing a file never reads it a second time. Files that did not come through
+those handlers are hashed on save.
+"""
+import hashlib
+import os
+import re
+import uuid
+from functools import cache
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, FileField
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils._os import safe_makedirs
+
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+DOCUMENT_PREFIX = 'documents/'
+BLOB_PREFIX = 'blobs/'
+DOCUMENT_NAME_RE = re.compile(r'^documents/([0-9a-f]{64})/[^/]+$')
+
+
+class HashingUploadHandlerMixin:
+    """
+    Computes the SHA-256 of an uploaded file chunk by chunk as the request is parsed
+    and leaves it on the resulting UploadedFile as `content_sha256`.
+    """
+    def new_file(self, *args, **kwargs):
+        # Set up before super(): the memory handler raises StopFutureHandlers from it.
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # This handler kept the chunk
+            self.hasher.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_sha256 = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def compute_digest(content):
+    """
+    SHA-256 of a file that was not hashed on receipt.
+    """
+    hasher = hashlib.sha256()
+    if hasattr(content, 'temporary_file_path'):
+        with open(content.temporary_file_path(), 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                hasher.update(block)
+    else:
+        for chunk in content.chunks():
+            hasher.update(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+def digest_from_name(name):
+    """
+    The digest a `documents/<sha256>/<file name>` name refers to, or None for other
+    names (e.g. files stored before this storage was introduced).
+    """
+    match = DOCUMENT_NAME_RE.match(name or '')
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that stores each distinct content once and reference-counts it.
+    Names it did not create are handled like plain FileSystemStorage names.
+    """
+
+    def blob_name(self, digest):
+        return f'{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}'
+
+    def path(self, name):
+        digest = digest_from_name(name)
+        return super().path(self.blob_name(digest) if digest else name)
+
+    def url(self, name):
+        digest = digest_from_name(name)
+        return super().url(self.blob_name(digest) if digest else name)
+
+    def get_available_name(self, name, max_length=None):
+        # Content-addressed names never collide; only make sure the final name fits.
+        file_name = os.path.basename(name)
+        if max_length is not None:
+            room = max_length - len(DOCUMENT_PREFIX) - 65
+            if len(file_name) > room:
+                stem, ext = os.path.splitext(file_name)
+                file_name = stem[:max(room - len(ext), 1)] + ext
+        return file_name
+
+    def _save(self, name, content):
+        digest = getattr(content, 'content_sha256', None) or compute_digest(content)
+        # Take the reference first: the row update holds a lock that a concurrent purge
+        # of the same blob waits on, so the file cannot disappear under us.
+        self.acquire(digest, content.size)
+        if not os.path.exists(super().path(self.blob_name(digest))):
+            self._write_blob(digest, content)
+        return f'{DOCUMENT_PREFIX}{digest}/{os.path.basename(name)}'
+
+    def _write_blob(self, digest, content):
+        full_path = super().path(self.blob_name(digest))
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            safe_makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write next to the blob and rename into place, so readers never see a partial
+        # blob and two uploads of the same content can race harmlessly.
+        temp_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                file_move_safe(content.temporary_file_path(), temp_path)
+            else:
+                with open(temp_path, 'wb') as f:
+                    for chunk in content.chunks():
+                        f.write(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._ensure_location_group_id(full_path)
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        digest = digest_from_name(name)
+        if digest is None:
+            return super().delete(name)
+        self.release(digest)
+
+    # Reference counting
+
+    def _blob_model(self):
+        return apps.get_model('audit_management', 'StoredBlob')
+
+    def acquire(self, digest, size):
+        StoredBlob = self._blob_model()
+        blobs = StoredBlob.objects.using(router.db_for_write(StoredBlob))
+        if blobs.filter(digest=digest).update(refcount=F('refcount') + 1):
+            return
+        try:
+            with transaction.atomic(using=blobs.db):
+                blobs.create(digest=digest, size=size, refcount=1)
+        except IntegrityError:
+            # Created concurrently since our UPDATE found nothing.
+            blobs.filter(digest=digest).update(refcount=F('refcount') + 1)
+
+    def release(self, digest):
+        StoredBlob = self._blob_model()
+        using = router.db_for_write(StoredBlob)
+        StoredBlob.objects.using(using).filter(digest=digest, refcount__gt=0).update(refcount=F('refcount') - 1)
+        transaction.on_commit(lambda: self.purge(digest), using=using)
+
+    def purge(self, digest):
+        """
+        Removes the blob if nothing refers to it any more. Re-checked under the row lock,
+        so a concurrent upload of the same content either keeps it or recreates it.
+        Returns True if the blob was removed.
+        """
+        StoredBlob = self._blob_model()
+        using = router.db_for_write(StoredBlob)
+        with transaction.atomic(using=using):
+            blob = StoredBlob.objects.using(using).select_for_update().filter(digest=digest).first()
+            if blob is None or blob.refcount > 0 or self.is_referenced(digest):
+                return False
+            try:
+                os.remove(super().path(self.blob_name(digest)))
+            except FileNotFoundError:
+                pass
+            blob.delete()
+        return True
+
+    def referencing_fields(self):
+        """
+        (model, field) for every FileField stored in this storage.
+        """
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if isinstance(field, FileField) and field.storage is self:
+                    yield model, field
+
+    def is_referenced(self, digest):
+        prefix = f'{DOCUMENT_PREFIX}{digest}/'
+        return any(
+            model._base_manager.filter(**{f'{field.attname}__startswith': prefix}).exists()
+            for model, field in self.referencing_fields()
+        )
+
+
+@cache
+def get_document_storage():
+    """
+    The storage of ProjectDocument.file (a callable, so migrations do not depend on it).
+    """
+    return ContentAddressedStorage()
+
+
+# Keep references in step with ProjectDocument rows. Django leaves files in place on
+# delete and when a file is replaced; here each of those releases the old reference.
+
+@receiver(pre_save, sender='audit_management.ProjectDocument')
+def remember_stored_file(sender, instance, raw, using, update_fields, **kwargs):
+    instance._stored_file_name = None
+    if raw or instance._state.adding or (update_fields is not None and 'file' not in update_fields):
+        return
+    instance._stored_file_name = (
+        sender._base_manager.using(using).filter(pk=instance.pk).values_list('file', flat=True).first()
+    )
+
+
+@receiver(post_save, sender='audit_management.ProjectDocument')
+def release_replaced_file(sender, instance, raw, **kwargs):
+    previous = getattr(instance, '_stored_file_name', None)
+    if previous and previous != instance.file.name:
+        instance.file.storage.delete(previous)
+
+
+@receiver(post_delete, sender='audit_management.ProjectDocument')
+def release_deleted_file(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
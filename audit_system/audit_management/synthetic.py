@@ -0,0 +1,167 @@
+"""
+Synthetic securities transactions, for load tests of ingestion and anomaly detection.
+
+The columns and distributions are those of `generate_transaction_data` in the
+prototype notebook: securities with their own normal price distribution, quantities
+of 10 to 499, and a share of injected anomalies of three kinds (high_amount,
+high_quantity, price_dev) labelled in IsAnomaly_GroundTruth. Instead of one row at a
+time, every column of a chunk of rows is drawn at once with NumPy and handed to
+Arrow's writers without conversion to Python objects.
+
+Timestamps fall within the trading hours (09:00-17:00) of consecutive days and are
+already in order: each chunk draws sorted times within its own slice of the period.
+The output is the same for the same seed and chunk size. Like scoring.py, this module
+does not use Django.
+"""
+import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pa_csv
+
+
+class Security(NamedTuple):
+    id: str
+    mean_price: float
+    std_price: float
+    # Relative share of the transactions
+    weight: float = 1.0
+
+
+DEFAULT_SECURITIES = (
+    Security('SEC_A', 100.0, 5.0),
+    Security('SEC_B', 50.0, 2.0),
+    Security('SEC_C', 200.0, 10.0),
+)
+ANOMALY_TYPES = ('high_amount', 'high_quantity', 'price_dev')
+DEFAULT_START = datetime.datetime(2023, 1, 1, 9, 0)
+TRADING_SECONDS_PER_DAY = 8 * 60 * 60
+FIRST_CLIENT_ID = 1001
+DEFAULT_CHUNK_ROWS = 1000000
+FORMATS = ('csv', 'parquet')
+
+
+def _normalized(weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    if not len(weights) or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("Weights must be non-negative and not all zero.")
+    return weights / weights.sum()
+
+
+def generate_batches(rows, seed=42, securities=DEFAULT_SECURITIES, anomaly_rate=0.03, anomaly_types=None,
+                     labels=True, anomaly_type_column=False, start=DEFAULT_START, trading_days=20, clients=100,
+                     chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Returns an iterator of `rows` transactions, as record batches of up to `chunk_rows` rows.
+
+    `anomaly_types` maps each injected anomaly type to its relative share (all of
+    ANOMALY_TYPES equally if None); anomaly_rate of the rows of every chunk are
+    anomalies. `labels` adds the IsAnomaly_GroundTruth column, `anomaly_type_column`
+    an AnomalyType column naming the type of each anomaly.
+    """
+    if not securities:
+        raise ValueError("At least one security is needed.")
+    if not 0 <= anomaly_rate <= 1:
+        raise ValueError("The anomaly rate must be between 0 and 1.")
+    anomaly_types = dict(anomaly_types or dict.fromkeys(ANOMALY_TYPES, 1.0))
+    unknown = set(anomaly_types) - set(ANOMALY_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown anomaly types: {', '.join(sorted(unknown))}.")
+    type_names = list(anomaly_types)
+    type_weights = _normalized(list(anomaly_types.values()))
+    security_weights = _normalized([security.weight for security in securities])
+    security_ids = pa.array([security.id for security in securities])
+    mean_prices = np.array([security.mean_price for security in securities])
+    std_prices = np.array([security.std_price for security in securities])
+    period = trading_days * TRADING_SECONDS_PER_DAY
+    start_seconds = int(start.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+    def chunks():
+        for chunk, first in enumerate(range(0, rows, chunk_rows)):
+            size = min(chunk_rows, rows - first)
+            rng = np.random.default_rng([seed, chunk])
+
+            security = rng.choice(len(securities), size, p=security_weights)
+            price = rng.normal(mean_prices[security], std_prices[security])
+            quantity = rng.integers(10, 500, size)
+
+            is_anomaly = np.zeros(size, dtype=np.int8)
+            anomaly_type = np.full(size, -1, dtype=np.int8)
+            count = int(round(size * anomaly_rate))
+            if count:
+                positions = rng.choice(size, count, replace=False)
+                is_anomaly[positions] = 1
+                kinds = rng.choice(len(type_names), count, p=type_weights)
+                anomaly_type[positions] = kinds
+                for index, name in enumerate(type_names):
+                    selected = positions[kinds == index]
+                    if name == 'high_amount':
+                        # Price can be normal, but the quantity makes the amount high
+                        quantity[selected] = rng.integers(2000, 5000, len(selected))
+                    elif name == 'high_quantity':
+                        quantity[selected] = rng.integers(3000, 6000, len(selected))
+                    else:
+                        # Far from the security's usual price, higher or lower
+                        higher = rng.random(len(selected)) > 0.5
+                        price[selected] *= np.where(
+                            higher, rng.uniform(1.5, 2.5, len(selected)), rng.uniform(0.3, 0.5, len(selected)),
+                        )
+                        quantity[selected] = rng.integers(50, 1000, len(selected))
+
+            price = np.maximum(1.0, price).round(2)
+            amount = (quantity * price).round(2)
+
+            # This chunk's slice of the trading period, in order, mapped onto trading hours
+            low, high = period * first // rows, period * (first + size) // rows
+            trading_seconds = np.sort(rng.integers(low, max(high, low + 1), size))
+            days, seconds = np.divmod(trading_seconds, TRADING_SECONDS_PER_DAY)
+            timestamps = start_seconds + days * 86400 + seconds
+
+            columns = {
+                'TransactionID': pa.array(np.arange(first + 1, first + size + 1, dtype=np.int64)),
+                'ClientID': pa.array(rng.integers(FIRST_CLIENT_ID, FIRST_CLIENT_ID + clients, size)),
+                'SecurityID': security_ids.take(pa.array(security)),
+                'BuySell': pa.array(rng.integers(0, 2, size, dtype=np.int8)),
+                'Quantity': pa.array(quantity),
+                'Price': pa.array(price),
+                'Timestamp': pa.array(timestamps, pa.timestamp('s')),
+                'Amount': pa.array(amount),
+            }
+            if labels:
+                columns['IsAnomaly_GroundTruth'] = pa.array(is_anomaly)
+            if anomaly_type_column:
+                names = pa.array(type_names)
+                columns['AnomalyType'] = names.take(pa.array(anomaly_type, mask=anomaly_type < 0))
+            yield pa.record_batch(columns)
+
+    # Arguments are checked now, not when the first batch is asked for
+    return chunks()
+
+
+def write_transactions(path, batches, format='csv', max_bytes=None):
+    """
+    Writes record batches to a CSV or Parquet file, stopping once the file holds
+    `max_bytes` if given. Returns the number of rows written.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}.")
+    rows = 0
+    writer = None
+    with pa.OSFile(str(path), 'wb') as file:
+        try:
+            for batch in batches:
+                if writer is None:
+                    writer = (
+                        pa_csv.CSVWriter(file, batch.schema) if format == 'csv'
+                        else pq.ParquetWriter(file, batch.schema)
+                    )
+                writer.write_batch(batch)
+                rows += batch.num_rows
+                if max_bytes is not None and file.tell() >= max_bytes:
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+    return rows
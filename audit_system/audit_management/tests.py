@@ -1,15 +1,40 @@
-from django.urls import reverse
+from django.urls import get_resolver, reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from django.contrib.auth.models import User
-from .models import AuditProject, AuditTask, ProjectDocument # Updated imports
+from rest_framework_simplejwt.tokens import AccessToken
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.db.models import Case, Value, When
+from django.contrib.auth.models import Permission, User
+from .models import AuditProject, AuditTask, ChangeLogEntry, ProjectDocument, ReportJob, StatusCounter, StoredBlob, TableVersion, TransactionDataset, UploadSession, AnomalyDetectionRun, DetectedAnomaly # Updated imports
+from . import anomalies, changes, counters, datasets, detection, events, jobs, scoring, synthetic, uploads
+from .authentication import user_cache
+from .benchmarks import compare_results
+from .management.commands.benchmark_api import ROUTES
+from .instrumentation import RequestMetricsMiddleware, endpoint_stats
+from .storage import get_document_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory
 from django.utils import timezone # For dashboard tests
 import datetime # For dashboard tests
 import csv # For report tests
+import json # For benchmark tests
 import io # For report tests
 import os # For file operations
+import gzip # For report tests
+import hashlib # For document storage tests
+import shutil # For upload session tests
+import tempfile # For upload session tests
 from django.conf import settings # For media root settings
+import numpy as np # For anomaly detection tests
+import pyarrow as pa # For anomaly detection tests
+import pyarrow.parquet as pq # For synthetic transaction tests
 
 
 class AuthTests(APITestCase):
@@ -59,6 +84,64 @@ class AuthTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user(username='cacheduser', password='cachedpass123', email='cached@example.com')
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'cacheduser', 'password': 'cachedpass123'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        self.hello_url = reverse('audit_management:hello')
+
+    def get_hello(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.hello_url)
+        response.query_count = len(queries)
+        return response
+
+    def test_user_is_loaded_once(self):
+        self.assertGreater(self.get_hello().query_count, 0)
+        response = self.get_hello()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user_email'], 'cached@example.com')
+        self.assertEqual(response.query_count, 0)
+
+    def test_changes_invalidate_the_cache(self):
+        self.get_hello()
+        self.user.user_permissions.add(Permission.objects.get(codename='view_auditproject'))
+        response = self.get_hello()
+        self.assertGreater(response.query_count, 0)
+        self.assertTrue(user_cache.peek(self.user.pk).has_perm('audit_management.view_auditproject'))
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_hello().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUDIT_AUTH_CACHE_TTL=0)
+    def test_cache_can_be_disabled(self):
+        self.get_hello()
+        self.assertGreater(self.get_hello().query_count, 0)
+
+    @override_settings(AUDIT_JWT_STATELESS_READS=True)
+    def test_stateless_reads(self):
+        response = self.get_hello()
+        self.assertEqual(response.query_count, 0)
+        self.assertEqual(response.data, {
+            'message': 'Hello, cacheduser! You are authenticated.', 'user_id': self.user.pk, 'user_email': 'cached@example.com',
+        })
+        # Writes still resolve the user from the database
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        project = AuditProject.objects.create(name='Stateless project')
+        with override_settings(AUDIT_UPLOAD_SESSION_DIR=upload_dir):
+            response = self.client.post(reverse('audit_management:upload-list'), {
+                'project': project.pk, 'name': 'Doc', 'filename': 'doc.txt', 'total_size': 4,
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(UploadSession.objects.get().created_by, self.user)
+        self.assertEqual(len(self.client.get(reverse('audit_management:upload-list')).data['results']), 1)
+
+
 class AuditProjectAPITests(APITestCase):
     def setUp(self):
         self.username = 'projectuser'
@@ -182,6 +265,94 @@ class AuditTaskAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class AuditTaskBulkAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulkuser', password='bulkpass123')
+        self.client.force_authenticate(user=self.user)
+        self.project = AuditProject.objects.create(name='Bulk Project')
+        self.other_project = AuditProject.objects.create(name='Other Bulk Project')
+        self.bulk_url = reverse('audit_management:task-bulk')
+
+    def task_payload(self, count, **extra):
+        return [
+            {'project': self.project.pk if index % 2 else self.other_project.pk, 'name': f'Bulk Task {index}', 'assignee': self.user.pk, **extra}
+            for index in range(count)
+        ]
+
+    def test_bulk_create(self):
+        response = self.client.post(self.bulk_url, self.task_payload(4), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(len(response.data), 4)
+        self.assertTrue(all(item['id'] for item in response.data))
+        self.assertEqual(AuditTask.objects.filter(project=self.project).count(), 2)
+        self.assertEqual(StatusCounter.objects.get(scope='audit_management.audittask', status='To Do').count, 4)
+
+    def test_bulk_create_query_count_does_not_grow_with_items(self):
+        def queries_for(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.bulk_url, self.task_payload(count), format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+        queries_for(1) # Creates the status counter rows
+        self.assertEqual(queries_for(5), queries_for(60))
+
+    def test_bulk_create_reports_errors_per_item(self):
+        payload = self.task_payload(3)
+        payload[1]['project'] = 999999
+        payload[2].pop('name')
+        response = self.client.post(self.bulk_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('project', response.data[1])
+        self.assertIn('name', response.data[2])
+        self.assertFalse(AuditTask.objects.exists())
+
+    def test_bulk_create_limits(self):
+        response = self.client.post(self.bulk_url, [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(AUDIT_BULK_MAX_ITEMS=2):
+            response = self.client.post(self.bulk_url, self.task_payload(3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update(self):
+        tasks = [AuditTask.objects.create(project=self.project, name=f'Task {index}') for index in range(3)]
+        before = tasks[0].updated_at
+        payload = [
+            {'id': tasks[0].pk, 'status': 'Completed'},
+            {'id': tasks[1].pk, 'name': 'Renamed', 'project': self.other_project.pk},
+        ]
+        response = self.client.patch(self.bulk_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        tasks[0].refresh_from_db()
+        tasks[1].refresh_from_db()
+        self.assertEqual(tasks[0].status, 'Completed')
+        self.assertGreater(tasks[0].updated_at, before)
+        self.assertEqual(tasks[1].name, 'Renamed')
+        self.assertEqual(tasks[1].project, self.other_project)
+        self.assertEqual(StatusCounter.objects.get(scope='audit_management.audittask', status='Completed').count, 1)
+
+    def test_bulk_update_reports_errors_per_item(self):
+        task = AuditTask.objects.create(project=self.project, name='Task')
+        payload = [{'id': task.pk, 'status': 'Not A Status'}, {'id': 999999, 'name': 'x'}, {'name': 'no id'}]
+        response = self.client.patch(self.bulk_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status', response.data[0])
+        self.assertIn('id', response.data[1])
+        self.assertIn('id', response.data[2])
+
+    def test_bulk_delete(self):
+        tasks = [AuditTask.objects.create(project=self.project, name=f'Task {index}') for index in range(3)]
+        response = self.client.delete(self.bulk_url, {'ids': [tasks[0].pk, tasks[1].pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual(list(AuditTask.objects.values_list('pk', flat=True)), [tasks[2].pk])
+
+        response = self.client.delete(self.bulk_url, {'ids': [tasks[2].pk, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertTrue(AuditTask.objects.filter(pk=tasks[2].pk).exists())
+
+
 class ProjectDocumentAPITests(APITestCase):
     def setUp(self):
         self.username = 'docuser'
@@ -204,8 +375,10 @@ class ProjectDocumentAPITests(APITestCase):
         self.assertEqual(doc.uploaded_by, self.user)
         self.assertTrue(doc.file.name.endswith('test_upload.txt'))
         # Basic check for file existence (Django's test runner handles temp media)
-        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, doc.file.name)))
-        doc.file.delete(save=False) # Clean up the file
+        # The content-addressed storage keeps the bytes under blobs/, see doc.file.path
+        self.assertTrue(os.path.exists(doc.file.path))
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.file.delete(save=False) # Clean up the file
 
     def test_create_document_missing_file(self):
         document_data = {'project': self.project.pk, 'name': 'Doc no file'}
@@ -215,15 +388,1648 @@ class ProjectDocumentAPITests(APITestCase):
     def test_delete_document(self):
         dummy_file = SimpleUploadedFile("delete_test.txt", b"content", content_type="text/plain")
         doc = ProjectDocument.objects.create(project=self.project, name='Delete Me Doc', file=dummy_file, uploaded_by=self.user)
-        file_path = os.path.join(settings.MEDIA_ROOT, doc.file.name)
+        file_path = doc.file.path
         self.assertTrue(os.path.exists(file_path)) # Check it exists before delete
         detail_url = reverse('audit_management:document-detail', kwargs={'pk': doc.pk})
-        response = self.client.delete(detail_url)
+        # The file is removed once the deleting transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(detail_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(ProjectDocument.objects.filter(pk=doc.pk).exists())
         self.assertFalse(os.path.exists(file_path)) # Check it's deleted
 
 
+class DocumentStorageTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='storageuser', password='storagepass123')
+        self.project = AuditProject.objects.create(name='Storage Project', project_manager=self.user)
+        self.other_project = AuditProject.objects.create(name='Other Storage Project', project_manager=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.content = b'%PDF-1.4 invoice 2024-117' * 100
+        self.digest = hashlib.sha256(self.content).hexdigest()
+
+    def upload(self, project, file_name='invoice.pdf', content=None):
+        upload = SimpleUploadedFile(file_name, content or self.content, content_type='application/pdf')
+        response = self.client.post(
+            reverse('audit_management:document-list'),
+            {'project': project.pk, 'name': file_name, 'file': upload},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return ProjectDocument.objects.get(pk=response.data['id'])
+
+    def blob_files(self):
+        return [name for _, _, files in os.walk(os.path.join(self.media_root, 'blobs')) for name in files]
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload(self.project)
+        second = self.upload(self.other_project, file_name='copy-of-invoice.pdf')
+        self.assertEqual(first.file.name, f'documents/{self.digest}/invoice.pdf')
+        self.assertEqual(second.file.name, f'documents/{self.digest}/copy-of-invoice.pdf')
+        self.assertEqual(first.file.path, second.file.path)
+        self.assertEqual(self.blob_files(), [self.digest])
+        self.assertEqual(StoredBlob.objects.get(digest=self.digest).refcount, 2)
+        with second.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_upload_is_hashed_on_receipt(self):
+        storage = get_document_storage()
+        with mock.patch('audit_management.storage.compute_digest', side_effect=AssertionError('hashed twice')):
+            self.upload(self.project)
+        self.assertTrue(storage.exists(f'documents/{self.digest}/invoice.pdf'))
+
+    def test_blob_removed_with_last_reference(self):
+        first = self.upload(self.project)
+        second = self.upload(self.other_project)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.blob_files(), [self.digest])
+        self.assertEqual(StoredBlob.objects.get(digest=self.digest).refcount, 1)
+        # Deleting the project cascades to its documents
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_project.delete()
+        self.assertFalse(ProjectDocument.objects.filter(pk=second.pk).exists())
+        self.assertEqual(self.blob_files(), [])
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_replacing_file_releases_old_blob(self):
+        doc = self.upload(self.project)
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.file = SimpleUploadedFile('invoice-v2.pdf', b'corrected invoice')
+            doc.save()
+        self.assertEqual(self.blob_files(), [hashlib.sha256(b'corrected invoice').hexdigest()])
+
+    def test_gc_repairs_counts_and_removes_orphans(self):
+        doc = self.upload(self.project)
+        StoredBlob.objects.filter(digest=self.digest).update(refcount=5)
+        # A blob file left behind by a failed upload, and an unreferenced row
+        orphan = os.path.join(self.media_root, 'blobs', 'ab', 'cd', 'abcd' + '0' * 60)
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, 'wb') as f:
+            f.write(b'orphan')
+        StoredBlob.objects.create(digest='f' * 64, size=0, refcount=0)
+
+        out = io.StringIO()
+        call_command('gc_document_blobs', '--grace-minutes=0', stdout=out)
+        self.assertIn('Fixed 1 reference count(s); removed 1 unreferenced blob(s) and 1 orphaned file(s)', out.getvalue())
+        self.assertEqual(StoredBlob.objects.get(digest=self.digest).refcount, 1)
+        self.assertEqual(self.blob_files(), [self.digest])
+        self.assertTrue(os.path.exists(doc.file.path))
+
+
+class DocumentDownloadAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='downloaduser', password='downloadpass123')
+        self.project = AuditProject.objects.create(name='Download Project', project_manager=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, AUDIT_DOWNLOAD_OFFLOAD='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.content = bytes(range(256)) * 40
+        self.doc = ProjectDocument.objects.create(
+            project=self.project, name='Ledger', uploaded_by=self.user,
+            file=SimpleUploadedFile('ledger.pdf', self.content),
+        )
+        self.url = reverse('audit_management:document-download', kwargs={'pk': self.doc.pk})
+        self.etag = f'"{hashlib.sha256(self.content).hexdigest()}"'
+
+    def test_download_whole_file(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/pdf')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="ledger.pdf"')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response['Content-Length']), len(self.content))
+
+    def test_file_url_points_at_download(self):
+        response = self.client.get(reverse('audit_management:document-detail', kwargs={'pk': self.doc.pk}))
+        self.assertTrue(response.data['file_url'].endswith(self.url))
+
+    def test_if_none_match(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], self.etag)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+        # A stale If-Range gets the whole (changed) file instead of a range of it
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_offload_to_web_server(self):
+        with self.settings(AUDIT_DOWNLOAD_OFFLOAD='x-accel-redirect'):
+            response = self.client.get(self.url)
+        digest = self.etag.strip('"')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/blobs/{digest[:2]}/{digest[2:4]}/{digest}')
+        self.assertEqual(response.content, b'')
+        with self.settings(AUDIT_DOWNLOAD_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.doc.file.path)
+
+    def test_download_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UploadSessionAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploaduser', password='uploadpass123')
+        self.project = AuditProject.objects.create(name='Upload Project', project_manager=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        settings_override = override_settings(AUDIT_UPLOAD_SESSION_DIR=self.upload_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.list_url = reverse('audit_management:upload-list')
+        self.content = b'0123456789' * 10
+
+    def start_session(self, **extra):
+        data = {'project': self.project.pk, 'name': 'Ledger scan', 'filename': 'ledger.pdf', 'total_size': len(self.content)}
+        data.update(extra)
+        response = self.client.post(self.list_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['id']
+
+    def put_chunk(self, session_id, start, end, body=None):
+        url = reverse('audit_management:upload-detail', kwargs={'pk': session_id})
+        body = self.content[start:end + 1] if body is None else body
+        return self.client.put(url, body, content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}')
+
+    def test_chunked_upload_and_finalize(self):
+        session_id = self.start_session()
+        self.assertEqual(self.put_chunk(session_id, 0, 39).data['received_bytes'], 40)
+
+        # Progress query tells the client where to resume
+        detail_url = reverse('audit_management:upload-detail', kwargs={'pk': session_id})
+        response = self.client.get(detail_url)
+        self.assertEqual(response.data['received_bytes'], 40)
+        self.assertFalse(response.data['complete'])
+
+        response = self.put_chunk(session_id, 40, 99)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertTrue(response.data['complete'])
+
+        finalize_url = reverse('audit_management:upload-finalize', kwargs={'pk': session_id})
+        response = self.client.post(finalize_url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        doc = ProjectDocument.objects.get(pk=response.data['id'])
+        self.addCleanup(doc.file.delete, save=False)
+        self.assertEqual(doc.uploaded_by, self.user)
+        self.assertEqual(doc.name, 'Ledger scan')
+        with doc.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        # The part file was moved into media storage, not copied
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+        # Finalizing again returns the same document
+        response = self.client.post(finalize_url)
+        self.assertEqual(response.data['id'], doc.pk)
+        self.assertEqual(ProjectDocument.objects.count(), 1)
+
+    def test_resent_chunk_overwrites_and_gap_is_rejected(self):
+        session_id = self.start_session()
+        self.put_chunk(session_id, 0, 49)
+        # A chunk that would leave a gap is refused with the offset to resume from
+        response = self.put_chunk(session_id, 60, 99)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['received_bytes'], 50)
+        # Resending an overlapping chunk (lost response) is fine
+        response = self.put_chunk(session_id, 40, 99)
+        self.assertEqual(response.data['received_bytes'], 100)
+        with open(os.path.join(self.upload_dir, f'{session_id}.part'), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_chunk_body_is_read_outside_the_transaction(self):
+        session_id = self.start_session()
+        self.put_chunk(session_id, 0, 49)
+        depth = len(connection.atomic_blocks)
+        write_chunk = uploads.write_chunk
+        responses = []
+
+        def write(session, stream, start, end, on_block=None):
+            self.assertEqual(len(connection.atomic_blocks), depth)
+            # Other chunks and finalize are refused while this one holds the part file
+            responses.append(self.put_chunk(session_id, 40, 99))
+            responses.append(self.client.post(reverse('audit_management:upload-finalize', kwargs={'pk': session_id})))
+            return write_chunk(session, stream, start, end, on_block)
+
+        with mock.patch.object(uploads, 'write_chunk', write):
+            response = self.put_chunk(session_id, 50, 99)
+        self.assertEqual([r.status_code for r in responses], [status.HTTP_409_CONFLICT] * 2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['received_bytes'], 100)
+        self.assertIsNone(UploadSession.objects.get(pk=session_id).lease_expires_at)
+        # The body went straight into the part file
+        self.assertEqual(os.listdir(self.upload_dir), [f'{session_id}.part'])
+        with open(os.path.join(self.upload_dir, f'{session_id}.part'), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_stalled_chunk_loses_the_part_file(self):
+        session_id = self.start_session()
+        write_chunk = uploads.write_chunk
+
+        def stall(session, stream, start, end, on_block=None):
+            write_chunk(session, stream, start, end, on_block)
+            # The client stalled past the lease, and meanwhile resent the start
+            UploadSession.objects.filter(pk=session_id).update(
+                lease_expires_at=timezone.now() - datetime.timedelta(seconds=1)
+            )
+            with mock.patch.object(uploads, 'write_chunk', write_chunk):
+                self.assertEqual(self.put_chunk(session_id, 0, 9).status_code, status.HTTP_200_OK)
+
+        with mock.patch.object(uploads, 'write_chunk', stall):
+            response = self.put_chunk(session_id, 0, 49)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(UploadSession.objects.get(pk=session_id).received_bytes, 10)
+
+    def test_bad_chunks(self):
+        session_id = self.start_session()
+        url = reverse('audit_management:upload-detail', kwargs={'pk': session_id})
+        response = self.client.put(url, b'abc', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Content-Range total must match the declared size
+        response = self.client.put(url, b'abc', content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-2/3')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Body shorter than the range
+        response = self.put_chunk(session_id, 0, 9, body=b'01234')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertEqual(session.received_bytes, 0)
+        # The part file is free for the resent chunk
+        self.assertIsNone(session.lease_expires_at)
+        self.assertEqual(self.put_chunk(session_id, 0, 9).data['received_bytes'], 10)
+        self.assertEqual(os.listdir(self.upload_dir), [f'{session_id}.part'])
+
+    def test_finalize_incomplete_upload(self):
+        session_id = self.start_session()
+        self.put_chunk(session_id, 0, 9)
+        response = self.client.post(reverse('audit_management:upload-finalize', kwargs={'pk': session_id}))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(ProjectDocument.objects.exists())
+
+    def test_sessions_are_private(self):
+        session_id = self.start_session()
+        other = User.objects.create_user(username='otheruploader', password='x')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(reverse('audit_management:upload-detail', kwargs={'pk': session_id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expired_session_and_purge(self):
+        session_id = self.start_session()
+        self.put_chunk(session_id, 0, 9)
+        UploadSession.objects.filter(pk=session_id).update(expires_at=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertEqual(self.put_chunk(session_id, 10, 19).status_code, status.HTTP_410_GONE)
+
+        out = io.StringIO()
+        call_command('purge_upload_sessions', stdout=out)
+        self.assertIn('Removed 1 expired upload session', out.getvalue())
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+
+class PaginationAPITests(APITestCase):
+    def setUp(self):
+        self.username = 'pageuser'
+        self.password = 'pagepass123'
+        self.user = User.objects.create_user(username=self.username, password=self.password)
+        token_url = reverse('token_obtain_pair')
+        token_response = self.client.post(token_url, {'username': self.username, 'password': self.password}, format='json')
+        self.access_token = token_response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access_token)
+        self.project_list_url = reverse('audit_management:project-list')
+        self.task_list_url = reverse('audit_management:task-list')
+
+        # Identical timestamps force the id tiebreaker to decide the order
+        same_time = timezone.now()
+        self.projects = [AuditProject.objects.create(name=f'Paged Project {index}') for index in range(7)]
+        AuditProject.objects.update(created_at=same_time)
+
+    def _walk(self, url, key='next'):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data[key]
+            pages += 1
+        return ids, pages
+
+    def test_list_is_paginated_with_cursor_links(self):
+        response = self.client.get(self.project_list_url, {'page_size': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_forward_walk_visits_every_row_once_in_order(self):
+        ids, pages = self._walk(f'{self.project_list_url}?page_size=3')
+        expected = list(AuditProject.objects.order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_backward_walk_returns_previous_pages(self):
+        first = self.client.get(self.project_list_url, {'page_size': 3}, format='json')
+        second = self.client.get(first.data['next'], format='json')
+        third = self.client.get(second.data['next'], format='json')
+        self.assertIsNone(third.data['next'])
+
+        back_to_second = self.client.get(third.data['previous'], format='json')
+        self.assertEqual(back_to_second.data['results'], second.data['results'])
+        back_to_first = self.client.get(back_to_second.data['previous'], format='json')
+        self.assertEqual(back_to_first.data['results'], first.data['results'])
+        self.assertIsNone(back_to_first.data['previous'])
+
+    def test_page_size_is_capped(self):
+        with self.settings(AUDIT_MAX_PAGE_SIZE=2):
+            response = self.client.get(self.project_list_url, {'page_size': 1000}, format='json')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.project_list_url, {'cursor': 'not-a-cursor'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_task_list_keyed_on_project_name_and_created_at(self):
+        later_project = AuditProject.objects.create(name='A First By Name')
+        for project in (self.projects[0], later_project):
+            for index in range(3):
+                AuditTask.objects.create(project=project, name=f'Task {index}')
+        ids, pages = self._walk(f'{self.task_list_url}?page_size=4')
+        expected = list(AuditTask.objects.order_by('project__name', 'created_at', 'pk').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 2)
+
+
+class SearchAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searchuser', password='searchpass123')
+        self.client.force_authenticate(user=self.user)
+        self.projects_url = reverse('audit_management:project-list')
+        self.payroll = AuditProject.objects.create(name='Payroll controls', description='Quarterly review of salaries.')
+        self.vendor = AuditProject.objects.create(name='Vendor onboarding', description='Check payroll vendors and contracts.')
+        AuditProject.objects.create(name='Data center access', scope='Badges and visitor logs.')
+
+    def search(self, url, q, **params):
+        response = self.client.get(url, {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def names(self, url, q):
+        return [item['name'] for item in self.search(url, q)['results']]
+
+    def test_results_are_ranked(self):
+        # A match in the name outranks a match in the description; stemming matches "reviews"
+        self.assertEqual(self.names(self.projects_url, 'payroll'), ['Payroll controls', 'Vendor onboarding'])
+        self.assertEqual(self.names(self.projects_url, 'reviews'), ['Payroll controls'])
+        self.assertEqual(self.names(self.projects_url, 'visitor badges'), ['Data center access'])
+        self.assertEqual(self.names(self.projects_url, 'payroll badges'), [])
+
+    def test_index_follows_writes(self):
+        self.payroll.name = 'Treasury controls'
+        self.payroll.save()
+        AuditProject.objects.filter(pk=self.vendor.pk).update(description='Supplier contracts.')
+        AuditProject.objects.bulk_create([AuditProject(name='Payroll follow-up')])
+        self.assertEqual(self.names(self.projects_url, 'payroll'), ['Payroll follow-up'])
+        self.assertEqual(self.names(self.projects_url, 'treasury'), ['Treasury controls'])
+        AuditProject.objects.filter(name='Payroll follow-up').delete()
+        self.assertEqual(self.names(self.projects_url, 'payroll'), [])
+
+    def test_ranked_results_are_paginated(self):
+        AuditProject.objects.bulk_create([
+            AuditProject(name=f'Inventory count {i}', description='inventory ' * (i % 3)) for i in range(7)
+        ])
+        data = self.search(self.projects_url, 'inventory', page_size=3)
+        names = [item['name'] for item in data['results']]
+        while data['next']:
+            response = self.client.get(data['next'])
+            data = response.data
+            names += [item['name'] for item in data['results']]
+        # Every match exactly once, in the same order as a single page
+        single_page = [item['name'] for item in self.search(self.projects_url, 'inventory', page_size=50)['results']]
+        self.assertEqual(names, single_page)
+        self.assertEqual(sorted(names), sorted(f'Inventory count {i}' for i in range(7)))
+
+    def test_unsafe_queries(self):
+        self.assertEqual(self.names(self.projects_url, '"payroll'), ['Payroll controls', 'Vendor onboarding'])
+        self.assertEqual(self.names(self.projects_url, 'NEAR( OR *'), [])
+        self.assertEqual(self.names(self.projects_url, '!!!'), [])
+
+    def test_tasks_and_documents(self):
+        AuditTask.objects.create(project=self.payroll, name='Sample payslips', description='Pick 25 payslips.')
+        AuditTask.objects.create(project=self.vendor, name='Review contracts')
+        ProjectDocument.objects.create(project=self.vendor, name='Signed contracts', description=None)
+        self.assertEqual(self.names(reverse('audit_management:task-list'), 'payslip'), ['Sample payslips'])
+        self.assertEqual(self.names(reverse('audit_management:async-task-list'), 'contract'), ['Review contracts'])
+        self.assertEqual(self.names(reverse('audit_management:document-list'), 'contracts'), ['Signed contracts'])
+
+
+class SparseFieldsetAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='fielduser', password='fieldpass123')
+        self.client.force_authenticate(user=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.project = AuditProject.objects.create(name='Fieldset project', description='Long text ' * 50, status='In Progress')
+        for i in range(3):
+            AuditTask.objects.create(project=self.project, name=f'Fieldset task {i}', description='Details')
+        ProjectDocument.objects.create(
+            project=self.project, name='Memo', file=SimpleUploadedFile('memo.txt', b'memo'), uploaded_by=self.user,
+        )
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data, [query['sql'] for query in queries.captured_queries]
+
+    def test_fields_and_omit(self):
+        url = reverse('audit_management:project-list')
+        data, queries = self.get(url, fields='id,status')
+        self.assertEqual(data['results'], [{'id': self.project.pk, 'status': 'In Progress'}])
+        self.assertFalse(any('"description"' in sql for sql in queries))
+
+        data, queries = self.get(url, omit='description,scope,objectives')
+        self.assertEqual(set(data['results'][0]), {
+            'id', 'name', 'project_manager', 'status', 'start_date', 'end_date', 'created_at', 'updated_at',
+        })
+        self.assertFalse(any('"scope"' in sql for sql in queries))
+
+        data, _ = self.get(reverse('audit_management:project-detail', kwargs={'pk': self.project.pk}), fields='name')
+        self.assertEqual(data, {'name': 'Fieldset project'})
+
+    def test_unknown_fields(self):
+        response = self.client.get(reverse('audit_management:project-list'), {'fields': 'id,budget', 'omit': 'secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'fields', 'omit'})
+
+    def test_paginated_tasks_without_joins(self):
+        url = reverse('audit_management:task-list')
+        data, queries = self.get(url, fields='id,status', page_size=2)
+        self.assertEqual([set(item) for item in data['results']], [{'id', 'status'}] * 2)
+        # The ordering (project__name) still joins the project, but no user columns are loaded
+        self.assertFalse(any('auth_user' in sql or '"description"' in sql for sql in queries))
+        data, _ = self.get(data['next'])
+        self.assertEqual(len(data['results']), 1)
+        data, _ = self.get(reverse('audit_management:async-task-list'), fields='name', q='task')
+        self.assertEqual(len(data['results']), 3)
+
+    def test_document_fields(self):
+        url = reverse('audit_management:document-list')
+        data, queries = self.get(url, fields='id,name')
+        self.assertEqual(data['results'], [{'id': ProjectDocument.objects.get().pk, 'name': 'Memo'}])
+        self.assertFalse(any('auth_user' in sql for sql in queries if 'audit_management_projectdocument' in sql))
+        data, _ = self.get(url, fields='uploaded_by_username,file_url')
+        self.assertEqual(data['results'][0]['uploaded_by_username'], 'fielduser')
+        self.assertTrue(data['results'][0]['file_url'].endswith('/download/'))
+
+    def test_writes_use_all_fields(self):
+        response = self.client.post(
+            reverse('audit_management:project-list') + '?fields=id', {'name': 'Written project'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['name'], 'Written project')
+
+
+class RelationExpansionAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='expanduser', password='expandpass123')
+        self.client.force_authenticate(user=self.user)
+        for i in range(12):
+            manager = User.objects.create_user(username=f'manager{i}', first_name=f'Manager {i}')
+            project = AuditProject.objects.create(name=f'Expand project {i}', project_manager=manager)
+            AuditTask.objects.create(project=project, name=f'Expand task {i}', assignee=manager)
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data, len(queries)
+
+    def test_expanded_relations_use_a_fixed_number_of_queries(self):
+        for url, expand in (
+            (reverse('audit_management:project-list'), 'project_manager'),
+            (reverse('audit_management:task-list'), 'project,assignee'),
+            (reverse('audit_management:async-task-list'), 'project,assignee'),
+        ):
+            small, small_count = self.count_queries(url, expand=expand, page_size=2)
+            large, large_count = self.count_queries(url, expand=expand, page_size=12)
+            self.assertEqual(len(large['results']), 12)
+            self.assertEqual(small_count, large_count, url)
+
+    def test_expanded_representation(self):
+        data, _ = self.count_queries(reverse('audit_management:task-list'), expand='project,assignee', page_size=1)
+        task = AuditTask.objects.select_related('project', 'assignee').order_by('project__name', 'created_at').first()
+        self.assertEqual(data['results'][0]['project'], {'id': task.project.pk, 'name': task.project.name, 'status': 'Pending'})
+        self.assertEqual(data['results'][0]['assignee'], {
+            'id': task.assignee.pk, 'username': task.assignee.username, 'first_name': task.assignee.first_name, 'last_name': '',
+        })
+        # Without ?expand= relations stay ids
+        data, _ = self.count_queries(reverse('audit_management:task-list'), page_size=1)
+        self.assertEqual(data['results'][0]['project'], task.project.pk)
+
+    def test_expand_with_fields(self):
+        url = reverse('audit_management:project-detail', kwargs={'pk': AuditProject.objects.first().pk})
+        data, count = self.count_queries(url, fields='id,project_manager', expand='project_manager')
+        self.assertEqual(set(data), {'id', 'project_manager'})
+        self.assertEqual(set(data['project_manager']), {'id', 'username', 'first_name', 'last_name'})
+        self.assertEqual(count, 2)  # Table versions (ETag), then the project joined with its manager
+        # Expanding a field that is not returned is a no-op
+        data, _ = self.count_queries(url, fields='id', expand='project_manager')
+        self.assertEqual(data, {'id': AuditProject.objects.first().pk})
+
+    def test_invalid_expand(self):
+        response = self.client.get(reverse('audit_management:project-list'), {'expand': 'tasks'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expand', response.data)
+
+    def test_writes_take_ids(self):
+        response = self.client.post(
+            reverse('audit_management:task-list') + '?expand=project',
+            {'project': AuditProject.objects.first().pk, 'name': 'Written task'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['project'], AuditProject.objects.first().pk)
+
+
+class ConditionalGetAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='etaguser', password='etagpass123')
+        self.client.force_authenticate(user=self.user)
+        self.project = AuditProject.objects.create(name='Conditional project')
+        self.task = AuditTask.objects.create(project=self.project, name='Conditional task')
+        self.projects_url = reverse('audit_management:project-list')
+        self.tasks_url = reverse('audit_management:task-list')
+
+    def get(self, url, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, **headers)
+        response.query_count = len(queries)
+        return response
+
+    def assertChanged(self, url, etag):
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_not_modified_without_running_the_query(self):
+        response = self.get(self.projects_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response = self.get(self.projects_url, etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.query_count, 1)  # The table versions only
+
+        detail_url = reverse('audit_management:project-detail', kwargs={'pk': self.project.pk})
+        detail_etag = self.get(detail_url)['ETag']
+        self.assertEqual(self.get(detail_url, detail_etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        # Other query parameters are another representation
+        self.assertNotEqual(self.get(self.projects_url, fields='id')['ETag'], etag)
+
+    def test_every_write_path_changes_the_etag(self):
+        etag = self.get(self.projects_url)['ETag']
+        self.project.description = 'Changed'
+        self.project.save()
+        etag = self.assertChanged(self.projects_url, etag)
+        AuditProject.objects.filter(pk=self.project.pk).update(status='Completed')
+        etag = self.assertChanged(self.projects_url, etag)
+        self.project.scope = 'Bulk'
+        AuditProject.objects.bulk_update([self.project], ['scope'])
+        etag = self.assertChanged(self.projects_url, etag)
+        AuditProject.objects.bulk_create([AuditProject(name='Second conditional project')])
+        etag = self.assertChanged(self.projects_url, etag)
+        AuditProject.objects.filter(name='Second conditional project').delete()
+        self.assertChanged(self.projects_url, etag)
+
+    def test_related_tables_are_covered(self):
+        tasks_etag = self.get(self.tasks_url)['ETag']
+        documents_url = reverse('audit_management:document-list')
+        documents_etag = self.get(documents_url)['ETag']
+        # Tasks are ordered by project name
+        self.project.name = 'Renamed conditional project'
+        self.project.save()
+        tasks_etag = self.assertChanged(self.tasks_url, tasks_etag)
+        self.assertEqual(self.get(documents_url, documents_etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        # Deleting the project deletes its tasks
+        self.project.delete()
+        self.assertEqual(self.get(self.tasks_url, tasks_etag).data['results'], [])
+
+    def test_logins_do_not_change_the_etag(self):
+        etag = self.get(self.projects_url)['ETag']
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.post(reverse('token_obtain_pair'), {'username': 'etaguser', 'password': 'etagpass123'}).status_code, 200)
+        self.client.login(username='etaguser', password='etagpass123')
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.get(self.projects_url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertChanged(self.projects_url, etag)
+
+    def test_last_modified(self):
+        # Not sent while the newest change is less than a second old
+        self.assertNotIn('Last-Modified', self.get(self.projects_url))
+        TableVersion.objects.update(updated_at=timezone.now() - datetime.timedelta(minutes=5))
+        response = self.get(self.projects_url)
+        last_modified = response['Last-Modified']
+        response = self.client.get(self.projects_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(AUDIT_SERVER_TIMING=True)
+class RequestMetricsAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='metricsuser', password='metricspass123')
+        self.admin = User.objects.create_user(username='metricsadmin', password='metricspass123', is_staff=True)
+        AuditProject.objects.create(name='Metrics project', project_manager=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.projects_url = reverse('audit_management:project-list')
+        endpoint_stats.clear()
+        self.addCleanup(endpoint_stats.clear)
+
+    def timings(self, response):
+        # {name: (duration, description)} of the Server-Timing header
+        timings = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            params = dict(param.split('=', 1) for param in params)
+            timings[name] = (float(params['dur']) if 'dur' in params else None, params.get('desc', '').strip('"'))
+        return timings
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.projects_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'total'})
+        self.assertEqual(timings['db'][1], f'{len(queries)} queries')
+        self.assertGreater(timings['serialize'][0], 0)
+        self.assertGreater(timings['render'][0], 0)
+        self.assertGreaterEqual(timings['total'][0], timings['db'][0])
+
+    def test_duplicate_queries_are_reported(self):
+        def n_plus_one(request):
+            for project in AuditProject.objects.all():
+                list(AuditTask.objects.filter(project=project))
+            for _ in range(3):
+                AuditTask.objects.filter(name='Another statement').exists()
+            return HttpResponse()
+
+        AuditProject.objects.create(name='Second metrics project')
+        AuditProject.objects.create(name='Third metrics project')
+        response = RequestMetricsMiddleware(n_plus_one)(RequestFactory().get('/'))
+        self.assertEqual(self.timings(response)['dupq'][1], '6 duplicated queries')
+        self.assertEqual(self.timings(response)['db'][1], '7 queries')
+
+    def test_endpoint_statistics_are_staff_only(self):
+        metrics_url = reverse('audit_management:request-metrics')
+        for _ in range(3):
+            self.client.get(self.projects_url)
+        self.client.get(reverse('audit_management:project-detail', kwargs={'pk': AuditProject.objects.get().pk}))
+        self.assertEqual(self.client.get(metrics_url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(metrics_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        endpoints = response.data['endpoints']
+        project_list = endpoints['GET audit_management:project-list']
+        self.assertEqual(project_list['count'], 3)
+        self.assertLessEqual(project_list['p50_ms'], project_list['p95_ms'])
+        self.assertLessEqual(project_list['p99_ms'], project_list['max_ms'])
+        self.assertEqual(endpoints['GET audit_management:project-detail']['count'], 1)
+
+    def test_slow_requests_are_logged(self):
+        with self.settings(AUDIT_SLOW_REQUEST_MS=0), self.assertLogs('audit_management.slow_requests', 'WARNING') as logs:
+            self.client.get(self.projects_url)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('"endpoint": "GET audit_management:project-list"', logs.output[0])
+        with self.settings(AUDIT_SLOW_REQUEST_MS=0, AUDIT_SLOW_REQUEST_SAMPLE_RATE=0), self.assertNoLogs('audit_management.slow_requests'):
+            self.client.get(self.projects_url)
+
+    def test_disabled(self):
+        with self.settings(AUDIT_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(self.projects_url))
+        with self.settings(AUDIT_REQUEST_METRICS=False):
+            self.assertNotIn('Server-Timing', self.client.get(self.projects_url))
+        self.assertEqual(endpoint_stats.summary()['GET audit_management:project-list']['count'], 1)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_route_is_benchmarked(self):
+        resolver = get_resolver('audit_management.urls')
+        names = {name for name in resolver.reverse_dict if isinstance(name, str)}
+        self.assertEqual(set(ROUTES), names)
+
+    def test_regressions_against_baseline(self):
+        def run(p95_ms, queries, errors=0):
+            return {'results': {'10000': {'task-list': {'p95_ms': p95_ms, 'queries': queries, 'errors': errors}}}}
+
+        baseline = run(40.0, 2.0)
+        # Within 25% plus 5 ms
+        self.assertEqual(compare_results(baseline, run(55.0, 2.0)), [])
+        self.assertEqual(compare_results(baseline, run(56.0, 3.0, errors=1)), [
+            'task-list at 10000 rows: p95 56.0 ms, was 40.0 ms',
+            'task-list at 10000 rows: 3.0 queries per request, was 2.0',
+            'task-list at 10000 rows: 1 failed requests, was 0',
+        ])
+        self.assertEqual(compare_results(baseline, run(56.0, 3.0), latency_tolerance=0.5, query_tolerance=1), [])
+        # Sizes missing from the baseline are not compared
+        self.assertEqual(compare_results({'results': {}}, run(56.0, 3.0)), [])
+
+    def test_streaming_scoring_memory_benchmark(self):
+        stdout = io.StringIO()
+        # The default limits follow from the block size: 32 MB plus 16 times 3 blocks
+        call_command('benchmark_streaming_scoring', memory_mb=1, input_multiple=2, block_size=65536,
+                     json=True, stdout=stdout, stderr=io.StringIO())
+        result = json.loads(stdout.getvalue())
+        self.assertGreaterEqual(result['input_bytes'], 2 * 1024 * 1024)
+        self.assertGreater(result['flagged'], 0)
+        self.assertEqual(result['max_growth_mb'], 35.0)
+        self.assertLessEqual(result['peak_growth_mb'], result['max_growth_mb'])
+
+
+@override_settings(AUDIT_CHANGE_FEED_LAG=0)
+class ChangeFeedAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='syncuser', password='syncpass123')
+        self.client.force_authenticate(user=self.user)
+        self.project = AuditProject.objects.create(name='Sync project', project_manager=self.user)
+        self.task = AuditTask.objects.create(project=self.project, name='Sync task')
+        self.url = reverse('audit_management:changes')
+
+    def sync(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def summary(self, data):
+        return [(change['type'], change['id'], change['deleted']) for change in data['changes']]
+
+    def test_full_then_delta_sync(self):
+        data = self.sync()
+        self.assertEqual(self.summary(data), [('project', self.project.pk, False), ('task', self.task.pk, False)])
+        self.assertEqual(data['changes'][0]['data']['name'], 'Sync project')
+        self.assertFalse(data['has_more'])
+        token = data['next_token']
+        self.assertEqual(self.sync(since=token)['changes'], [])
+
+        # Every write path, including deletes
+        self.project.description = 'Changed'
+        self.project.save()
+        self.project.description = 'Changed twice'
+        self.project.save()
+        created = AuditTask.objects.bulk_create([AuditTask(project=self.project, name='Bulk sync task')])[0]
+        AuditTask.objects.filter(pk=created.pk).update(status='In Progress')
+        task_pk, project_pk = self.task.pk, self.project.pk
+        self.task.delete()
+        data = self.sync(since=token)
+        self.assertEqual(self.summary(data), [
+            ('project', project_pk, False), ('task', created.pk, False), ('task', task_pk, True),
+        ])
+        self.assertEqual(data['changes'][0]['data']['description'], 'Changed twice')
+        self.assertEqual(data['changes'][1]['data']['status'], 'In Progress')
+        self.assertIsNone(data['changes'][2]['data'])
+
+        # Cascading deletes leave tombstones too
+        data = self.sync(since=data['next_token'])
+        self.project.delete()
+        self.assertEqual(self.summary(self.sync(since=data['next_token'])), [
+            ('task', created.pk, True), ('project', project_pk, True),
+        ])
+
+    def test_queries_do_not_grow_with_the_rows(self):
+        def add_documents(count):
+            for index in range(count):
+                ProjectDocument.objects.create(
+                    project=self.project, task=self.task, name=f'Synced doc {index}', uploaded_by=self.user,
+                    file=SimpleUploadedFile(f'synced-{index}.txt', f'content {index}'.encode()),
+                )
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            add_documents(2)
+            with CaptureQueriesContext(connection) as few:
+                self.assertEqual(len(self.sync(types='document')['changes']), 2)
+            add_documents(18)
+            with self.assertNumQueries(len(few)):
+                self.assertEqual(len(self.sync(types='document')['changes']), 20)
+
+    def test_pages(self):
+        AuditTask.objects.bulk_create([AuditTask(project=self.project, name=f'Paged task {i}') for i in range(3)])
+        seen, token = [], None
+        while True:
+            data = self.sync(page_size=2, **({'since': token} if token else {}))
+            self.assertLessEqual(len(data['changes']), 2)
+            seen.extend(self.summary(data))
+            token = data['next_token']
+            if not data['has_more']:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_types_and_updated_since(self):
+        self.assertEqual(self.summary(self.sync(types='task')), [('task', self.task.pk, False)])
+        ChangeLogEntry.objects.update(changed_at=timezone.now() - datetime.timedelta(hours=1))
+        self.task.save()
+        since = (timezone.now() - datetime.timedelta(minutes=1)).isoformat()
+        self.assertEqual(self.summary(self.sync(updated_since=since)), [('task', self.task.pk, False)])
+        response = self.client.get(self.url, {'types': 'task,invoice', 'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data), {'types', 'updated_since'})
+        self.assertEqual(self.client.get(self.url, {'since': 'abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_changes_wait_for_the_feed_lag(self):
+        token = self.sync()['next_token']
+        self.task.save()
+        with self.settings(AUDIT_CHANGE_FEED_LAG=60):
+            data = self.sync(since=token)
+        self.assertEqual(data['changes'], [])
+        self.assertEqual(data['next_token'].split('.')[0], token.split('.')[0])
+        self.assertEqual(len(self.sync(since=token)['changes']), 1)
+
+    def test_compaction_and_expired_tokens(self):
+        self.task.save()
+        self.project.save()
+        other = AuditTask.objects.create(project=self.project, name='Deleted sync task')
+        other.delete()
+        self.assertEqual(changes.compact(), 3)  # Superseded upserts of task, project and other
+        self.assertEqual(ChangeLogEntry.objects.count(), 3)
+        ChangeLogEntry.objects.filter(action='delete').update(changed_at=timezone.now() - datetime.timedelta(days=31))
+        call_command('compact_change_log', stdout=io.StringIO())
+        self.assertEqual(self.summary(self.sync()), [('task', self.task.pk, False), ('project', self.project.pk, False)])
+
+        old_token = changes.make_token(1, timezone.now() - datetime.timedelta(days=31))
+        self.assertEqual(self.client.get(self.url, {'since': old_token}).status_code, status.HTTP_410_GONE)
+
+
+class StatusEventTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='eventuser', password='eventpass123')
+        self.project = AuditProject.objects.create(name='Event project', status='Pending')
+        self.other_project = AuditProject.objects.create(name='Other event project')
+        self.task = AuditTask.objects.create(project=self.project, name='Event task')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.url = reverse('audit_management:async-events')
+
+    def write(self, change):
+        # on_commit callbacks do not run inside a TestCase's transaction otherwise
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+    async def receive(self, subscription):
+        event = await subscription.get(timeout=2)
+        self.assertIsNotNone(event)
+        return event.name, event.data
+
+    async def test_status_changes_are_published_per_project(self):
+        broker = events.get_broker()
+        subscription = broker.subscribe({events.project_channel(self.project.pk)})
+        self.addCleanup(subscription.close)
+
+        def update():
+            self.task.status = 'In Progress'
+            self.task.save()
+            self.task.save()  # Unchanged: no event
+            self.task.description = 'Not a status change'
+            self.task.save()
+            AuditTask.objects.create(project=self.other_project, name='Elsewhere')
+        await sync_to_async(self.write)(update)
+        self.assertEqual(await self.receive(subscription), ('task.status', {
+            'id': self.task.pk, 'status': 'In Progress', 'previous_status': 'To Do', 'project': self.project.pk,
+        }))
+        self.assertIsNone(await subscription.get(timeout=0.1))
+
+        await sync_to_async(self.write)(lambda: AuditTask.objects.filter(pk=self.task.pk).update(status='Completed'))
+        self.assertEqual((await self.receive(subscription))[1]['status'], 'Completed')
+
+        task_pk, project_pk = self.task.pk, self.project.pk
+        await sync_to_async(self.write)(self.project.delete)
+        self.assertEqual(
+            [await self.receive(subscription), await self.receive(subscription)],
+            [('task.status', {'id': task_pk, 'status': None, 'previous_status': 'Completed', 'project': project_pk}),
+             ('project.status', {'id': project_pk, 'status': None, 'previous_status': 'Pending'})],
+        )
+
+    async def test_slow_subscribers_are_told_to_resync(self):
+        subscription = events.get_broker().subscribe({events.project_channel(self.project.pk)}, max_pending=1)
+        self.addCleanup(subscription.close)
+        await sync_to_async(self.write)(lambda: AuditTask.objects.bulk_create([
+            AuditTask(project=self.project, name=f'Burst task {i}') for i in range(3)
+        ]))
+        self.assertEqual((await self.receive(subscription))[0], 'resync')
+        self.assertIsNone(await subscription.get(timeout=0.1))
+
+    async def test_event_stream(self):
+        with self.settings(AUDIT_EVENTS_MAX_DURATION=1, AUDIT_EVENTS_KEEPALIVE=0.2):
+            response = await self.async_client.get(
+                self.url, {'projects': str(self.project.pk), 'dashboard': '1'},
+                headers={**self.headers, 'Accept': 'text/event-stream'},
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = response.streaming_content
+            self.assertEqual(await anext(stream), b'retry: 2000\n\n')
+            self.assertIn(b'event: dashboard\ndata: {"project_status_summary":', await anext(stream))
+
+            def complete():
+                self.task.status = 'Completed'
+                self.task.save()
+            await sync_to_async(self.write)(complete)
+            received = [await anext(stream), await anext(stream)]
+            self.assertIn(b'event: dashboard\n', received[0])
+            self.assertIn(b'"status":"Completed"', received[0])
+            self.assertTrue(received[1].startswith(b'event: task.status\n'))
+
+            # Idle streams send keep-alives, and end (unsubscribing) after the maximum duration
+            rest = [chunk async for chunk in stream]
+        self.assertTrue(rest)
+        self.assertEqual(set(rest), {b': keepalive\n\n'})
+        self.assertFalse(events.get_broker().has_subscribers())
+
+    async def test_event_stream_errors(self):
+        response = await self.async_client.get(self.url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = await self.async_client.get(self.url, {'projects': 'x'}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = await self.async_client.get(self.url, {'dashboard': '1'}, headers={'Accept': 'text/event-stream'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # Not under WSGI
+        self.client.force_authenticate(user=self.user)
+        response = await sync_to_async(self.client.get)(self.url, {'dashboard': '1'})
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+class TransactionDatasetAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='datasetuser', password='datasetpass123')
+        self.project = AuditProject.objects.create(name='Dataset Project')
+        self.client.force_authenticate(user=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        # Small blocks, so the test files are read in several of them
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, AUDIT_UPLOAD_SESSION_DIR=os.path.join(self.media_root, 'upload_sessions'),
+            AUDIT_DATASET_BLOCK_SIZE=256,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.list_url = reverse('audit_management:dataset-list')
+
+    def make_csv(self, rows=40, bad_row=None):
+        lines = ['TransactionID,ClientID,BuySell,Timestamp,Price,Quantity,Amount,Comment']
+        for i in range(rows):
+            price = 'unknown' if i == bad_row else f'{100 + i}.5'
+            # Comment is empty in the first block
+            comment = 'late fill' if i == rows - 1 else ''
+            lines.append(f'{i + 1},C{i % 3},{"Buy" if i % 2 else "Sell"},2023-01-{i % 28 + 1:02d} 10:00:00,{price},{i + 1},{(100 + i) * (i + 1)},{comment}')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def create_dataset(self, content, project=None):
+        project = project or self.project
+        document = ProjectDocument.objects.create(
+            project=project, name='Ledger', file=SimpleUploadedFile('ledger.csv', content, content_type='text/csv'),
+        )
+        response = self.client.post(self.list_url, {
+            'project': self.project.pk, 'name': '2023 ledger', 'source_description': 'ERP export',
+            'source_document': document.pk,
+        }, format='json')
+        return response
+
+    def test_ingestion(self):
+        response = self.create_dataset(self.make_csv())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['status'], 'New')
+        self.assertEqual(response.data['uploaded_by'], self.user.pk)
+
+        self.assertEqual(datasets.run_pending_ingestions(), 1)
+        self.assertEqual(datasets.run_pending_ingestions(), 0)
+
+        detail_url = reverse('audit_management:dataset-detail', kwargs={'pk': response.data['id']})
+        data = self.client.get(detail_url).data
+        self.assertEqual(data['status'], 'Uploaded', data['error_message'])
+        self.assertEqual(data['record_count'], 40)
+        types = {column['name']: column['type'] for column in data['data_schema_info']['columns']}
+        self.assertEqual(types['TransactionID'], 'int64')
+        self.assertEqual(types['Price'], 'double')
+        self.assertEqual(types['BuySell'], 'string')
+        self.assertEqual(types['Comment'], 'string')
+        self.assertTrue(types['Timestamp'].startswith('timestamp'))
+        self.assertEqual(data['data_schema_info']['columns'][-1]['null_count'], 39)
+        self.assertEqual(data['data_schema_info']['timestamp_column'], 'Timestamp')
+        self.assertEqual(data['data_time_range_start'], '2023-01-01T10:00:00Z')
+        self.assertEqual(data['data_time_range_end'], '2023-01-28T10:00:00Z')
+
+        # Read back memory-mapped, in the blocks it was parsed in
+        dataset = TransactionDataset.objects.get(pk=data['id'])
+        reader = datasets.open_dataset(dataset)
+        self.assertGreater(reader.num_record_batches, 1)
+        amounts = [value for batch in datasets.iter_batches(dataset, ['Amount']) for value in batch.column(0).to_pylist()]
+        self.assertEqual(amounts, [(100 + i) * (i + 1) for i in range(40)])
+
+        path = os.path.join(self.media_root, dataset.data_location_uri)
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(detail_url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(path))
+
+    def test_invalid_file_and_requeue(self):
+        response = self.create_dataset(self.make_csv(bad_row=30))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        datasets.run_pending_ingestions()
+        dataset = TransactionDataset.objects.get(pk=response.data['id'])
+        self.assertEqual(dataset.status, 'Error')
+        self.assertIn("'unknown'", dataset.error_message)
+        self.assertEqual(dataset.data_location_uri, '')
+
+        ingest_url = reverse('audit_management:dataset-ingest', kwargs={'pk': dataset.pk})
+        response = self.client.post(ingest_url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'New')
+        self.assertEqual(response.data['error_message'], '')
+
+        # Claimed by a worker
+        self.assertEqual(datasets.claim_dataset().pk, dataset.pk)
+        self.assertEqual(self.client.post(ingest_url).status_code, status.HTTP_409_CONFLICT)
+        detail_url = reverse('audit_management:dataset-detail', kwargs={'pk': dataset.pk})
+        self.assertEqual(self.client.delete(detail_url).status_code, status.HTTP_409_CONFLICT)
+        # ... that died: once its lease has run out the dataset can be queued again
+        TransactionDataset.objects.filter(pk=dataset.pk).update(lease_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(self.client.post(ingest_url).status_code, status.HTTP_202_ACCEPTED)
+        dataset.refresh_from_db()
+
+        for content, message in ((b'', 'not a readable CSV'), (b'A,A\n1,2\n', 'more than once'), (b'A,B\n', 'no transactions')):
+            dataset.source_document.file.delete(save=False)
+            dataset.source_document.file.save('ledger.csv', SimpleUploadedFile('ledger.csv', content))
+            datasets.ingest_dataset(dataset)
+            self.assertEqual(dataset.status, 'Error')
+            self.assertIn(message, dataset.error_message)
+
+    def test_stale_claims_are_requeued_then_failed(self):
+        dataset_id = self.create_dataset(self.make_csv()).data['id']
+        for attempt in range(1, 4):
+            self.assertEqual(str(datasets.claim_dataset().pk), dataset_id)
+            self.assertIsNone(datasets.claim_dataset())  # Claimed datasets cannot be claimed twice
+            self.assertEqual(datasets.requeue_stale_datasets(), 0)
+            TransactionDataset.objects.filter(pk=dataset_id).update(lease_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+            self.assertEqual(datasets.requeue_stale_datasets(), 1)
+        dataset = TransactionDataset.objects.get(pk=dataset_id)
+        self.assertEqual((dataset.status, dataset.ingest_attempts), ('Error', 3))
+        self.assertIn('stopped responding', dataset.error_message)
+
+        # Queued again by hand, it gets a fresh set of attempts
+        self.client.post(reverse('audit_management:dataset-ingest', kwargs={'pk': dataset_id}))
+        self.assertEqual(datasets.run_pending_ingestions(), 1)
+        dataset.refresh_from_db()
+        self.assertEqual((dataset.status, dataset.ingest_attempts, dataset.lease_expires_at), ('Uploaded', 1, None))
+
+    def test_lease_is_renewed_and_lost(self):
+        dataset_id = self.create_dataset(self.make_csv()).data['id']
+        dataset = datasets.claim_dataset()
+        claimed_until = dataset.lease_expires_at
+        # Renewed after every block (heartbeats are not throttled here), then released
+        with mock.patch('audit_management.leases.HEARTBEAT_SECONDS', 0), CaptureQueriesContext(connection) as queries:
+            datasets.ingest_dataset(dataset)
+        updates = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE') and TransactionDataset._meta.db_table in query['sql']]
+        self.assertGreater(len(updates), 2)
+        dataset = TransactionDataset.objects.get(pk=dataset_id)
+        self.assertEqual((dataset.status, dataset.lease_expires_at), ('Uploaded', None))
+
+        # Requeued and claimed by another worker meanwhile: the first one's result is dropped
+        TransactionDataset.objects.filter(pk=dataset_id).update(status='New')
+        first = datasets.claim_dataset()
+        TransactionDataset.objects.filter(pk=dataset_id).update(lease_expires_at=claimed_until - datetime.timedelta(minutes=20))
+        datasets.requeue_stale_datasets()
+        second = datasets.claim_dataset()
+        with mock.patch('audit_management.leases.HEARTBEAT_SECONDS', 0), \
+                self.assertLogs('audit_management.datasets', 'WARNING'):
+            datasets.ingest_dataset(first)
+        dataset = TransactionDataset.objects.get(pk=dataset_id)
+        self.assertEqual((dataset.status, dataset.lease_expires_at), ('Uploading', second.lease_expires_at))
+        datasets.ingest_dataset(second)
+        self.assertEqual(TransactionDataset.objects.get(pk=dataset_id).status, 'Uploaded')
+
+    def test_document_must_belong_to_project(self):
+        other = AuditProject.objects.create(name='Other Dataset Project')
+        response = self.create_dataset(self.make_csv(), project=other)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('source_document', response.data)
+
+
+class AnomalyDetectionAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='detectionuser', password='detectionpass123')
+        self.project = AuditProject.objects.create(name='Detection Project')
+        self.client.force_authenticate(user=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, AUDIT_UPLOAD_SESSION_DIR=os.path.join(self.media_root, 'upload_sessions'),
+            AUDIT_DATASET_BLOCK_SIZE=16 * 1024,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        detection.detector_cache.clear()
+        self.addCleanup(detection.detector_cache.clear)
+        self.runs_url = reverse('audit_management:detection-run-list')
+        self.dataset = self.make_dataset()
+
+    def make_dataset(self, rows=3000, anomalies=30):
+        # Like the prototype notebook: normal trades, and trades with a huge quantity
+        rng = np.random.default_rng(7)
+        quantity = rng.integers(10, 500, rows)
+        quantity[:anomalies] = rng.integers(20000, 50000, anomalies)
+        price = rng.normal(100, 5, rows).round(2)
+        lines = ['TransactionID,SecurityID,Price,Quantity,Amount']
+        for i in range(rows):
+            lines.append(f'T{i},SEC_A,{price[i]},{quantity[i]},{round(price[i] * quantity[i], 2)}')
+        document = ProjectDocument.objects.create(
+            project=self.project, name='Trades',
+            file=SimpleUploadedFile('trades.csv', ('\n'.join(lines) + '\n').encode('utf-8')),
+        )
+        dataset = TransactionDataset.objects.create(project=self.project, name='Trades', source_document=document)
+        datasets.ingest_dataset(dataset)
+        self.assertEqual(dataset.status, 'Uploaded', dataset.error_message)
+        return dataset
+
+    def queue(self, expected_status=status.HTTP_201_CREATED, **data):
+        response = self.client.post(self.runs_url, {'dataset': self.dataset.pk, **data}, format='json')
+        self.assertEqual(response.status_code, expected_status, response.data)
+        return response.data
+
+    def test_detection_run(self):
+        run = self.queue(sensitivity_level='low')
+        self.assertEqual(run['status'], 'PENDING')
+        self.assertEqual(run['project'], self.project.pk)
+        self.assertEqual(run['parameters_used']['features'], ['Amount', 'Quantity', 'Price'])
+        self.assertEqual(run['parameters_used']['contamination'], 0.01)
+        self.assertEqual(run['parameters_used']['id_column'], 'TransactionID')
+
+        self.assertEqual(detection.run_pending_detections(workers=1), 1)
+        run = self.client.get(reverse('audit_management:detection-run-detail', kwargs={'pk': run['id']})).data
+        self.assertEqual(run['status'], 'COMPLETED', run['error_message'])
+        summary = run['summary_info']
+        self.assertEqual(summary['records_scored'], 3000)
+        self.assertEqual(summary['model'], 'fitted')
+        self.assertAlmostEqual(summary['anomalies_found'], 30, delta=5)
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, 'Analyzed')
+
+        # The injected trades are the ones flagged, written in source order
+        results = AnomalyDetectionRun.objects.get(pk=run['id']).ai_results_reference_id
+        with open(os.path.join(self.media_root, results), 'rb') as file:
+            table = pa.ipc.open_file(file).read_all()
+        self.assertEqual(table.num_rows, summary['anomalies_found'])
+        rows = table.column('row').to_pylist()
+        self.assertEqual(rows, sorted(rows))
+        scores = table.column('anomaly_score').to_pylist()
+        self.assertGreater(min(scores), 0)
+        self.assertEqual(max(scores), summary['max_score'])
+        injected = {f'T{i}' for i in range(30)}
+        self.assertGreaterEqual(len(injected & set(table.column('transaction_id').to_pylist())), 27)
+        self.assertEqual(table.column_names, ['row', 'transaction_id', 'anomaly_score', 'Amount', 'Quantity', 'Price'])
+
+        # The fitted detector is reused by this process, and by others through the storage
+        self.queue(sensitivity_level='low')
+        detection.run_pending_detections(workers=1)
+        detection.detector_cache.clear()
+        self.queue(sensitivity_level='low')
+        detection.run_pending_detections(workers=1)
+        sources = list(AnomalyDetectionRun.objects.order_by('requested_at').values_list('summary_info__model', flat=True))
+        self.assertEqual(sources, ['fitted', 'memory', 'storage'])
+
+    def test_dataset_status_and_stale_runs(self):
+        ingest_url = reverse('audit_management:dataset-ingest', kwargs={'pk': self.dataset.pk})
+        expired = timezone.now() - datetime.timedelta(seconds=1)
+
+        # The dataset was queued for ingestion again after the run: the run fails, and
+        # leaves the ingestion queued
+        run_id = self.queue()['id']
+        self.assertEqual(self.client.post(ingest_url).status_code, status.HTTP_202_ACCEPTED)
+        detection.run_pending_detections(workers=1)
+        run = AnomalyDetectionRun.objects.get(pk=run_id)
+        self.assertEqual(run.status, 'FAILED')
+        self.assertIn('not ingested', run.error_message)
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, 'New')
+        self.assertEqual(datasets.run_pending_ingestions(), 1)
+
+        # Claimed by a worker that dies while scoring
+        run_id = self.queue()['id']
+        run = detection.claim_run()
+        TransactionDataset.objects.filter(pk=self.dataset.pk).update(status='Processing')
+        detail_url = reverse('audit_management:detection-run-detail', kwargs={'pk': run_id})
+        self.assertEqual(self.client.delete(detail_url).status_code, status.HTTP_409_CONFLICT)
+        # Ingestion would replace the file the run reads
+        self.assertEqual(self.client.post(ingest_url).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(detection.requeue_stale_runs(), 0)
+
+        # Once its lease has run out the run is executed again
+        AnomalyDetectionRun.objects.filter(pk=run_id).update(lease_expires_at=expired)
+        self.assertEqual(detection.run_pending_detections(workers=1), 1)
+        run = AnomalyDetectionRun.objects.get(pk=run_id)
+        self.assertEqual((run.status, run.attempts, run.lease_expires_at), ('COMPLETED', 2, None))
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, 'Analyzed')
+
+        # ... or failed after too many claims, and its dataset is no longer Processing
+        run_id = self.queue()['id']
+        for attempt in range(3):
+            detection.claim_run()
+            TransactionDataset.objects.filter(pk=self.dataset.pk).update(status='Processing')
+            AnomalyDetectionRun.objects.filter(pk=run_id).update(lease_expires_at=expired)
+            self.assertEqual(detection.requeue_stale_runs(), 1)
+        run = AnomalyDetectionRun.objects.get(pk=run_id)
+        self.assertEqual((run.status, run.attempts), ('FAILED', 3))
+        self.assertIn('stopped responding', run.error_message)
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, 'Analyzed')
+
+        # A stale run can be deleted
+        run_id = self.queue()['id']
+        detection.claim_run()
+        TransactionDataset.objects.filter(pk=self.dataset.pk).update(status='Processing')
+        AnomalyDetectionRun.objects.filter(pk=run_id).update(lease_expires_at=expired)
+        detail_url = reverse('audit_management:detection-run-detail', kwargs={'pk': run_id})
+        self.assertEqual(self.client.delete(detail_url).status_code, status.HTTP_204_NO_CONTENT)
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, 'Analyzed')
+
+    def test_lost_lease(self):
+        run_id = self.queue()['id']
+        run = detection.claim_run()
+        # Requeued and claimed again meanwhile: this worker's result is dropped
+        AnomalyDetectionRun.objects.filter(pk=run_id).update(lease_expires_at=run.lease_expires_at - datetime.timedelta(hours=1))
+        detection.requeue_stale_runs()
+        other = detection.claim_run()
+        with mock.patch('audit_management.leases.HEARTBEAT_SECONDS', 0), \
+                self.assertLogs('audit_management.detection', 'WARNING'):
+            detection.run_detection(run, workers=1)
+        stored = AnomalyDetectionRun.objects.get(pk=run_id)
+        self.assertEqual((stored.status, stored.lease_expires_at), ('PROCESSING', other.lease_expires_at))
+        self.assertEqual(detection.run_detection(other, workers=1).status, 'COMPLETED')
+
+    def test_detected_anomaly_ingestion(self):
+        run = self.queue()
+        detection.run_pending_detections(workers=1)
+        run = AnomalyDetectionRun.objects.get(pk=run['id'])
+        found = run.summary_info['anomalies_found']
+        self.assertEqual(run.anomalies_ingested, found)
+        self.assertIsNotNone(run.anomalies_ingested_at)
+        self.assertEqual(counters.get_anomaly_counts(run.pk), {'New': found})
+        with open(os.path.join(self.media_root, run.ai_results_reference_id), 'rb') as file:
+            table = pa.ipc.open_file(file).read_all()
+        stored = {
+            anomaly.transaction_identifier_in_source: anomaly
+            for anomaly in DetectedAnomaly.objects.filter(detection_run=run)
+        }
+        self.assertEqual(set(stored), set(table.column('transaction_id').to_pylist()))
+        first = table.slice(0, 1).to_pylist()[0]
+        anomaly = stored[first['transaction_id']]
+        self.assertEqual(anomaly.status, 'New')
+        self.assertEqual(anomaly.anomaly_score, first['anomaly_score'])
+        self.assertEqual(anomaly.raw_transaction_details_preview, {
+            'row': first['row'], 'Amount': first['Amount'], 'Quantity': first['Quantity'], 'Price': first['Price'],
+        })
+
+        # A crash after the first batch: the next ingestion resumes after it
+        DetectedAnomaly.objects.filter(detection_run=run).delete()
+        counters.recount_anomalies(run.pk)
+        AnomalyDetectionRun.objects.filter(pk=run.pk).update(anomalies_ingested=0, anomalies_ingested_at=None)
+        insert = anomalies.insert_anomalies
+        calls = []
+
+        def crash_on_second_batch(batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise RuntimeError("Worker killed")
+            return insert(batch)
+
+        with mock.patch.object(anomalies, 'insert_anomalies', crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                anomalies.ingest_run(run, batch_size=8)
+        run.refresh_from_db()
+        self.assertEqual(run.anomalies_ingested, 8)
+        self.assertIsNone(run.anomalies_ingested_at)
+        self.assertEqual(DetectedAnomaly.objects.filter(detection_run=run).count(), 8)
+
+        self.assertEqual(anomalies.run_pending_ingestions(batch_size=8), 1)
+        self.assertEqual(DetectedAnomaly.objects.filter(detection_run=run).count(), found)
+        self.assertEqual(anomalies.run_pending_ingestions(), 0)
+
+        # Ingesting again from the start creates no duplicates and keeps the auditors' work
+        anomaly = DetectedAnomaly.objects.get(detection_run=run, transaction_identifier_in_source=first['transaction_id'])
+        anomalies.move_anomalies(run.pk, DetectedAnomaly.objects.filter(pk=anomaly.pk), 'FalsePositive')
+        stdout = io.StringIO()
+        call_command('ingest_detected_anomalies', run=[str(run.pk)], stdout=stdout)
+        self.assertIn(f"{found} flagged transaction(s) ingested", stdout.getvalue())
+        self.assertEqual(DetectedAnomaly.objects.filter(detection_run=run).count(), found)
+        self.assertEqual(DetectedAnomaly.objects.get(pk=anomaly.pk).status, 'FalsePositive')
+        # Skipped rows were not counted again
+        self.assertEqual(counters.recount_anomalies(run.pk, fix=False), {})
+        with self.assertRaises(CommandError):
+            call_command('ingest_detected_anomalies', run=['00000000-0000-0000-0000-000000000000'])
+
+    def test_parallel_scoring_matches(self):
+        parameters = detection.resolve_parameters(self.dataset)
+        detector, _ = detection.get_detector(self.dataset, parameters)
+        path = os.path.join(self.media_root, self.dataset.data_location_uri)
+        self.assertGreater(scoring.open_batches(path).num_record_batches, 2)
+        serial = list(scoring.score_file(detector, path, workers=1))
+        parallel = list(scoring.score_file(detector, path, workers=2))
+        self.assertEqual(len(parallel), len(serial))
+        for (_, positions, scores, scored), (_, expected_positions, expected_scores, expected_scored) in zip(parallel, serial):
+            self.assertEqual(positions.tolist(), expected_positions.tolist())
+            self.assertEqual(scores.tolist(), expected_scores.tolist())
+            self.assertEqual(scored, expected_scored)
+
+    def test_streaming_scoring(self):
+        run = self.queue()
+        detection.run_pending_detections(workers=1)
+        run = AnomalyDetectionRun.objects.get(pk=run['id'])
+        with open(os.path.join(self.media_root, run.ai_results_reference_id), 'rb') as file:
+            expected = pa.ipc.open_file(file).read_all()
+
+        # The source CSV, scored block by block with the run's detector, flags the same rows
+        output = os.path.join(self.media_root, 'anomalies.csv')
+        stdout = io.StringIO()
+        call_command('score_transactions', self.dataset.source_document.file.path, output,
+                     run=str(run.pk), block_size=8192, workers=2, stdout=stdout)
+        self.assertIn(f"flagged {expected.num_rows}", stdout.getvalue())
+        with open(output, newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row['transaction_id'] for row in rows], expected.column('transaction_id').to_pylist())
+        for row, score in zip(rows, expected.column('anomaly_score').to_pylist()):
+            self.assertAlmostEqual(float(row['anomaly_score']), score)
+
+        # Only scores above the threshold
+        output = os.path.join(self.media_root, 'anomalies.arrow')
+        call_command('score_transactions', self.dataset.source_document.file.path, output,
+                     run=str(run.pk), threshold=0.1, stdout=io.StringIO())
+        with open(output, 'rb') as file:
+            strict = pa.ipc.open_file(file).read_all()
+        self.assertLess(strict.num_rows, expected.num_rows)
+        self.assertGreater(min(strict.column('anomaly_score').to_pylist()), 0.1)
+
+        with self.assertRaises(CommandError):
+            call_command('score_transactions', output, output, run='00000000-0000-0000-0000-000000000000')
+
+    def test_invalid_runs(self):
+        errors = self.queue(status.HTTP_400_BAD_REQUEST, parameters_used={'features': ['Amount', 'Fee']})
+        self.assertIn('Fee', str(errors['parameters_used']))
+        errors = self.queue(status.HTTP_400_BAD_REQUEST, parameters_used={'features': ['SecurityID']})
+        self.assertIn('not numeric', str(errors['parameters_used']))
+        errors = self.queue(status.HTTP_400_BAD_REQUEST, parameters_used={'depth': 3})
+        self.assertIn('depth', str(errors['parameters_used']))
+        TransactionDataset.objects.filter(pk=self.dataset.pk).update(status='Uploading')
+        self.assertIn('dataset', self.queue(status.HTTP_400_BAD_REQUEST))
+
+
+class SyntheticTransactionTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_generated_transactions(self):
+        batches = list(synthetic.generate_batches(25000, seed=7, anomaly_type_column=True, chunk_rows=10000))
+        self.assertEqual([batch.num_rows for batch in batches], [10000, 10000, 5000])
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.column_names, [
+            'TransactionID', 'ClientID', 'SecurityID', 'BuySell', 'Quantity', 'Price', 'Timestamp', 'Amount',
+            'IsAnomaly_GroundTruth', 'AnomalyType',
+        ])
+        self.assertEqual(table.column('TransactionID').to_pylist(), list(range(1, 25001)))
+        self.assertEqual(set(table.column('SecurityID').to_pylist()), {'SEC_A', 'SEC_B', 'SEC_C'})
+
+        # 3% of every chunk, of each type, labelled
+        labels = table.column('IsAnomaly_GroundTruth').to_numpy()
+        types = table.column('AnomalyType').to_pylist()
+        self.assertEqual(int(labels.sum()), 750)
+        self.assertEqual(set(types), {None, *synthetic.ANOMALY_TYPES})
+        self.assertEqual([label == 1 for label in labels], [kind is not None for kind in types])
+        quantity = table.column('Quantity').to_numpy()
+        self.assertTrue((quantity[labels == 0] < 500).all())
+        high_quantity = quantity[[kind == 'high_quantity' for kind in types]]
+        self.assertTrue(((high_quantity >= 3000) & (high_quantity < 6000)).all())
+        np.testing.assert_allclose(
+            table.column('Amount').to_numpy(), (quantity * table.column('Price').to_numpy()).round(2),
+        )
+
+        # In order, within trading hours
+        timestamps = table.column('Timestamp').to_pylist()
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertGreaterEqual(timestamps[0], datetime.datetime(2023, 1, 1, 9, 0))
+        self.assertTrue(all(9 <= value.hour < 17 for value in timestamps))
+
+        # Reproducible from the seed
+        again = pa.Table.from_batches(synthetic.generate_batches(25000, seed=7, anomaly_type_column=True, chunk_rows=10000))
+        self.assertTrue(again.equals(table))
+        other = pa.Table.from_batches(synthetic.generate_batches(25000, seed=8, anomaly_type_column=True, chunk_rows=10000))
+        self.assertFalse(other.equals(table))
+
+        only = pa.Table.from_batches(synthetic.generate_batches(
+            1000, securities=[synthetic.Security('SEC_X', 10.0, 0.1)], anomaly_types={'price_dev': 1},
+            anomaly_rate=0.1, labels=False,
+        ))
+        self.assertNotIn('IsAnomaly_GroundTruth', only.column_names)
+        self.assertEqual(set(only.column('SecurityID').to_pylist()), {'SEC_X'})
+        price = only.column('Price').to_numpy()
+        self.assertEqual(int(((price > 12) | (price < 8)).sum()), 100)
+        with self.assertRaises(ValueError):
+            synthetic.generate_batches(10, anomaly_types={'typo': 1})
+
+    def test_generate_transactions_command(self):
+        output = os.path.join(self.directory, 'transactions.csv')
+        stdout = io.StringIO()
+        call_command('generate_transactions', output, rows=5000, seed=1, stdout=stdout,
+                     securities=['SEC_A:100:5:3', 'SEC_D:20:1'], anomaly_types=['high_amount'])
+        self.assertIn('Wrote 5000 transactions', stdout.getvalue())
+        with open(output, newline='') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 5000)
+        self.assertEqual(sum(row['IsAnomaly_GroundTruth'] == '1' for row in rows), 150)
+        shares = [row['SecurityID'] for row in rows].count('SEC_A') / len(rows)
+        self.assertAlmostEqual(shares, 0.75, delta=0.03)
+
+        # The same transactions as Parquet, readable by ingestion's Arrow
+        parquet = os.path.join(self.directory, 'transactions.parquet')
+        call_command('generate_transactions', parquet, rows=5000, seed=1, stdout=io.StringIO(),
+                     securities=['SEC_A:100:5:3', 'SEC_D:20:1'], anomaly_types=['high_amount'])
+        table = pq.read_table(parquet)
+        self.assertEqual(table.column('TransactionID').to_pylist(), [int(row['TransactionID']) for row in rows])
+        self.assertEqual(table.column('Amount').to_pylist(), [float(row['Amount']) for row in rows])
+
+        for options in ({'securities': ['SEC_A:cheap:5']}, {'anomaly_types': ['typo']}, {'rows': 0},
+                        {'anomaly_rate': 1.5}):
+            with self.assertRaises(CommandError):
+                call_command('generate_transactions', output, stdout=io.StringIO(), **options)
+
+
+class DetectedAnomalyAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='triageuser', password='triagepass123')
+        self.other = User.objects.create_user(username='otherauditor', password='otherpass123')
+        self.client.force_authenticate(user=self.user)
+        project = AuditProject.objects.create(name='Triage Project')
+        dataset = TransactionDataset.objects.create(project=project, name='Trades', status='Analyzed')
+        self.run = AnomalyDetectionRun.objects.create(project=project, dataset=dataset, status='COMPLETED')
+        # 300 anomalies, scores from 0.299 down to 0, pairs of them tied
+        anomalies.insert_anomalies(anomalies.anomaly_rows(self.run, pa.table({
+            'row': pa.array(range(300), pa.int64()),
+            'transaction_id': [f'T{row}' for row in range(300)],
+            'anomaly_score': [(row // 2 * 2) / 1000 for row in range(300)],
+        })))
+        counters.recount_anomalies(self.run.pk)
+        self.url = reverse('audit_management:anomaly-list')
+        self.bulk_url = reverse('audit_management:anomaly-bulk-status')
+        self.counts_url = reverse('audit_management:anomaly-counts')
+
+    def counts(self):
+        response = self.client.get(self.counts_url, {'run': str(self.run.pk)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Always the true counts
+        self.assertEqual(response.data['counts'], counters.count_statuses(
+            DetectedAnomaly, queryset=DetectedAnomaly.objects.filter(detection_run=self.run),
+        ))
+        return response.data['counts']
+
+    def test_top_k_and_keyset_paging(self):
+        response = self.client.get(self.url, {'run': str(self.run.pk), 'page_size': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['anomaly_score'] for item in response.data['results']], [0.298, 0.298, 0.296, 0.296, 0.294])
+
+        # Every anomaly once, in score order, across ties and page boundaries
+        seen = []
+        url = f'{self.url}?run={self.run.pk}&page_size=7'
+        while url:
+            page = self.client.get(url).data
+            seen += page['results']
+            url = page['next']
+        self.assertEqual(len({item['id'] for item in seen}), 300)
+        scores = [item['anomaly_score'] for item in seen]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+        # Each page is one range of the (run, score) index
+        queryset = DetectedAnomaly.objects.filter(detection_run=self.run).order_by('-anomaly_score', '-pk')[:51]
+        if connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertIn('anomaly_run_score_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+        DetectedAnomaly.objects.filter(transaction_identifier_in_source__in=['T0', 'T1']).update(
+            status='Escalated', assigned_to_auditor=self.user,
+        )
+
+        def listed(**params):
+            response = self.client.get(self.url, {'run': str(self.run.pk), 'page_size': 500, **params})
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            return sorted(item['transaction_identifier_in_source'] for item in response.data['results'])
+
+        self.assertEqual(listed(status='Escalated,Closed'), ['T0', 'T1'])
+        self.assertEqual(listed(assignee='me'), ['T0', 'T1'])
+        self.assertEqual(listed(assignee=str(self.other.pk)), [])
+        self.assertEqual(len(listed(assignee='none')), 298)
+        self.assertEqual(listed(min_score='0.29', max_score='0.293'), ['T290', 'T291', 'T292', 'T293'])
+        for params in ({'status': 'Open'}, {'assignee': 'someone'}, {'min_score': 'high'}, {'run': 'latest'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(AUDIT_JWT_STATELESS_READS=True)
+    def test_assignee_me_with_stateless_reads(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        DetectedAnomaly.objects.filter(transaction_identifier_in_source='T7').update(assigned_to_auditor=self.user)
+        self.client.force_authenticate(user=None)
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'triageuser', 'password': 'triagepass123'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        response = self.client.get(self.url, {'run': str(self.run.pk), 'assignee': 'me'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual([item['transaction_identifier_in_source'] for item in response.data['results']], ['T7'])
+
+    def test_bulk_status_transitions(self):
+        self.assertEqual(self.counts(), {'New': 300})
+
+        # Everything under 0.1 that is still New is a false positive: one UPDATE
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'{self.bulk_url}?run={self.run.pk}&status=New&max_score=0.0995', {'status': 'FalsePositive'}, format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['moved'], 100)
+        self.assertEqual(response.data['counts'], {'FalsePositive': 100, 'New': 200})
+        updates = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE') and DetectedAnomaly._meta.db_table in query['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.counts(), {'FalsePositive': 100, 'New': 200})
+
+        # Selected ids, whatever their status
+        ids = list(DetectedAnomaly.objects.filter(transaction_identifier_in_source__in=['T0', 'T299']).values_list('pk', flat=True))
+        response = self.client.post(f'{self.bulk_url}?run={self.run.pk}', {'status': 'Escalated', 'ids': [str(pk) for pk in ids]}, format='json')
+        self.assertEqual(response.data['moved_from'], {'New': 1, 'FalsePositive': 1})
+        self.assertEqual(self.counts(), {'Escalated': 2, 'FalsePositive': 99, 'New': 199})
+
+        # Moving again changes nothing
+        response = self.client.post(f'{self.bulk_url}?run={self.run.pk}', {'status': 'Escalated', 'ids': [str(pk) for pk in ids]}, format='json')
+        self.assertEqual(response.data['moved'], 0)
+
+        # One anomaly at a time
+        anomaly = DetectedAnomaly.objects.get(transaction_identifier_in_source='T150')
+        detail = reverse('audit_management:anomaly-detail', kwargs={'pk': anomaly.pk})
+        response = self.client.patch(detail, {
+            'status': 'ActionRequired', 'auditor_notes': 'Ask the desk', 'assigned_to_auditor': self.other.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['assigned_to_auditor_username'], 'otherauditor')
+        response = self.client.patch(detail, {'anomaly_score': 0.0, 'transaction_identifier_in_source': 'X'}, format='json')
+        anomaly.refresh_from_db()
+        self.assertEqual((anomaly.anomaly_score, anomaly.transaction_identifier_in_source), (0.15, 'T150'))
+        self.assertEqual(self.counts(), {'ActionRequired': 1, 'Escalated': 2, 'FalsePositive': 99, 'New': 198})
+
+        self.assertEqual(self.client.post(self.bulk_url, {'status': 'Closed'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.post(f'{self.bulk_url}?run={self.run.pk}', {'status': 'Done'}, format='json').status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+        # The counters go with the run
+        call_command('reconcile_status_counters', stdout=io.StringIO())
+        scope = counters.anomaly_scope(self.run.pk)
+        self.run.delete()
+        self.assertFalse(StatusCounter.objects.filter(scope=scope).exists())
+
+
 class DashboardAPITests(APITestCase):
     def setUp(self):
         self.username = 'dashboarduser'
@@ -272,6 +2078,20 @@ class DashboardAPITests(APITestCase):
         # Overdue Tasks Count
         self.assertEqual(data.get('overdue_tasks_count'), 1)
 
+    def test_dashboard_summary_reads_counters(self):
+        AuditProject.objects.filter(name="P4").update(status="Cancelled")
+        response = self.client.get(self.dashboard_url, format='json')
+        project_summary = {s['status']: s['count'] for s in response.data['project_status_summary']}
+        self.assertEqual(project_summary, {'Pending': 1, 'In Progress': 1, 'Completed': 1, 'Cancelled': 1})
+
+        # Counter rows replace the GROUP BY scans: the status summaries take a single query
+        # regardless of table size (the other query counts overdue tasks; the user comes from
+        # the authentication cache).
+        for index in range(20):
+            AuditTask.objects.create(project=self.proj3, name=f"Extra {index}")
+        with self.assertNumQueries(2):
+            self.client.get(self.dashboard_url, format='json')
+
     def test_dashboard_summary_no_data(self):
         # Clear existing data created by main setUp
         AuditTask.objects.all().delete()
@@ -285,6 +2105,235 @@ class DashboardAPITests(APITestCase):
         self.assertEqual(data.get('overdue_tasks_count'), 0)
 
 
+class AsyncReadAPITests(APITestCase):
+    def setUp(self):
+        self.username = 'asyncuser'
+        self.password = 'asyncpass123'
+        self.user = User.objects.create_user(username=self.username, password=self.password, email='async@example.com')
+        token_response = self.client.post(reverse('token_obtain_pair'), {'username': self.username, 'password': self.password}, format='json')
+        self.access_token = token_response.data['access']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access_token)
+
+        self.project = AuditProject.objects.create(name='Async P1', status='In Progress', project_manager=self.user)
+        AuditProject.objects.create(name='Async P2', status='Pending')
+        yesterday = timezone.now().date() - datetime.timedelta(days=1)
+        self.task = AuditTask.objects.create(project=self.project, name='Async T1', status='To Do', due_date=yesterday)
+        AuditTask.objects.create(project=self.project, name='Async T2', status='Completed')
+
+    def test_async_views_match_sync_views(self):
+        pairs = [
+            (reverse('audit_management:hello'), reverse('audit_management:async-hello')),
+            (reverse('audit_management:dashboard-summary'), reverse('audit_management:async-dashboard-summary')),
+            (reverse('audit_management:project-list'), reverse('audit_management:async-project-list')),
+            (reverse('audit_management:task-list'), reverse('audit_management:async-task-list')),
+            (reverse('audit_management:project-detail', kwargs={'pk': self.project.pk}),
+             reverse('audit_management:async-project-detail', kwargs={'pk': self.project.pk})),
+            (reverse('audit_management:task-detail', kwargs={'pk': self.task.pk}),
+             reverse('audit_management:async-task-detail', kwargs={'pk': self.task.pk})),
+        ]
+        for sync_url, async_url in pairs:
+            with self.subTest(url=async_url):
+                sync_response = self.client.get(sync_url)
+                async_response = self.client.get(async_url)
+                self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+                self.assertEqual(async_response.json(), sync_response.json())
+
+    def test_async_list_pagination(self):
+        url = reverse('audit_management:async-project-list')
+        first = self.client.get(url, {'page_size': 1}).json()
+        self.assertEqual(first['results'][0]['name'], 'Async P2')
+        second = self.client.get(first['next']).json()
+        self.assertEqual(second['results'][0]['name'], 'Async P1')
+        self.assertIsNone(second['next'])
+
+    def test_async_errors(self):
+        response = self.client.get(reverse('audit_management:async-task-detail', kwargs={'pk': 999999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse('audit_management:async-project-list'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.client.credentials()
+        response = self.client.get(reverse('audit_management:async-dashboard-summary'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_dashboard_over_asgi(self):
+        response = await self.async_client.get(
+            reverse('audit_management:async-dashboard-summary'),
+            headers={'Authorization': f'Bearer {self.access_token}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['overdue_tasks_count'], 1)
+        self.assertEqual({s['status']: s['count'] for s in data['task_status_summary']}, {'To Do': 1, 'Completed': 1})
+
+
+class StatusCounterTests(TestCase):
+    def setUp(self):
+        self.project = AuditProject.objects.create(name='Counted Project')
+
+    def counts(self, model):
+        scope = model._meta.label_lower
+        return {
+            counter.status: counter.count
+            for counter in StatusCounter.objects.filter(scope=scope) if counter.count
+        }
+
+    def test_save_and_delete(self):
+        task = AuditTask.objects.create(project=self.project, name='T1')
+        self.assertEqual(self.counts(AuditTask), {'To Do': 1})
+        task.status = 'Blocked'
+        task.save()
+        self.assertEqual(self.counts(AuditTask), {'Blocked': 1})
+        task.save() # Unchanged status is not counted twice
+        self.assertEqual(self.counts(AuditTask), {'Blocked': 1})
+        task.delete()
+        self.assertEqual(self.counts(AuditTask), {})
+
+    def test_save_of_unloaded_instance_reads_stored_status(self):
+        task = AuditTask.objects.create(project=self.project, name='T1', status='Blocked')
+        AuditTask(pk=task.pk, project=self.project, name='T1', status='Completed', created_at=task.created_at).save()
+        self.assertEqual(self.counts(AuditTask), {'Completed': 1})
+
+    def test_bulk_create_and_bulk_update(self):
+        tasks = AuditTask.objects.bulk_create([
+            AuditTask(project=self.project, name=f'T{index}', status='To Do' if index % 2 else 'Blocked')
+            for index in range(6)
+        ])
+        self.assertEqual(self.counts(AuditTask), {'To Do': 3, 'Blocked': 3})
+        for task in tasks[:2]:
+            task.status = 'Completed'
+        AuditTask.objects.bulk_update(tasks[:2], ['status'])
+        self.assertEqual(self.counts(AuditTask), {'To Do': 2, 'Blocked': 2, 'Completed': 2})
+
+    def test_queryset_update_and_delete(self):
+        for index in range(4):
+            AuditTask.objects.create(project=self.project, name=f'T{index}')
+        AuditTask.objects.filter(name__in=['T0', 'T1']).update(status='In Review')
+        self.assertEqual(self.counts(AuditTask), {'To Do': 2, 'In Review': 2})
+        AuditTask.objects.update(status=Case(When(name='T3', then=Value('Blocked')), default='status'))
+        self.assertEqual(self.counts(AuditTask), {'To Do': 1, 'In Review': 2, 'Blocked': 1})
+        AuditTask.objects.filter(status='In Review').delete()
+        self.assertEqual(self.counts(AuditTask), {'To Do': 1, 'Blocked': 1})
+
+    def test_cascading_delete(self):
+        for index in range(3):
+            AuditTask.objects.create(project=self.project, name=f'T{index}')
+        self.project.delete()
+        self.assertEqual(self.counts(AuditTask), {})
+        self.assertEqual(self.counts(AuditProject), {})
+
+    def test_rolled_back_write_leaves_counters_alone(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                AuditProject.objects.create(name='Rolled Back')
+                raise RuntimeError
+        self.assertEqual(self.counts(AuditProject), {'Pending': 1})
+
+    def test_reconcile_command(self):
+        AuditTask.objects.create(project=self.project, name='T1')
+        call_command('reconcile_status_counters', stdout=io.StringIO())
+        StatusCounter.objects.filter(status='To Do').update(count=5)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_status_counters', stdout=io.StringIO())
+        call_command('reconcile_status_counters', '--fix', stdout=io.StringIO())
+        self.assertEqual(self.counts(AuditTask), {'To Do': 1})
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Seeds large tables and checks, via EXPLAIN, that the queries the list endpoints and the
+    dashboard actually run are answered from an index instead of a full table scan.
+    """
+    SEED_ROWS = int(os.environ.get('QUERY_PLAN_SEED_ROWS', '3000'))
+    LARGE_TABLES = (
+        AuditProject._meta.db_table,
+        AuditTask._meta.db_table,
+        ProjectDocument._meta.db_table,
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planuser', password='planpass123')
+        projects = AuditProject.objects.bulk_create([
+            AuditProject(name=f'Plan Project {index:06d}', status='Completed' if index % 10 else 'In Progress')
+            for index in range(cls.SEED_ROWS)
+        ])
+        today = timezone.now().date()
+        AuditTask.objects.bulk_create([
+            AuditTask(
+                project=projects[index % len(projects)],
+                name=f'Plan Task {index}',
+                # Most tasks of a mature installation are completed
+                status='Completed' if index % 20 else 'To Do',
+                due_date=today - datetime.timedelta(days=index % 60),
+            )
+            for index in range(cls.SEED_ROWS * 3)
+        ])
+        ProjectDocument.objects.bulk_create([
+            ProjectDocument(project=projects[index % len(projects)], name=f'Plan Doc {index}', file=f'plan/{index}.pdf')
+            for index in range(cls.SEED_ROWS)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+            cursor.execute('EXPLAIN ' + sql)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def full_scans(self, plan):
+        scans = []
+        for line in plan.splitlines():
+            line = line.strip()
+            for table in self.LARGE_TABLES:
+                if connection.vendor == 'sqlite':
+                    # "SCAN table" without "USING ... INDEX" reads every row
+                    if line.startswith(f'SCAN {table}') and 'INDEX' not in line:
+                        scans.append(line)
+                elif f'Seq Scan on {table}' in line:
+                    scans.append(line)
+        return scans
+
+    def assert_queries_use_indexes(self, url, expected_indexes=()):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        plans = []
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not any(table in sql for table in self.LARGE_TABLES):
+                continue
+            plan = self.explain(sql)
+            plans.append(plan)
+            self.assertEqual(self.full_scans(plan), [], f'{url}: full table scan in\n{sql}\n{plan}')
+        for index_name in expected_indexes:
+            self.assertTrue(any(index_name in plan for plan in plans), f'{url}: {index_name} unused in {plans}')
+        return response
+
+    def test_project_list_uses_created_index(self):
+        url = reverse('audit_management:project-list')
+        response = self.assert_queries_use_indexes(url, ['auditproject_created_idx'])
+        self.assert_queries_use_indexes(response.data['next'], ['auditproject_created_idx'])
+
+    def test_task_list_uses_project_created_index(self):
+        url = reverse('audit_management:task-list')
+        response = self.assert_queries_use_indexes(url, ['audittask_project_created_idx'])
+        self.assert_queries_use_indexes(response.data['next'], ['audittask_project_created_idx'])
+
+    def test_document_list_uses_uploaded_index(self):
+        url = reverse('audit_management:document-list')
+        response = self.assert_queries_use_indexes(url, ['projectdoc_uploaded_idx'])
+        self.assert_queries_use_indexes(response.data['next'], ['projectdoc_uploaded_idx'])
+
+    def test_dashboard_uses_open_due_index(self):
+        self.assert_queries_use_indexes(reverse('audit_management:dashboard-summary'), ['audittask_open_due_idx'])
+
+
 class ReportAPITests(APITestCase):
     def setUp(self):
         self.username = 'reportuser'
@@ -313,7 +2362,7 @@ class ReportAPITests(APITestCase):
         self.assertEqual(response['Content-Type'], 'text/csv')
         self.assertEqual(response['Content-Disposition'], 'attachment; filename="audit_projects_report.csv"')
 
-        content = response.content.decode('utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
         csv_reader = csv.reader(io.StringIO(content))
         rows = list(csv_reader)
 
@@ -342,14 +2391,166 @@ class ReportAPITests(APITestCase):
         AuditProject.objects.all().delete()
         response = self.client.get(self.report_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        content = response.content.decode('utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
         csv_reader = csv.reader(io.StringIO(content))
         rows = list(csv_reader)
         self.assertEqual(len(rows), 1) # Only header
         expected_header = ["Project Name", "Project Manager", "Status", "Start Date", "End Date", "Description", "Scope", "Objectives"]
         self.assertEqual(rows[0], expected_header)
 
+    def test_audit_project_csv_report_is_streamed(self):
+        response = self.client.get(self.report_url)
+        self.assertTrue(response.streaming)
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_audit_project_csv_report_gzip(self):
+        response = self.client.get(self.report_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][0], "CSV Project One")
+
+    def test_audit_project_csv_report_gzip_refused(self):
+        response = self.client.get(self.report_url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_audit_project_csv_report_spans_chunks(self):
+        for index in range(25):
+            AuditProject.objects.create(name=f"Bulk Project {index:02d}")
+        with self.settings(AUDIT_REPORT_CHUNK_SIZE=4):
+            response = self.client.get(self.report_url)
+            content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(len(rows), 28) # Header + 27 data rows
+        names = [row[0] for row in rows[1:]]
+        self.assertEqual(names, sorted(names))
+
     def test_csv_report_unauthenticated(self):
         self.client.credentials() # Clear authentication
         response = self.client.get(self.report_url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ReportJobAPITests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='jobuser', password='jobpass123')
+        self.client.force_authenticate(user=self.user)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.jobs_url = reverse('audit_management:report-job-list')
+        AuditProject.objects.create(name='Job Project A', status='Completed')
+        AuditProject.objects.create(name='Job Project B', status='Pending')
+
+    def submit(self, params=None, expected_status=status.HTTP_201_CREATED):
+        response = self.client.post(self.jobs_url, {'kind': 'projects_csv', 'params': params or {}}, format='json')
+        self.assertEqual(response.status_code, expected_status, response.data)
+        return response.data
+
+    def test_job_lifecycle(self):
+        job = self.submit({'statuses': ['Pending']})
+        self.assertEqual(job['status'], 'Pending')
+        self.assertIsNone(job['download_url'])
+        detail_url = reverse('audit_management:report-job-detail', kwargs={'pk': job['id']})
+        download_url = reverse('audit_management:report-job-download', kwargs={'pk': job['id']})
+        self.assertEqual(self.client.get(download_url).status_code, status.HTTP_409_CONFLICT)
+
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+
+        job = self.client.get(detail_url).data
+        self.assertEqual(job['status'], 'Completed')
+        self.assertTrue(job['download_url'].endswith(download_url))
+        self.assertIsNotNone(job['expires_at'])
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([row[0] for row in rows[1:]], ['Job Project B'])
+        self.assertEqual(job['size'], sum(len(','.join(row)) + 2 for row in rows))
+
+    def test_identical_requests_share_a_job(self):
+        first = self.submit({'statuses': ['Pending', 'Completed']})
+        # Same report (statuses in another order), another user: same job
+        other = User.objects.create_user(username='otherjobuser', password='x')
+        self.client.force_authenticate(user=other)
+        second = self.submit({'statuses': ['Completed', 'Pending']}, expected_status=status.HTTP_200_OK)
+        self.assertEqual(first['id'], second['id'])
+        # A different report is a different job
+        self.assertNotEqual(self.submit()['id'], first['id'])
+        self.assertEqual(ReportJob.objects.count(), 2)
+        # Once finished, asking again renders a fresh report
+        jobs.run_pending_jobs()
+        self.assertNotEqual(self.submit({'statuses': ['Pending', 'Completed']})['id'], first['id'])
+
+    def test_invalid_requests(self):
+        response = self.client.post(self.jobs_url, {'kind': 'everything', 'params': {}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.jobs_url, {'kind': 'projects_csv', 'params': {'statuses': ['Nope']}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.jobs_url, {'kind': 'projects_csv', 'params': {'limit': 5}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_failed_job(self):
+        job = self.submit()
+
+        def broken(**params):
+            yield b'partial'
+            raise RuntimeError('disk full')
+
+        with mock.patch.dict(jobs.REPORT_KINDS, {'projects_csv': jobs.ReportKind('Broken', broken, 'csv')}):
+            jobs.run_pending_jobs()
+        job = ReportJob.objects.get(pk=job['id'])
+        self.assertEqual(job.status, 'Failed')
+        self.assertEqual(job.error, 'RuntimeError: disk full')
+        self.assertFalse(job.file)
+
+        # A kind no longer known fails before any temporary file is opened
+        job = self.submit()
+        with mock.patch.dict(jobs.REPORT_KINDS, clear=True), \
+                mock.patch('tempfile.NamedTemporaryFile') as temporary_file:
+            jobs.run_pending_jobs()
+        temporary_file.assert_not_called()
+        self.assertEqual(ReportJob.objects.get(pk=job['id']).error, "ValueError: Unknown report kind 'projects_csv'")
+
+    def test_stale_jobs_are_requeued_then_failed(self):
+        job_id = self.submit()['id']
+        for attempt in range(1, 4):
+            claimed = jobs.claim_job('dead-worker')
+            self.assertEqual(str(claimed.pk), job_id)
+            self.assertIsNone(jobs.claim_job('other-worker'))  # Running jobs cannot be claimed twice
+            ReportJob.objects.filter(pk=job_id).update(lease_expires_at=timezone.now() - datetime.timedelta(seconds=1))
+            self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        job = ReportJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.attempts), ('Failed', 3))
+
+    def test_expired_reports_are_purged(self):
+        job_id = self.submit()['id']
+        jobs.run_pending_jobs()
+        path = ReportJob.objects.get(pk=job_id).file.path
+        self.assertTrue(os.path.exists(path))
+        ReportJob.objects.filter(pk=job_id).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        response = self.client.get(reverse('audit_management:report-job-download', kwargs={'pk': job_id}))
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(jobs.purge_expired_jobs(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_long_poll(self):
+        job_id = self.submit()['id']
+        wait_url = reverse('audit_management:async-report-job-wait', kwargs={'pk': job_id})
+        response = self.client.get(wait_url, {'timeout': 0})
+        self.assertEqual(response.data['status'], 'Pending')
+        jobs.run_pending_jobs()
+        response = self.client.get(wait_url, {'timeout': 10})
+        self.assertEqual(response.data['status'], 'Completed')
+
+    def test_worker_command_once(self):
+        self.submit()
+        out = io.StringIO()
+        call_command('run_report_worker', '--once', stdout=out)
+        self.assertIn('Ran 1 job(s)', out.getvalue())
+        self.assertEqual(ReportJob.objects.get().status, 'Completed')
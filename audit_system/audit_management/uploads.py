@@ -0,0 +1,174 @@
+"""
+On-disk part files for resumable uploads (UploadSession).
+
+Each session owns one part file under settings.AUDIT_UPLOAD_SESSION_DIR. A chunk is
+copied from the request stream straight into it at its byte offset (write_chunk()),
+which takes as long as the client takes to send it, so no transaction is open and no
+row locked meanwhile: the chunk first reserves the part file with a lease on the
+session (leases.py), renewed as blocks arrive, and once every byte is written
+commit_chunk() discards anything after it and the new received_bytes is saved under the
+row lock. Finalizing hands the part file to the storage as an already-written temporary
+file, which FileSystemStorage moves into place instead of copying.
+"""
+import io
+import os
+import re
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+
+DEFAULT_UPLOAD_SESSION_TTL = timedelta(hours=24)
+DEFAULT_UPLOAD_MAX_SIZE = 20 * 1024 ** 3
+# A client sending nothing for this long loses its claim on the part file
+DEFAULT_CHUNK_LEASE = timedelta(minutes=1)
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class ChunkError(Exception):
+    """
+    A chunk that cannot be written: bad Content-Range, wrong offset, or a short body.
+    """
+
+
+class ChunkOffsetError(ChunkError):
+    """
+    A chunk that starts after the last received byte, which would leave a gap.
+    """
+
+
+class PartFile(File):
+    """
+    A completely written part file. temporary_file_path() lets FileSystemStorage move
+    it into MEDIA_ROOT with file_move_safe() rather than reading and copying it.
+    """
+    def __init__(self, path, name):
+        super().__init__(None, name=name)
+        self.path = str(path)
+
+    def temporary_file_path(self):
+        return self.path
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def open(self, mode='rb'):
+        # Only used by storages that cannot move files (e.g. remote storage backends).
+        self.file = open(self.path, mode)
+        return self
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def get_upload_dir():
+    return Path(getattr(settings, 'AUDIT_UPLOAD_SESSION_DIR', Path(settings.MEDIA_ROOT).parent / 'upload_sessions'))
+
+
+def get_session_ttl():
+    return getattr(settings, 'AUDIT_UPLOAD_SESSION_TTL', DEFAULT_UPLOAD_SESSION_TTL)
+
+
+def get_max_upload_size():
+    return getattr(settings, 'AUDIT_UPLOAD_MAX_SIZE', DEFAULT_UPLOAD_MAX_SIZE)
+
+
+def get_chunk_lease():
+    return getattr(settings, 'AUDIT_UPLOAD_CHUNK_LEASE', DEFAULT_CHUNK_LEASE)
+
+
+def next_expiry():
+    return timezone.now() + get_session_ttl()
+
+
+def part_path(session):
+    return get_upload_dir() / f'{session.pk}.part'
+
+
+def create_part_file(session):
+    directory = get_upload_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    part_path(session).touch()
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def parse_content_range(header, total_size):
+    """
+    (start, end) from a `bytes start-end/total` header; `end` is inclusive.
+    """
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise ChunkError('Content-Range header of the form "bytes start-end/total" is required.')
+    start, end, total = (int(value) for value in match.groups())
+    if total != total_size:
+        raise ChunkError(f'Content-Range total {total} does not match the session size {total_size}.')
+    if start > end or end >= total_size:
+        raise ChunkError('Content-Range is outside the file.')
+    return start, end
+
+
+def check_chunk_offset(session, start):
+    """
+    A chunk may start anywhere up to the bytes already received, so a client that lost the
+    response to a chunk can simply resend it.
+    """
+    if start > session.received_bytes:
+        raise ChunkOffsetError(f'Chunk starts at {start} but only {session.received_bytes} bytes have been received.')
+
+
+def is_receiving_chunk(session):
+    """
+    Whether a request holds a live claim on the session's part file, so no other chunk
+    may be written and the upload may not be finalized. Claims whose lease ran out are
+    as good as released.
+    """
+    return session.lease_expires_at is not None and session.lease_expires_at >= timezone.now()
+
+
+def write_chunk(session, stream, start, end, on_block=None):
+    """
+    Writes bytes `start`..`end` (inclusive) from `stream` into the session's part file,
+    calling `on_block()` before each block. Raises ChunkError if the stream is shorter
+    than the range; whatever it wrote past received_bytes is overwritten by the next
+    chunk and cut off by commit_chunk().
+    """
+    length = end - start + 1
+    written = 0
+    if stream is None:
+        # DRF gives no stream for an empty body
+        stream = io.BytesIO()
+    with open(part_path(session), 'r+b') as part:
+        part.seek(start)
+        while written < length:
+            block = stream.read(min(UPLOAD_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            if on_block is not None:
+                on_block()
+            part.write(block)
+            written += len(block)
+    if written < length:
+        raise ChunkError(f'Expected {length} bytes for the chunk but received {written}.')
+
+
+def commit_chunk(session, end):
+    """
+    Discards anything after a written chunk (see check_chunk_offset()) and returns the
+    new received byte count.
+    """
+    os.truncate(part_path(session), end + 1)
+    return end + 1
@@ -5,9 +5,26 @@ from .views import (
     AuditProjectViewSet,
     AuditTaskViewSet,
     ProjectDocumentViewSet,
+    UploadSessionViewSet,
+    ReportJobViewSet,
+    TransactionDatasetViewSet,
+    AnomalyDetectionRunViewSet,
+    DetectedAnomalyViewSet,
     DashboardSummaryView,
+    ChangeFeedView,
+    RequestMetricsView,
     AuditProjectCSVReportView # Added AuditProjectCSVReportView
 )
+from .async_views import (
+    AsyncHelloView,
+    AsyncDashboardSummaryView,
+    AsyncAuditProjectListView,
+    AsyncAuditProjectDetailView,
+    AsyncAuditTaskListView,
+    AsyncAuditTaskDetailView,
+    AsyncReportJobWaitView,
+    EventStreamView,
+)
 
 app_name = 'audit_management'
 
@@ -15,11 +32,27 @@ router = DefaultRouter()
 router.register(r'projects', AuditProjectViewSet, basename='project')
 router.register(r'tasks', AuditTaskViewSet, basename='task')
 router.register(r'documents', ProjectDocumentViewSet, basename='document') # Added ProjectDocumentViewSet
+router.register(r'uploads', UploadSessionViewSet, basename='upload') # Resumable chunked uploads
+router.register(r'reports/jobs', ReportJobViewSet, basename='report-job') # Background report jobs
+router.register(r'datasets', TransactionDatasetViewSet, basename='dataset') # Transaction data for anomaly detection
+router.register(r'detection-runs', AnomalyDetectionRunViewSet, basename='detection-run')
+router.register(r'anomalies', DetectedAnomalyViewSet, basename='anomaly') # Triage of detection results
 # basename is optional but recommended if queryset is not standard or for custom actions
 
 urlpatterns = [
     path('hello/', HelloView.as_view(), name='hello'),
     path('dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
+    path('changes/', ChangeFeedView.as_view(), name='changes'), # Delta sync for offline clients
+    path('metrics/requests/', RequestMetricsView.as_view(), name='request-metrics'), # Staff only
     path('reports/projects/csv/', AuditProjectCSVReportView.as_view(), name='report-projects-csv'), # Added
+    # Async read paths, for deployments behind an ASGI server (see async_views.py)
+    path('async/hello/', AsyncHelloView.as_view(), name='async-hello'),
+    path('async/dashboard/summary/', AsyncDashboardSummaryView.as_view(), name='async-dashboard-summary'),
+    path('async/projects/', AsyncAuditProjectListView.as_view(), name='async-project-list'),
+    path('async/projects/<int:pk>/', AsyncAuditProjectDetailView.as_view(), name='async-project-detail'),
+    path('async/tasks/', AsyncAuditTaskListView.as_view(), name='async-task-list'),
+    path('async/tasks/<int:pk>/', AsyncAuditTaskDetailView.as_view(), name='async-task-detail'),
+    path('async/reports/jobs/<uuid:pk>/wait/', AsyncReportJobWaitView.as_view(), name='async-report-job-wait'),
+    path('async/events/', EventStreamView.as_view(), name='async-events'), # Server-sent status updates
     path('', include(router.urls)), # Include router URLs for the ViewSet
 ]
@@ -0,0 +1,159 @@
+"""
+Table versions (TableVersion) and conditional GET for the list/detail endpoints.
+
+Every write to a versioned table bumps its counter in the write's transaction,
+including bulk writes, QuerySet.update() and cascading deletes (see signals.py). A
+view's ETag hashes the versions of the tables its response reads together with the
+request, so answering a poll whose data did not change takes one query on a handful
+of rows and no serialization: 304 Not Modified.
+"""
+import hashlib
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import AuditProject, AuditTask, ProjectDocument, TableVersion
+from .signals import batch_accumulator, post_bulk_create, post_bulk_update, post_queryset_update
+
+
+def table_for(model):
+    return model._meta.label_lower
+
+
+def bump(model, using=None):
+    """
+    Increments the version of `model`'s table. Inside batched_changes() each table is
+    bumped once at the end.
+    """
+    pending = batch_accumulator(('table_versions', using), lambda items: _write_bumps(set(items), using))
+    if pending is not None:
+        pending.append(table_for(model))
+        return
+    _write_bumps({table_for(model)}, using)
+
+
+def _write_bumps(tables, using):
+    versions = TableVersion.objects.using(using)
+    now = timezone.now()
+    for table in sorted(tables):
+        if versions.filter(table=table).update(version=F('version') + 1, updated_at=now):
+            continue
+        try:
+            with transaction.atomic(using=using):
+                versions.create(table=table, version=1, updated_at=now)
+        except IntegrityError:
+            # Created concurrently since our UPDATE found nothing.
+            versions.filter(table=table).update(version=F('version') + 1, updated_at=now)
+
+
+def get_versions(*models):
+    """
+    {table: (version, updated_at)} for `models`, in one query. Tables never written
+    since versioning started are (0, None).
+    """
+    tables = {table_for(model) for model in models}
+    versions = dict.fromkeys(tables, (0, None))
+    for table, version, updated_at in TableVersion.objects.filter(table__in=tables).values_list(
+        'table', 'version', 'updated_at'
+    ):
+        versions[table] = (version, updated_at)
+    return versions
+
+
+def get_validators(request, *models):
+    """
+    (etag, last_modified timestamp or None) of the response to `request` given the
+    current versions of `models`.
+
+    The ETag also covers everything else the body depends on: path and query string
+    (fields, expand, q, cursor...), host (absolute links) and Accept (renderer).
+    Last-Modified has one-second resolution; it is left out while the newest change is
+    under a second old, as a client could otherwise miss a second change within the
+    same second.
+    """
+    versions = get_versions(*models)
+    key = '\n'.join([
+        *(f'{table}:{version}' for table, (version, _) in sorted(versions.items())),
+        request.get_host(),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ])
+    etag = f'W/"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+    changes = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+    last_modified = None
+    if changes and (timezone.now() - max(changes)).total_seconds() >= 1:
+        last_modified = int(max(changes).timestamp())
+    return etag, last_modified
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin: ETag/Last-Modified on list and retrieve, and 304 Not Modified
+    (without running the query or serializing) when the client's copy is current.
+
+    `conditional_models` lists every table the responses read, including those of
+    related objects that are shown or ordered by.
+    """
+    conditional_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        # Read the versions before the data: a write committed in between then shows up
+        # as a newer body under the older ETag, and the next poll fetches it again.
+        etag, last_modified = get_validators(request, *self.conditional_models)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+
+@receiver(post_save, sender=AuditProject)
+@receiver(post_save, sender=AuditTask)
+@receiver(post_save, sender=ProjectDocument)
+@receiver(post_delete, sender=AuditProject)
+@receiver(post_delete, sender=AuditTask)
+@receiver(post_delete, sender=ProjectDocument)
+@receiver(post_bulk_create, sender=AuditProject)
+@receiver(post_bulk_create, sender=AuditTask)
+@receiver(post_bulk_create, sender=ProjectDocument)
+@receiver(post_bulk_update, sender=AuditProject)
+@receiver(post_bulk_update, sender=AuditTask)
+@receiver(post_bulk_update, sender=ProjectDocument)
+@receiver(post_queryset_update, sender=AuditProject)
+@receiver(post_queryset_update, sender=AuditTask)
+@receiver(post_queryset_update, sender=ProjectDocument)
+def bump_written_table(sender, using, **kwargs):
+    bump(sender, using)
+
+
+# Users are shown (ids, usernames) by the versioned endpoints. Only save()/delete() are
+# covered; logins, which only touch last_login, do not change any response.
+@receiver(post_save, sender=User)
+def bump_saved_user(sender, using, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump(sender, using)
+
+
+@receiver(post_delete, sender=User)
+def bump_deleted_user(sender, using, **kwargs):
+    bump(sender, using)
@@ -1,20 +1,42 @@
+import datetime
+import uuid
+from collections import Counter
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework import viewsets, parsers # Added parsers for FileUpload
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework import mixins, viewsets, parsers, status # Added parsers for FileUpload
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 
-import csv
-import io
-from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Count, Q
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.text import compress_sequence
 
-from .models import AuditProject, AuditTask, ProjectDocument # Added ProjectDocument
-from .serializers import AuditProjectSerializer, AuditTaskSerializer, ProjectDocumentSerializer # Added ProjectDocumentSerializer
+from .models import AnomalyDetectionRun, AuditProject, AuditTask, DetectedAnomaly, ProjectDocument, ReportJob, TransactionDataset, UploadSession # Added ProjectDocument
+from .serializers import (  # Added ProjectDocumentSerializer
+    AnomalyDetectionRunSerializer, AnomalyStatusChangeSerializer, AuditProjectSerializer, AuditTaskSerializer, DetectedAnomalySerializer,
+    ProjectDocumentSerializer, ReportJobSerializer, TransactionDatasetSerializer, UploadSessionSerializer,
+)
+from . import anomalies, changes, counters, datasets, detection, jobs, leases, uploads
+from .downloads import DownloadRenderer, serve_file
+from .fieldsets import FlexFieldsViewMixin
+from .versions import ConditionalGetMixin
+from .counters import get_status_summary
+from .reports import iter_project_report_csv
+from .search import FullTextSearchFilter
+from .instrumentation import endpoint_stats
 
 
 class HelloView(APIView):
@@ -33,13 +55,15 @@ class HelloView(APIView):
         return Response(content)
 
 
-class AuditProjectViewSet(viewsets.ModelViewSet):
+class AuditProjectViewSet(ConditionalGetMixin, FlexFieldsViewMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows AuditProjects to be viewed or edited.
     """
     queryset = AuditProject.objects.all().order_by('-created_at') # Added default ordering
     serializer_class = AuditProjectSerializer
     permission_classes = [IsAuthenticated] # Ensures only authenticated users can access
+    filter_backends = [FullTextSearchFilter] # ?q= searches name, objectives, description and scope
+    conditional_models = (AuditProject, User) # Project managers can be expanded
 
     # Optional: You could override methods like perform_create to set project_manager automatically
     # def perform_create(self, serializer):
@@ -51,7 +75,7 @@ class AuditProjectViewSet(viewsets.ModelViewSet):
     #         serializer.save()
 
 
-class AuditTaskViewSet(viewsets.ModelViewSet):
+class AuditTaskViewSet(ConditionalGetMixin, FlexFieldsViewMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows AuditTasks to be viewed or edited.
     Note: For a more advanced setup, consider using drf-nested-routers
@@ -61,6 +85,50 @@ class AuditTaskViewSet(viewsets.ModelViewSet):
     queryset = AuditTask.objects.all().select_related('project', 'assignee').order_by('project__name', 'created_at')
     serializer_class = AuditTaskSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FullTextSearchFilter] # ?q= searches name and description
+    conditional_models = (AuditTask, AuditProject, User) # Ordered by project name; project and assignee can be expanded
+
+    # Bulk endpoints: /api/audit/tasks/bulk/
+    # POST a list of tasks to create, PATCH a list of partial tasks (each with its "id") to update,
+    # DELETE {"ids": [...]} to delete. Each request is one transaction: if any item is invalid
+    # nothing is written, and the 400 response lists the errors per item, in input order.
+
+    def get_bulk_serializer(self, *args, **kwargs):
+        kwargs.setdefault('max_length', getattr(settings, 'AUDIT_BULK_MAX_ITEMS', 10000))
+        kwargs.setdefault('allow_empty', False)
+        return self.get_serializer(*args, many=True, **kwargs)
+
+    @action(detail=False, methods=['post'], url_path='bulk', url_name='bulk')
+    def bulk_create(self, request):
+        serializer = self.get_bulk_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        ids = [item.get('id') for item in request.data if isinstance(item, dict)] if isinstance(request.data, list) else []
+        with transaction.atomic():
+            instances = AuditTask.objects.filter(pk__in=[_task_pk(pk) for pk in ids]).select_for_update()
+            serializer = self.get_bulk_serializer(list(instances), data=request.data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return Response(serializer.data)
+
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError({'ids': ['A non-empty list of ids is required.']})
+        with transaction.atomic():
+            pks = [_task_pk(pk) for pk in ids]
+            existing = set(AuditTask.objects.filter(pk__in=pks).values_list('pk', flat=True))
+            errors = [{} if pk in existing else {'id': [f'Object with id={raw} does not exist.']} for pk, raw in zip(pks, ids)]
+            if any(errors):
+                raise ValidationError(errors)
+            _, deleted = AuditTask.objects.filter(pk__in=existing).delete()
+        return Response({'deleted': deleted.get(AuditTask._meta.label, 0)})
 
     # Optional: Filter queryset based on the project if a project_pk is in URL
     # def get_queryset(self):
@@ -75,7 +143,19 @@ class AuditTaskViewSet(viewsets.ModelViewSet):
     #     return queryset
 
 
-class ProjectDocumentViewSet(viewsets.ModelViewSet):
+def _task_pk(value):
+    """
+    `value` as an AuditTask primary key, or None if it is not a valid one.
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        return AuditTask._meta.pk.to_python(value)
+    except (TypeError, DjangoValidationError):
+        return None
+
+
+class ProjectDocumentViewSet(ConditionalGetMixin, FlexFieldsViewMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows ProjectDocuments to be viewed or edited.
     Handles file uploads.
@@ -83,6 +163,8 @@ class ProjectDocumentViewSet(viewsets.ModelViewSet):
     queryset = ProjectDocument.objects.all().select_related('project', 'task', 'uploaded_by').order_by('-uploaded_at')
     serializer_class = ProjectDocumentSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [FullTextSearchFilter] # ?q= searches name and description
+    conditional_models = (ProjectDocument, User) # Shows the uploader's username
     parser_classes = [parsers.MultiPartParser, parsers.FormParser, parsers.JSONParser] # Add parsers for file uploads
 
     def perform_create(self, serializer):
@@ -91,6 +173,401 @@ class ProjectDocumentViewSet(viewsets.ModelViewSet):
         """
         serializer.save(uploaded_by=self.request.user)
 
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, DownloadRenderer])
+    def download(self, request, pk=None):
+        """
+        The document's file, for authenticated users only (MEDIA_URL is not served in
+        production). Supports Range, If-Range, If-None-Match and If-Modified-Since, and
+        hands the transfer to the web server when AUDIT_DOWNLOAD_OFFLOAD is set.
+        """
+        document = self.get_object()
+        if not document.file:
+            raise NotFound('This document has no file.')
+        try:
+            return serve_file(request, document.file)
+        except FileNotFoundError:
+            raise NotFound('The file of this document is missing.')
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Resumable uploads for large documents.
+
+    1. POST /uploads/ with project, task, name, description, filename and total_size.
+    2. PUT /uploads/<id>/ with a raw body and `Content-Range: bytes start-end/total`,
+       as many times as needed. GET /uploads/<id>/ reports received_bytes, the offset
+       to resume from after an interruption.
+    3. POST /uploads/<id>/finalize/ turns the completed upload into a ProjectDocument.
+
+    DELETE aborts an upload. Sessions not finished before expires_at (extended by every
+    chunk) are removed by the purge_upload_sessions command.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Upload sessions are private to the user who started them
+        return UploadSession.objects.filter(created_by_id=self.request.user.pk).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        session = serializer.save(created_by=self.request.user, expires_at=uploads.next_expiry())
+        uploads.create_part_file(session)
+
+    def perform_destroy(self, instance):
+        path = uploads.part_path(instance)  # delete() clears the pk
+        instance.delete()
+        transaction.on_commit(lambda: uploads.remove_file(path))
+
+    def get_locked_session(self):
+        """
+        The session, locked for the rest of the transaction so chunks and finalize
+        for the same upload cannot interleave.
+        """
+        session = self.get_object()
+        return UploadSession.objects.select_for_update().get(pk=session.pk)
+
+    def refuse_chunk(self, session):
+        if session.status != 'Active':
+            return Response({'detail': 'This upload has already been finalized.'}, status=status.HTTP_409_CONFLICT)
+        if session.expires_at <= timezone.now():
+            return Response({'detail': 'This upload has expired.'}, status=status.HTTP_410_GONE)
+        return None
+
+    def chunk_error(self, exc, session):
+        # A chunk past the received bytes means the client lost track of its offset:
+        # 409 with received_bytes tells it where to resume.
+        conflict = isinstance(exc, uploads.ChunkOffsetError)
+        return Response(
+            {'detail': str(exc), 'received_bytes': session.received_bytes},
+            status=status.HTTP_409_CONFLICT if conflict else status.HTTP_400_BAD_REQUEST,
+        )
+
+    def lost_chunk(self):
+        # The lease ran out (the client stalled) and another request took the part file
+        return Response(
+            {'detail': 'The chunk was received too slowly and has been discarded; resend it.'},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            session = self.get_locked_session()
+            refused = self.refuse_chunk(session)
+            if refused is not None:
+                return refused
+            try:
+                start, end = uploads.parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), session.total_size)
+                content_length = request.META.get('CONTENT_LENGTH')
+                if content_length and int(content_length) != end - start + 1:
+                    raise uploads.ChunkError('Content-Length does not match Content-Range.')
+                uploads.check_chunk_offset(session, start)
+            except uploads.ChunkError as exc:
+                return self.chunk_error(exc, session)
+            if uploads.is_receiving_chunk(session):
+                return Response(
+                    {'detail': 'Another chunk of this upload is being received.',
+                     'received_bytes': session.received_bytes},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            # Reserve the part file for this chunk
+            session.lease_expires_at = timezone.now() + uploads.get_chunk_lease()
+            session.save(update_fields=['lease_expires_at'])
+
+        # The body arrives as slowly as the client sends it, so it is written with no
+        # transaction open and no row locked; the lease keeps other chunks and finalize
+        # away from the part file meanwhile. It comes from the raw request stream,
+        # without passing through DRF's parsers or Django's upload handlers.
+        lease = leases.Lease(
+            UploadSession.objects.filter(pk=session.pk, status='Active'),
+            session.lease_expires_at,
+            uploads.get_chunk_lease(),
+        )
+        try:
+            uploads.write_chunk(session, request.stream, start, end, on_block=lease.renew)
+        except uploads.ChunkError as exc:
+            try:
+                lease.release()
+            except leases.LeaseLost:
+                pass
+            return self.chunk_error(exc, session)
+        except leases.LeaseLost:
+            return self.lost_chunk()
+        with transaction.atomic():
+            session = self.get_locked_session()
+            if session.status != 'Active' or session.lease_expires_at != lease.expires_at:
+                return self.lost_chunk()
+            session.received_bytes = uploads.commit_chunk(session, end)
+            session.expires_at = uploads.next_expiry()
+            session.lease_expires_at = None
+            session.save(update_fields=['received_bytes', 'expires_at', 'lease_expires_at', 'updated_at'])
+        return Response(self.get_serializer(session).data)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        with transaction.atomic():
+            session = self.get_locked_session()
+            if session.status == 'Completed':
+                # A retried finalize: return the document created the first time
+                document = session.document
+            elif session.expires_at <= timezone.now():
+                return Response({'detail': 'This upload has expired.'}, status=status.HTTP_410_GONE)
+            elif uploads.is_receiving_chunk(session):
+                return Response(
+                    {'detail': 'A chunk of this upload is still being received.',
+                     'received_bytes': session.received_bytes},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            elif not session.is_complete:
+                return Response(
+                    {'detail': f'Only {session.received_bytes} of {session.total_size} bytes have been received.',
+                     'received_bytes': session.received_bytes},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            else:
+                document = ProjectDocument(
+                    project=session.project,
+                    task=session.task,
+                    name=session.name,
+                    description=session.description,
+                    uploaded_by=request.user,
+                )
+                # The storage moves the part file into place; it is not read again.
+                part = uploads.PartFile(uploads.part_path(session), session.filename)
+                document.file.save(session.filename, part, save=False)
+                document.save()
+                # Still there if the content was already stored
+                uploads.remove_file(part.path)
+                session.status = 'Completed'
+                session.document = document
+                session.save(update_fields=['status', 'document', 'updated_at'])
+        if document is None:
+            return Response({'detail': 'The document created by this upload was deleted.'}, status=status.HTTP_410_GONE)
+        serializer = ProjectDocumentSerializer(document, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class TransactionDatasetViewSet(mixins.CreateModelMixin,
+                                mixins.ListModelMixin,
+                                mixins.RetrieveModelMixin,
+                                mixins.DestroyModelMixin,
+                                viewsets.GenericViewSet):
+    """
+    Transaction data for anomaly detection (see datasets.py).
+
+    Upload the CSV as a document (through /uploads/ if it is large), then POST
+    {"project", "name", "source_description", "source_document"}. The dataset is New
+    until the ingest_transaction_datasets command has converted it: then Uploaded, with
+    its schema, record count and time range, or Error with error_message. POST
+    /datasets/<id>/ingest/ queues a dataset again, e.g. after fixing its file.
+    """
+    queryset = TransactionDataset.objects.all().select_related('uploaded_by').order_by('-created_at')
+    serializer_class = TransactionDatasetSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        project = self.request.query_params.get('project')
+        if project is not None:
+            if not project.isdigit():
+                raise ValidationError({'project': 'Expected a project id.'})
+            queryset = queryset.filter(project_id=project)
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(uploaded_by=self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        dataset = self.get_object()
+        if datasets.is_being_ingested(dataset):
+            return Response({'detail': 'The dataset is being ingested.'}, status=status.HTTP_409_CONFLICT)
+        dataset.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def ingest(self, request, pk=None):
+        dataset = self.get_object()
+        now = timezone.now()
+        # A claim whose lease ran out (the worker died) does not block queueing again. While
+        # runs are scoring the dataset, ingestion must not replace the file they map.
+        queued = (
+            TransactionDataset.objects.filter(pk=dataset.pk)
+            .exclude(status='Uploading', lease_expires_at__gte=now)
+            .exclude(status='Processing')
+            .update(status='New', error_message='', ingest_attempts=0, lease_expires_at=None, updated_at=now)
+        )
+        if not queued:
+            return Response({'detail': 'The dataset is being ingested or analyzed.'}, status=status.HTTP_409_CONFLICT)
+        dataset.refresh_from_db()
+        return Response(self.get_serializer(dataset).data, status=status.HTTP_202_ACCEPTED)
+
+
+class AnomalyDetectionRunViewSet(mixins.CreateModelMixin,
+                                 mixins.ListModelMixin,
+                                 mixins.RetrieveModelMixin,
+                                 mixins.DestroyModelMixin,
+                                 viewsets.GenericViewSet):
+    """
+    Anomaly detection over ingested transaction datasets (see detection.py).
+
+    POST {"dataset", "sensitivity_level", "parameters_used"} queues a run; the
+    run_anomaly_detection command executes it. Poll GET /detection-runs/<id>/ until the
+    status is COMPLETED (summary_info has the counts) or FAILED (error_message). Filter
+    the list with ?dataset= or ?project=.
+    """
+    queryset = AnomalyDetectionRun.objects.all().order_by('-requested_at')
+    serializer_class = AnomalyDetectionRunSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        project = self.request.query_params.get('project')
+        if project is not None:
+            if not project.isdigit():
+                raise ValidationError({'project': 'Expected a project id.'})
+            queryset = queryset.filter(project_id=project)
+        dataset = self.request.query_params.get('dataset')
+        if dataset is not None:
+            try:
+                queryset = queryset.filter(dataset_id=uuid.UUID(dataset))
+            except ValueError:
+                raise ValidationError({'dataset': 'Expected a dataset id.'})
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(requested_by=self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        run = self.get_object()
+        if detection.is_running(run):
+            return Response({'detail': 'The run is being executed.'}, status=status.HTTP_409_CONFLICT)
+        run.delete()
+        # A run whose worker died leaves its dataset Processing
+        detection.settle_datasets([run.dataset_id])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DetectedAnomalyViewSet(mixins.ListModelMixin,
+                             mixins.RetrieveModelMixin,
+                             mixins.UpdateModelMixin,
+                             viewsets.GenericViewSet):
+    """
+    Triage of the transactions flagged by detection runs (see anomalies.py).
+
+    GET /anomalies/?run=<id> lists a run's anomalies by descending anomaly_score, with
+    keyset paging: ?page_size=k returns the top k, each next page continues from the
+    last score seen, from the (run, score) index. Filter with ?status= (comma-separated),
+    ?assignee= (a user id, "me" or "none"), ?min_score=, ?max_score= and ?project=.
+    PATCH /anomalies/<id>/ changes status, auditor_notes or assigned_to_auditor.
+
+    POST /anomalies/bulk-status/?run=<id>&<filters> {"status": ..., "ids": [...]} moves
+    every anomaly of the run matching the filters (and ids, if given) to status, with
+    one UPDATE per status they leave, however many they are. GET
+    /anomalies/counts/?run=<id> returns the run's counts per status, kept current by
+    both.
+    """
+    queryset = (
+        DetectedAnomaly.objects.filter(anomaly_score__isnull=False)
+        .select_related('assigned_to_auditor')
+        .order_by('-anomaly_score')
+    )
+    serializer_class = DetectedAnomalySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_run_id(self, required=False):
+        run = self.request.query_params.get('run')
+        if run is None:
+            if required:
+                raise ValidationError({'run': 'A detection run id is required.'})
+            return None
+        try:
+            return uuid.UUID(run)
+        except ValueError:
+            raise ValidationError({'run': 'Expected a detection run id.'})
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        run = self.get_run_id()
+        if run is not None:
+            queryset = queryset.filter(detection_run_id=run)
+        project = params.get('project')
+        if project is not None:
+            if not project.isdigit():
+                raise ValidationError({'project': 'Expected a project id.'})
+            queryset = queryset.filter(detection_run__project_id=project)
+        statuses = self.get_statuses()
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+        assignee = params.get('assignee')
+        if assignee is not None:
+            if assignee == 'none':
+                queryset = queryset.filter(assigned_to_auditor__isnull=True)
+            elif assignee == 'me':
+                queryset = queryset.filter(assigned_to_auditor_id=self.request.user.pk)
+            elif assignee.isdigit():
+                queryset = queryset.filter(assigned_to_auditor_id=assignee)
+            else:
+                raise ValidationError({'assignee': 'Expected a user id, "me" or "none".'})
+        for param, lookup in (('min_score', 'anomaly_score__gte'), ('max_score', 'anomaly_score__lte')):
+            value = params.get(param)
+            if value is not None:
+                try:
+                    queryset = queryset.filter(**{lookup: float(value)})
+                except ValueError:
+                    raise ValidationError({param: 'Expected a number.'})
+        return queryset
+
+    def get_statuses(self):
+        value = self.request.query_params.get('status')
+        if not value:
+            return []
+        statuses = value.split(',')
+        valid = {choice for choice, _ in DetectedAnomaly.STATUS_CHOICES}
+        unknown = [name for name in statuses if name not in valid]
+        if unknown:
+            raise ValidationError({'status': f"Unknown statuses: {', '.join(unknown)}."})
+        return statuses
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # The stored status, locked: the counters move from it
+            previous = (
+                DetectedAnomaly.objects.select_for_update()
+                .values_list('status', flat=True)
+                .get(pk=serializer.instance.pk)
+            )
+            anomaly = serializer.save()
+            if anomaly.status != previous:
+                scope = counters.anomaly_scope(anomaly.detection_run_id)
+                counters.apply_deltas(Counter({(scope, previous): -1, (scope, anomaly.status): 1}))
+
+    @action(detail=False, methods=['post'], url_path='bulk-status', url_name='bulk-status')
+    def bulk_status(self, request):
+        run = self.get_run_id(required=True)
+        serializer = AnomalyStatusChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        selection = self.get_queryset()
+        if 'ids' in serializer.validated_data:
+            selection = selection.filter(pk__in=serializer.validated_data['ids'])
+        moved = anomalies.move_anomalies(
+            run, selection, serializer.validated_data['status'], from_statuses=self.get_statuses(),
+        )
+        return Response({
+            'status': serializer.validated_data['status'],
+            'moved': sum(moved.values()),
+            'moved_from': moved,
+            'counts': counters.get_anomaly_counts(run),
+        })
+
+    @action(detail=False, methods=['get'])
+    def counts(self, request):
+        run = self.get_run_id(required=True)
+        return Response({'run': run, 'counts': counters.get_anomaly_counts(run)})
+
 
 class DashboardSummaryView(APIView):
     """
@@ -99,27 +576,18 @@ class DashboardSummaryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        # Project Status Statistics
-        project_status_summary = list(
-            AuditProject.objects.values('status')
-            .annotate(count=Count('status'))
-            .order_by('status')
-        ) # Using list() to execute the query and make it serializable
-
-        # Task Status Statistics
-        task_status_summary = list(
-            AuditTask.objects.values('status')
-            .annotate(count=Count('status'))
-            .order_by('status')
-        )
+        # Project and Task Status Statistics
+        # Read from the incrementally maintained counters (see counters.py): one query over a
+        # handful of rows instead of two GROUP BY scans.
+        status_summary = get_status_summary(AuditProject, AuditTask)
+        project_status_summary = status_summary[AuditProject]
+        task_status_summary = status_summary[AuditTask]
 
         # Overdue Tasks Count
-        # Tasks are overdue if their due_date is in the past and their status is not 'Completed' or 'Cancelled' (or any other final state)
-        # Note: Adjust 'final_statuses' based on your actual workflow for tasks.
-        final_statuses = ['Completed'] # Add other statuses like 'Cancelled' if applicable
-        overdue_tasks_count = AuditTask.objects.filter(
-            due_date__lt=timezone.now().date(),
-        ).exclude(status__in=final_statuses).count()
+        # Tasks are overdue if their due_date is in the past and their status is not a final state.
+        # Note: Adjust AuditTask.FINAL_STATUSES based on your actual workflow for tasks. The filter in
+        # overdue_tasks() must keep matching the condition of the partial index audittask_open_due_idx.
+        overdue_tasks_count = overdue_tasks().count()
 
         # Recently Completed Projects (e.g., in the last 30 days) - Example of another stat
         # recent_completion_cutoff = timezone.now() - timezone.timedelta(days=30)
@@ -149,46 +617,192 @@ class DashboardSummaryView(APIView):
         })
 
 
+class ChangeFeedView(APIView):
+    """
+    Delta sync for offline clients (see changes.py).
+
+    GET /changes/?since=<next_token> returns the rows changed since the sync that returned
+    the token; without it, every row (or, with ?updated_since=<ISO 8601 time>, those
+    changed since then). ?types=project,task,document narrows the feed, ?page_size= sets
+    the page length. While has_more is true, call again with next_token straight away.
+    """
+    permission_classes = [IsAuthenticated]
+    # The querysets (with their select_related) and serializers of the ViewSets, so each
+    # type is loaded in one query and represented as its endpoint returns it
+    sources = {
+        'project': (AuditProjectViewSet.queryset, AuditProjectSerializer),
+        'task': (AuditTaskViewSet.queryset, AuditTaskSerializer),
+        'document': (ProjectDocumentViewSet.queryset, ProjectDocumentSerializer),
+    }
+
+    def get(self, request, *args, **kwargs):
+        since_id, since_time, types = 0, None, None
+        params = request.query_params
+        errors = {}
+        if params.get('since'):
+            try:
+                since_id, since_time = changes.parse_token(params['since'])
+            except ValueError:
+                errors['since'] = ['Invalid change token.']
+        elif params.get('updated_since'):
+            try:
+                since_time = parse_datetime(params['updated_since'])
+            except ValueError:
+                since_time = None
+            if since_time is None:
+                errors['updated_since'] = ['Expected an ISO 8601 date and time.']
+            elif timezone.is_naive(since_time):
+                since_time = timezone.make_aware(since_time, datetime.timezone.utc)
+        if params.get('types'):
+            types = [name.strip() for name in params['types'].split(',') if name.strip()]
+            unknown = [name for name in types if name not in changes.FEED_TYPES]
+            if unknown:
+                errors['types'] = [f"Unknown type(s): {', '.join(unknown)}."]
+        if errors:
+            raise ValidationError(errors)
+        page_size = getattr(settings, 'AUDIT_MAX_PAGE_SIZE', 500)
+        try:
+            page_size = min(page_size, int(params.get('page_size') or page_size))
+        except ValueError:
+            pass
+
+        try:
+            entries, has_more, now = changes.get_changes(since_id, since_time, types, max(page_size, 1))
+        except changes.StaleToken:
+            return Response(
+                {'detail': 'This change token has expired. Discard the local copy and sync again without it.'},
+                status=status.HTTP_410_GONE,
+            )
+        latest = changes.latest_per_row(entries)
+
+        # Current representation of the changed rows: one query per type
+        types_by_table = {model._meta.label_lower: name for name, model in changes.FEED_TYPES.items()}
+        rows = {}
+        for name in changes.FEED_TYPES:
+            pks = [entry.object_id for entry in latest if entry.action == 'upsert' and types_by_table[entry.table] == name]
+            if pks:
+                queryset, serializer_class = self.sources[name]
+                serializer = serializer_class(
+                    queryset.filter(pk__in=pks), many=True, context={'request': request, 'view': self},
+                )
+                rows.update(((name, item['id']), item) for item in serializer.data)
+
+        results = []
+        for entry in latest:
+            name = types_by_table[entry.table]
+            data = rows.get((name, entry.object_id))
+            # A row updated and then deleted is gone already; its tombstone follows later
+            results.append({'type': name, 'id': entry.object_id, 'deleted': data is None, 'data': data})
+        return Response({
+            'changes': results,
+            'next_token': changes.make_token(entries[-1].pk if entries else since_id, now),
+            'has_more': has_more,
+        })
+
+
+class RequestMetricsView(APIView):
+    """
+    Rolling per-endpoint request statistics of the process serving the request (see
+    instrumentation.py). Staff only.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            'window': settings.AUDIT_METRICS_WINDOW,
+            'endpoints': endpoint_stats.summary(),
+        })
+
+
+def overdue_tasks():
+    """
+    Tasks past their due date that are not in a final state.
+    """
+    return AuditTask.objects.filter(
+        due_date__lt=timezone.now().date(),
+    ).exclude(status__in=AuditTask.FINAL_STATUSES)
+
+
 class AuditProjectCSVReportView(APIView):
     """
     Generates a CSV report of all audit projects.
+    The report is streamed: rows are read from the database in chunks and sent as they
+    are rendered, so memory use stays flat no matter how many projects exist.
+    Clients that send `Accept-Encoding: gzip` receive a gzip-compressed stream.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        response = HttpResponse(content_type='text/csv')
+        content = iter_project_report_csv()
+        use_gzip = _accepts_gzip(request)
+        if use_gzip:
+            content = compress_sequence(content)
+
+        response = StreamingHttpResponse(content, content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="audit_projects_report.csv"'
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
 
-        writer = csv.writer(response)
-
-        # Define CSV header
-        header = [
-            "Project Name",
-            "Project Manager",
-            "Status",
-            "Start Date",
-            "End Date",
-            "Description",
-            "Scope",
-            "Objectives"
-        ]
-        writer.writerow(header)
-
-        # Fetch projects and select relevant fields
-        # Using select_related for project_manager to optimize DB query if accessing user.username
-        projects = AuditProject.objects.all().select_related('project_manager').order_by('name')
-
-        for project in projects:
-            manager_username = project.project_manager.username if project.project_manager else ""
-            writer.writerow([
-                project.name,
-                manager_username,
-                project.status,
-                project.start_date.strftime('%Y-%m-%d') if project.start_date else "",
-                project.end_date.strftime('%Y-%m-%d') if project.end_date else "",
-                project.description or "",
-                project.scope or "",
-                project.objectives or ""
-            ])
 
-        return response
+def _accepts_gzip(request):
+    """
+    True if the Accept-Encoding header lists gzip without disabling it via `q=0`.
+    """
+    for encoding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = encoding.partition(';')
+        if coding.strip().lower() != 'gzip':
+            continue
+        quality = params.strip().lower().replace(' ', '')
+        return quality not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class ReportJobViewSet(mixins.CreateModelMixin,
+                       mixins.ListModelMixin,
+                       mixins.RetrieveModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    Reports rendered in the background (see jobs.py), for exports too heavy for a request.
+
+    POST {"kind": "projects_csv", "params": {...}} queues a job (201), or returns the job
+    already queued or running for the same report (200). Poll GET /reports/jobs/<id>/, or
+    long-poll /async/reports/jobs/<id>/wait/, until the status is Completed, then fetch
+    /reports/jobs/<id>/download/. Reports are deleted AUDIT_REPORT_TTL after they finish.
+    """
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # Anyone may follow a job by id (identical requests share one), but the list
+            # only shows the jobs the user submitted.
+            queryset = queryset.filter(requested_by_id=self.request.user.pk)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, created = jobs.submit_job(serializer.validated_data['kind'], serializer.validated_data['params'], request.user)
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, DownloadRenderer])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'Completed':
+            return Response(
+                {'detail': f'The report is not ready (status: {job.status}).', 'status': job.status},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if not job.file or (job.expires_at and job.expires_at <= timezone.now()):
+            return Response({'detail': 'The report has expired.'}, status=status.HTTP_410_GONE)
+        try:
+            return serve_file(request, job.file)
+        except FileNotFoundError:
+            return Response({'detail': 'The report has expired.'}, status=status.HTTP_410_GONE)
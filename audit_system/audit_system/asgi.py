@@ -3,6 +3,9 @@ ASGI config for audit_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it (e.g. `uvicorn audit_system.asgi:application`) for the async endpoints under
+/api/audit/async/, including the server-sent status events, which WSGI cannot stream.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its total covers the other middleware (see audit_management/instrumentation.py)
+    'audit_management.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -164,12 +166,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication with cached user lookups (and optional stateless reads)
+        'audit_management.authentication.AuditJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication', # For browsable API
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Keyset pagination keyed on each ViewSet's ordering; clients may ask for ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'audit_management.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', '50')),
 }
 
 # Simple JWT settings
@@ -199,7 +205,9 @@ SIMPLE_JWT = {
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_USER_CLASS': 'audit_management.authentication.AuditTokenUser',
+    # Adds username/email/is_staff claims, used by stateless reads
+    'TOKEN_OBTAIN_SERIALIZER': 'audit_management.serializers.AuditTokenObtainPairSerializer',
 
     'JTI_CLAIM': 'jti',
 
@@ -207,3 +215,85 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5), # Not used if ROTATE_REFRESH_TOKENS is False
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1), # Not used if ROTATE_REFRESH_TOKENS is False
 }
+
+# Audit management settings
+# Rows fetched per database round trip when streaming reports (server-side cursor on PostgreSQL)
+AUDIT_REPORT_CHUNK_SIZE = int(os.environ.get('AUDIT_REPORT_CHUNK_SIZE', '2000'))
+# Hard cap on ?page_size= for list endpoints
+AUDIT_MAX_PAGE_SIZE = int(os.environ.get('AUDIT_MAX_PAGE_SIZE', '500'))
+# Bulk task endpoints: maximum items per request and rows per INSERT/UPDATE statement
+AUDIT_BULK_MAX_ITEMS = int(os.environ.get('AUDIT_BULK_MAX_ITEMS', '10000'))
+AUDIT_BULK_BATCH_SIZE = int(os.environ.get('AUDIT_BULK_BATCH_SIZE', '1000'))
+# Resumable uploads: where part files are assembled (keep it on the same filesystem as
+# MEDIA_ROOT so finalizing is a rename), how long an idle session lives, the largest file,
+# and how long a chunk keeps the part file reserved while its client sends nothing
+AUDIT_UPLOAD_SESSION_DIR = Path(os.environ.get('AUDIT_UPLOAD_SESSION_DIR', BASE_DIR / 'upload_sessions'))
+AUDIT_UPLOAD_SESSION_TTL = timedelta(hours=int(os.environ.get('AUDIT_UPLOAD_SESSION_TTL_HOURS', '24')))
+AUDIT_UPLOAD_MAX_SIZE = int(os.environ.get('AUDIT_UPLOAD_MAX_SIZE', str(20 * 1024 ** 3)))
+AUDIT_UPLOAD_CHUNK_LEASE = timedelta(seconds=int(os.environ.get('AUDIT_UPLOAD_CHUNK_LEASE_SECONDS', '60')))
+# Hash uploads while they are received so the document storage can deduplicate them
+# without reading them again (same thresholds as Django's default handlers)
+FILE_UPLOAD_HANDLERS = [
+    'audit_management.storage.HashingMemoryFileUploadHandler',
+    'audit_management.storage.HashingTemporaryFileUploadHandler',
+]
+# Document downloads: '' serves files from Django (FileResponse), 'x-sendfile' or
+# 'x-accel-redirect' lets the web server send them. For nginx, map the prefix to MEDIA_ROOT:
+#   location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+AUDIT_DOWNLOAD_OFFLOAD = os.environ.get('AUDIT_DOWNLOAD_OFFLOAD', '')
+AUDIT_DOWNLOAD_ACCEL_PREFIX = os.environ.get('AUDIT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+# Background report jobs (run_report_worker): how long finished reports are kept, how long a
+# worker may go without renewing its claim on a job, retries, and the long-poll cap in seconds
+AUDIT_REPORT_TTL = timedelta(hours=int(os.environ.get('AUDIT_REPORT_TTL_HOURS', '24')))
+AUDIT_REPORT_JOB_LEASE = timedelta(minutes=int(os.environ.get('AUDIT_REPORT_JOB_LEASE_MINUTES', '10')))
+AUDIT_REPORT_MAX_ATTEMPTS = int(os.environ.get('AUDIT_REPORT_MAX_ATTEMPTS', '3'))
+AUDIT_REPORT_LONG_POLL_MAX = int(os.environ.get('AUDIT_REPORT_LONG_POLL_MAX', '30'))
+# JWT authentication: seconds a process keeps a user (and its permissions) after loading
+# it (0 disables the cache; changes made in another process show up within this time), the
+# number of users kept, and whether reads take the user from the token claims alone
+# (deactivations then only apply once the access token expires)
+AUDIT_AUTH_CACHE_TTL = int(os.environ.get('AUDIT_AUTH_CACHE_TTL', '60'))
+AUDIT_AUTH_CACHE_SIZE = int(os.environ.get('AUDIT_AUTH_CACHE_SIZE', '10000'))
+AUDIT_JWT_STATELESS_READS = os.environ.get('AUDIT_JWT_STATELESS_READS', '') == '1'
+# Request instrumentation: whether requests are measured, whether responses carry the
+# Server-Timing header (off by default: it reveals query counts and timings to clients;
+# enable it in development or behind a trusted proxy), requests kept per
+# endpoint for the percentiles at /api/audit/metrics/requests/, and the duration in
+# milliseconds from which requests are logged as slow, with the fraction of them logged
+AUDIT_REQUEST_METRICS = os.environ.get('AUDIT_REQUEST_METRICS', '1') == '1'
+AUDIT_SERVER_TIMING = os.environ.get('AUDIT_SERVER_TIMING', '') == '1'
+AUDIT_METRICS_WINDOW = int(os.environ.get('AUDIT_METRICS_WINDOW', '1000'))
+AUDIT_SLOW_REQUEST_MS = int(os.environ.get('AUDIT_SLOW_REQUEST_MS', '1000'))
+AUDIT_SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('AUDIT_SLOW_REQUEST_SAMPLE_RATE', '1.0'))
+# Delta-sync change feed: seconds before a change shows up in the feed (longer than the
+# longest write transaction, whose changes could otherwise be skipped), and how long
+# deletions are kept by compact_change_log; change tokens older than that get 410 Gone
+AUDIT_CHANGE_FEED_LAG = int(os.environ.get('AUDIT_CHANGE_FEED_LAG', '5'))
+AUDIT_CHANGE_LOG_RETENTION = timedelta(days=int(os.environ.get('AUDIT_CHANGE_LOG_RETENTION_DAYS', '30')))
+# Server-sent status events (/api/audit/async/events/, ASGI only): the broker fanning events
+# out to subscribers (the default only reaches subscribers in the same process; use a shared
+# one with several processes), the events queued per slow client before it is told to
+# reload, and the seconds between keep-alives and before a stream is recycled
+AUDIT_EVENT_BROKER = os.environ.get('AUDIT_EVENT_BROKER', 'audit_management.events.LocalBroker')
+AUDIT_EVENTS_MAX_PENDING = int(os.environ.get('AUDIT_EVENTS_MAX_PENDING', '100'))
+AUDIT_EVENTS_KEEPALIVE = int(os.environ.get('AUDIT_EVENTS_KEEPALIVE', '15'))
+AUDIT_EVENTS_MAX_DURATION = int(os.environ.get('AUDIT_EVENTS_MAX_DURATION', '300'))
+# Transaction datasets (ingest_transaction_datasets): bytes of CSV parsed per block. Column
+# types are inferred from the first block; memory use during ingestion grows with it.
+# A dataset whose worker died is queued again once its lease runs out, up to the given
+# number of claims
+AUDIT_DATASET_BLOCK_SIZE = int(os.environ.get('AUDIT_DATASET_BLOCK_SIZE', str(16 * 1024 * 1024)))
+AUDIT_DATASET_LEASE = timedelta(minutes=int(os.environ.get('AUDIT_DATASET_LEASE_MINUTES', '10')))
+AUDIT_DATASET_MAX_ATTEMPTS = int(os.environ.get('AUDIT_DATASET_MAX_ATTEMPTS', '3'))
+# Anomaly detection (run_anomaly_detection): scoring processes per run (0 for one per CPU),
+# transactions sampled to fit the isolation forest, and fitted detectors kept per process.
+# A run whose worker died is queued again once its lease runs out, up to the given number
+# of claims
+AUDIT_DETECTION_WORKERS = int(os.environ.get('AUDIT_DETECTION_WORKERS', '0'))
+AUDIT_DETECTION_FIT_SAMPLE_SIZE = int(os.environ.get('AUDIT_DETECTION_FIT_SAMPLE_SIZE', '100000'))
+AUDIT_DETECTION_MODEL_CACHE_SIZE = int(os.environ.get('AUDIT_DETECTION_MODEL_CACHE_SIZE', '8'))
+AUDIT_DETECTION_LEASE = timedelta(minutes=int(os.environ.get('AUDIT_DETECTION_LEASE_MINUTES', '10')))
+AUDIT_DETECTION_MAX_ATTEMPTS = int(os.environ.get('AUDIT_DETECTION_MAX_ATTEMPTS', '3'))
+# Detected anomalies: rows of a run's results stored per transaction (and per COPY on
+# PostgreSQL); an interrupted ingestion resumes after the last stored batch
+AUDIT_ANOMALY_INGEST_BATCH_SIZE = int(os.environ.get('AUDIT_ANOMALY_INGEST_BATCH_SIZE', '10000'))